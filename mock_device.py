@@ -5,7 +5,16 @@ import random
 import argparse
 import logging
 import sys
-from typing import Dict, List, Optional, Tuple
+import heapq
+import copy
+import json
+import math
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "tools"))
+from exit_percent import calc_exit_percent  # noqa: E402  与 tools/qt_stream_tool.py 共用的出口占比规则
 
 # 配置参数
 SERVER_IP = '127.0.0.1'
@@ -17,6 +26,14 @@ LOG_LEVEL = "INFO"
 LOG_FILE: Optional[str] = None
 LOG_TO_CONSOLE = True
 LOG_BODY_PREVIEW_LEN = 96
+# 可替换的发送出口（背压/多目标等），需实现 send_packet(header, body, name) 与 send_control(cmd, host, port)
+PACKET_SINK = None
+FSM_RESPONDER = None
+FLASH_BOOTLOADER = None
+CONFIG_STORE = None
+TRACE_STORE = None
+KPI_ENGINE = None
+WALL_CLOCK: Callable[[], float] = time.time  # 包内时间戳来源（虚拟时钟模式下替换）
 
 # 协议常量
 SYNC_FLAG = 0x434E5953  # "SYNC" in little endian
@@ -27,6 +44,7 @@ FSM_ID = 0x0100         # 模拟 FSM 设备 ID
 FSM_CMD_STATISTICS = 0x1001 # 统计信息
 FSM_CMD_GRADEINFO = 0x1002 # 水果实时分级信息
 FSM_CMD_WEIGHTINFO = 0x1003 # 重量信息
+FSM_CMD_WAVEINFO = 0x1004 # 称重波形 (StWaveInfo)
 HC_CMD_GRADE_INFO = 0x0051 # 等级设置信息 (UI表头)
 
 # 数组大小常量
@@ -446,9 +464,10 @@ def create_statistics(
 
     return body
 
-def create_weight_info(current_weight=150, current_exit=3):
+def create_weight_info(current_weight=150, current_exit=3, fruit_id=None, cup_index=5):
     """
     创建模拟的 StWeightInfo 数据 (24 bytes payload + padding to match C++ StWeightResult 44 bytes)
+    fruit_id 不给时随机；单果追溯模式下由 emit_weight 从追溯存储的行取值
     """
     weight = current_weight        # g
     diameter = 85       # 85mm
@@ -459,8 +478,8 @@ def create_weight_info(current_weight=150, current_exit=3):
     quality_grade = 1
     final_grade = 1
     target_exit = current_exit     # 出口
-    fruit_id = random.randint(10000, 99999)
-    cup_index = 5
+    if fruit_id is None:
+        fruit_id = random.randint(10000, 99999)
     
     # 24 bytes data
     payload = struct.pack('<IHIIBBBBBIB',
@@ -620,7 +639,7 @@ def create_fruit_param(
         rot_num=random.randint(0, 2),
         rigidity=random.randint(0, 100),
         water=random.randint(0, 100),
-        time_tag=int(time.time() * 1000) & 0xFFFFFFFF
+        time_tag=int(WALL_CLOCK() * 1000) & 0xFFFFFFFF
     )
     nir = create_nir_param(
         sugar=round(random.uniform(10.0, 16.0), 2),
@@ -629,7 +648,7 @@ def create_fruit_param(
         skin=round(random.uniform(0.0, 1.0), 2),
         brown=round(random.uniform(0.0, 1.0), 2),
         tangxin=round(random.uniform(0.0, 1.0), 2),
-        time_tag=int(time.time() * 1000) & 0xFFFFFFFF
+        time_tag=int(WALL_CLOCK() * 1000) & 0xFFFFFFFF
     )
 
     un_grade = encode_ungrade(size_grade_index, quality_grade_index)
@@ -756,17 +775,10 @@ def seed_completed_batches(args: argparse.Namespace) -> None:
                 n_size=args.size_num,
                 subsys_index=args.subsys
             )
-            if not args.dry_run:
-                send_once(stats_header, stats_body, f"SeedStatistics[{i+1}]")
+            deliver_packet(args, stats_header, stats_body, f"SeedStatistics[{i+1}]")
             time.sleep(float(args.seed_completed_interval_s))
 
-        mode = (args.end_mode or "clear").lower()
-        if mode == "alternate":
-            cmd = "END_CLEAR" if (i % 2 == 0) else "END_SAVE"
-        else:
-            cmd = "END_SAVE" if mode == "save" else "END_CLEAR"
-        if not args.dry_run:
-            send_control(cmd, SERVER_IP, int(args.control_port))
+        emit_end_control(args, None, args.end_mode, i)
         time.sleep(float(args.seed_completed_interval_s))
 
     if SHOW_SEND_LOGS:
@@ -800,9 +812,14 @@ def run_cmd_server(args: argparse.Namespace) -> None:
                 if len(header) < 12:
                     conn.close()
                     continue
-                total_len, src_id, dst_id, cmd_u16 = struct.unpack("<IHHH", header)
+                total_len, src_id, dst_id, cmd_u16 = struct.unpack_from("<IHHH", header, 0)
                 remaining = max(0, total_len - 12)
+                if FLASH_BOOTLOADER is not None and cmd_u16 in FLASH_BURN_TARGETS:
+                    # 固件块直接写入映射文件，不经过 body 缓冲
+                    FLASH_BOOTLOADER.receive(conn, cmd_u16, src_id, dst_id, remaining)
+                    continue
                 body = _recv_exact(conn, remaining) if remaining > 0 else b""
+                t_recv = time.perf_counter()
 
                 cmd = cmd_u16
                 if cmd in (0x0055, 0x0056) and len(body) >= 4:
@@ -811,6 +828,10 @@ def run_cmd_server(args: argparse.Namespace) -> None:
                     log_info(f"[CmdServer] {addr[0]}:{addr[1]} cmd=0x{cmd:04X}({mode}) src=0x{src_id:04X} dst=0x{dst_id:04X} ch={ch} exit={ex}")
                 else:
                     log_info(f"[CmdServer] {addr[0]}:{addr[1]} cmd=0x{cmd:04X} src=0x{src_id:04X} dst=0x{dst_id:04X} bodyLen={len(body)}")
+                if FSM_RESPONDER is not None:
+                    FSM_RESPONDER.handle(cmd, src_id, dst_id, body, t_recv)
+                if CONFIG_STORE is not None and cmd in CONFIG_PUSH_LAYOUTS:
+                    CONFIG_STORE.handle(cmd, src_id, dst_id, body)
 
             except Exception as e:
                 log_error(f"[CmdServer] Error: {e}")
@@ -863,20 +884,6 @@ def choose_exit_index(dist: List[Tuple[int, float]]) -> int:
     return dist[-1][0]
 
 
-def calc_exit_percent(exit_counts: List[int], exit_weight_counts: List[int]) -> Tuple[bool, List[float]]:
-    total_weight = sum(exit_weight_counts)
-    total_count = sum(exit_counts)
-    use_weight = total_weight > 0
-    base = total_weight if use_weight else total_count
-    if base <= 0:
-        return use_weight, [0.0] * MAX_EXIT_NUM
-    percents: List[float] = []
-    for i in range(MAX_EXIT_NUM):
-        v = exit_weight_counts[i] if use_weight else exit_counts[i]
-        percents.append(round(v * 100.0 / base, 2))
-    return use_weight, percents
-
-
 def print_top_exits(exit_counts: List[int], exit_weight_counts: List[int], top_n: int = 6) -> None:
     use_weight, percents = calc_exit_percent(exit_counts, exit_weight_counts)
     pairs = []
@@ -894,6 +901,341 @@ def print_top_exits(exit_counts: List[int], exit_weight_counts: List[int], top_n
         log_info(f"[ExitPercent] 基于{mode}占比 Top{len(show)} => {s}")
 
 
+class PeriodicEmitter:
+    """
+    调度器中的一个周期发射器（统计/分级/重量/StGradeInfo/END_* 等）
+    第 k 次截止时间固定为 t0 + phase_s + k * period_s
+    """
+    def __init__(self, name: str, period_s: float, callback: Callable[[], object], phase_s: float = 0.0) -> None:
+        if period_s <= 0:
+            raise ValueError(f"emitter {name}: period must be > 0, got {period_s}")
+        self.name = name
+        self.period_s = float(period_s)
+        self.phase_s = float(phase_s)
+        self.callback = callback
+        self.enabled = True
+        self.next_deadline = 0.0
+        self.fired = 0
+        self.missed = 0
+        self.max_late_s = 0.0
+        self.total_late_s = 0.0
+
+    def set_period(self, period_s: float) -> None:
+        # 新周期从下一个截止点之后开始生效
+        if period_s <= 0:
+            raise ValueError(f"emitter {self.name}: period must be > 0, got {period_s}")
+        self.period_s = float(period_s)
+
+
+class TimerScheduler:
+    """
+    单调时钟上的最小堆调度器（替代 run_simulation 中串联的 time.sleep）
+
+    - 截止时间是绝对的：deadline += period，发送耗时与抖动不会累积成周期漂移
+    - 回调执行后如果下一个截止点之后的那个也已经过期，则跳过并计入 missed（不补发积压）
+    - clock/sleep 可注入（虚拟时钟模式复用同一调度器）；不注入 sleep 时等待可被 kick() 提前唤醒
+    """
+    def __init__(self, clock: Callable[[], float] = time.monotonic, sleep: Optional[Callable[[float], None]] = None) -> None:
+        import threading
+        self.clock = clock
+        self._lock = threading.Lock()  # 堆可能被其它线程（命令应答）通过 kick() 修改
+        self._wake = threading.Event()
+        self.sleep = sleep or self._wait
+        self.emitters: Dict[str, PeriodicEmitter] = {}
+        self._heap: List[Tuple[float, int, PeriodicEmitter]] = []
+        self._seq = 0
+        self._running = False
+        self._stopped = False
+        self.t0 = 0.0
+
+    def add(self, name: str, period_s: float, callback: Callable[[], object], phase_s: float = 0.0) -> PeriodicEmitter:
+        emitter = PeriodicEmitter(name, period_s, callback, phase_s)
+        with self._lock:
+            self.emitters[name] = emitter
+            if self._running:
+                emitter.next_deadline = self.clock() + emitter.phase_s
+                self._push(emitter)
+        return emitter
+
+    def add_rate(self, name: str, rate_hz: float, callback: Callable[[], object], phase_s: float = 0.0) -> PeriodicEmitter:
+        if rate_hz <= 0:
+            raise ValueError(f"emitter {name}: rate must be > 0, got {rate_hz}")
+        return self.add(name, 1.0 / rate_hz, callback, phase_s)
+
+    def kick(self, name: str) -> None:
+        """
+        让发射器立即触发一次，之后从此刻起按周期继续（线程安全）；堆里原来的条目作废
+        """
+        with self._lock:
+            emitter = self.emitters.get(name)
+            if emitter is None or not self._running:
+                return
+            emitter.next_deadline = self.clock()
+            self._push(emitter)
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake.set()
+
+    def _wait(self, dt: float) -> None:
+        self._wake.wait(dt)
+        self._wake.clear()
+
+    def _push(self, emitter: PeriodicEmitter) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (emitter.next_deadline, self._seq, emitter))
+
+    def run(self, duration_s: Optional[float] = None, until: Optional[Callable[[], bool]] = None) -> None:
+        with self._lock:
+            self._running = True
+            self._stopped = False
+            self.t0 = self.clock()
+            self._heap = []
+            for emitter in self.emitters.values():
+                emitter.next_deadline = self.t0 + emitter.phase_s
+                self._push(emitter)
+        end_at = self.t0 + duration_s if duration_s is not None else None
+
+        try:
+            while self._heap and not self._stopped:
+                if until is not None and until():
+                    return
+                with self._lock:
+                    deadline, _, emitter = self._heap[0]
+                    if end_at is not None and deadline > end_at:
+                        return
+                    now = self.clock()
+                    if deadline <= now:
+                        heapq.heappop(self._heap)
+                if deadline > now:
+                    self.sleep(deadline - now)
+                    continue
+                if self.emitters.get(emitter.name) is not emitter:
+                    continue  # 已被移除/替换
+                if deadline != emitter.next_deadline:
+                    continue  # 已被 kick() 重新排期
+
+                if emitter.enabled:
+                    late = now - deadline
+                    emitter.fired += 1
+                    emitter.total_late_s += late
+                    if late > emitter.max_late_s:
+                        emitter.max_late_s = late
+                    emitter.callback()
+
+                with self._lock:
+                    if deadline != emitter.next_deadline:
+                        continue  # 回调期间被 kick()，新条目已在堆里
+                    nxt = deadline + emitter.period_s
+                    after = self.clock()
+                    while nxt + emitter.period_s <= after:
+                        nxt += emitter.period_s
+                        if emitter.enabled:
+                            emitter.missed += 1
+                    emitter.next_deadline = nxt
+                    self._push(emitter)
+        finally:
+            self._running = False
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        elapsed = max(1e-9, self.clock() - self.t0)
+        out: Dict[str, Dict[str, float]] = {}
+        for name, e in self.emitters.items():
+            out[name] = {
+                "period_s": e.period_s,
+                "fired": e.fired,
+                "missed": e.missed,
+                "rate_hz": e.fired / elapsed,
+                "avg_late_ms": (e.total_late_s / e.fired * 1000.0) if e.fired else 0.0,
+                "max_late_ms": e.max_late_s * 1000.0,
+            }
+        return out
+
+    def log_stats(self) -> None:
+        for name, st in self.stats().items():
+            log_info(
+                f"[Scheduler] {name} period={st['period_s']:.3f}s fired={st['fired']} missed={st['missed']} "
+                f"rate={st['rate_hz']:.2f}Hz late(avg/max)={st['avg_late_ms']:.2f}/{st['max_late_ms']:.2f}ms"
+            )
+
+
+class SimState:
+    """
+    模拟器累计状态（产量/总重/出口计数），供循环模式与调度模式共用
+    """
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.current_yield = 0
+        self.current_total_weight = 0
+        self.exit_counts = [0] * MAX_EXIT_NUM # 维护持久的出口计数状态
+        self.exit_weight_counts = [0] * MAX_EXIT_NUM # 维护持久的出口重量(g)状态
+        self.dist_a = parse_distribution(args.dist)
+        self.dist_b = parse_distribution(args.dist2) if args.dist2 else []
+        self.cycles_done = 0
+
+    def reset(self) -> None:
+        self.current_yield = 0
+        self.current_total_weight = 0
+        self.exit_counts = [0] * MAX_EXIT_NUM
+        self.exit_weight_counts = [0] * MAX_EXIT_NUM
+
+
+def deliver_packet(args: argparse.Namespace, header: bytes, body: bytes, name: str) -> bool:
+    """
+    统一出口：有 PACKET_SINK 时交给它；dry-run 只打印；否则短连接发送
+    """
+    if PACKET_SINK is not None:
+        return PACKET_SINK.send_packet(header, body, name)
+    if not args.dry_run:
+        return send_once(header, body, name)
+    if SHOW_SEND_LOGS:
+        log_info(f"[DryRun] {name} bytes: {len(body)}")
+        log_header_preview(header, body, name)
+    return True
+
+
+def accumulate_fruit(
+    args: argparse.Namespace,
+    state: SimState,
+    increment: int,
+    dist_override: Optional[List[Tuple[int, float]]] = None,
+    weight_range: Optional[Tuple[int, int]] = None
+) -> None:
+    # 将增量分配给随机出口
+    state.current_yield += increment
+    min_w, max_w = weight_range if weight_range else (args.min_weight_g, args.max_weight_g)
+    now = WALL_CLOCK() if KPI_ENGINE is not None else 0.0
+    trace = TRACE_STORE if TRACE_STORE is not None and TRACE_STORE.enabled else None
+    channel = max(0, args.weight_channel)
+    for _ in range(increment):
+        dist = state.dist_a
+        if dist_override is not None:
+            dist = dist_override
+        elif args.alternate and state.dist_b:
+            dist = state.dist_b if (state.cycles_done % 2 == 1) else state.dist_a
+        exit_idx = choose_exit_index(dist)
+
+        if 0 <= exit_idx < MAX_EXIT_NUM:
+            state.exit_counts[exit_idx] += 1
+            w = random.randint(min_w, max_w)
+            state.exit_weight_counts[exit_idx] += w
+            state.current_total_weight += w
+            if KPI_ENGINE is not None:
+                KPI_ENGINE.add(now, w, exit_idx)
+            if trace is not None:
+                trace.record(w, channel, TRACE_DEFAULT_GRADES, exit_idx)
+        else:
+            if KPI_ENGINE is not None:
+                KPI_ENGINE.add(now, 0, exit_idx)
+            if trace is not None:
+                trace.record(0, channel, TRACE_DEFAULT_GRADES, TRACE_UNSORTED)
+
+    if args.force_total_weight_from_exits:
+        state.current_total_weight = sum(state.exit_weight_counts)
+
+
+def emit_statistics(args: argparse.Namespace, state: SimState) -> bool:
+    # 计算合格/不合格 (95% 合格率)
+    qualified = int(state.current_yield * 0.95)
+    unqualified = state.current_yield - qualified
+
+    # 模拟速度波动 (300-600 个/分钟)
+    speed = random.randint(300, 600)
+
+    if SHOW_SEND_LOGS:
+        log_info(f"[Statistics] Yield: {state.current_yield}, Weight: {state.current_total_weight/1000:.2f}kg, Speed: {speed}/min")
+    if args.print_percent:
+        print_top_exits(state.exit_counts, state.exit_weight_counts, top_n=args.topn)
+    stats_src_id = make_src_id(subsys_index=args.subsys, channel_index=args.stats_channel)
+    stats_header = create_header_with_ids(FSM_CMD_STATISTICS, stats_src_id, HC_ID)
+    stats_body = create_statistics(
+        n_total_cup_num=state.current_yield,
+        n_total_weight=state.current_total_weight,
+        n_qualified_count=qualified,
+        n_unqualified_count=unqualified,
+        n_interval_sum_per_minute=speed,
+        exit_counts=state.exit_counts,  # 传入持久化的出口计数
+        exit_weight_counts=state.exit_weight_counts,  # 传入持久化的出口重量(g)
+        n_qual=args.qual_num,
+        n_size=args.size_num,
+        subsys_index=args.subsys
+    )
+    return deliver_packet(args, stats_header, stats_body, "Statistics")
+
+
+def emit_grade(args: argparse.Namespace) -> bool:
+    # 48项目: FSM_CMD_GRADEINFO (StFruitGradeInfo)
+    ipm_index = args.grade_ipm
+    if ipm_index < 0:
+        ipm_index = random.randint(0, max(0, args.max_ipm - 1))
+    grade_src_id = make_src_id(subsys_index=args.subsys, ipm_index=ipm_index)
+    grade_header = create_header_with_ids(FSM_CMD_GRADEINFO, grade_src_id, HC_ID)
+    grade_body = create_grade_info(
+        channel0_exit=random.randint(0, 9),
+        channel1_exit=random.randint(0, 9),
+        route_id=0
+    )
+    return deliver_packet(args, grade_header, grade_body, "GradeInfo")
+
+
+def emit_weight(args: argparse.Namespace) -> bool:
+    single_weight = random.randint(100, 250)
+    exit_id = random.randint(0, 9)
+    fruit_id = None
+    cup_index = 5
+    if TRACE_STORE is not None and TRACE_STORE.enabled:
+        # 追溯模式：上报最近一个分选出的真实果实，没有新果实则本拍不发
+        row = TRACE_STORE.latest_unreported()
+        if row < 0:
+            return True
+        c = TRACE_STORE.cols
+        fruit_id, cup_index = c["fruit_id"][row], c["cup"][row]
+        single_weight, exit_id = c["weight"][row], c["exit"][row]
+    if SHOW_SEND_LOGS:
+        log_info(f"[WeightInfo] Weight: {single_weight}g, ExitIndex0: {exit_id}")
+
+    weight_src_id = make_src_id(subsys_index=args.subsys, channel_index=args.weight_channel)
+    weight_header = create_header_with_ids(FSM_CMD_WEIGHTINFO, weight_src_id, HC_ID)
+    weight_body = create_weight_info(current_weight=single_weight, current_exit=exit_id,
+                                     fruit_id=fruit_id, cup_index=cup_index)
+    return deliver_packet(args, weight_header, weight_body, "WeightInfo")
+
+
+def emit_st_grade(args: argparse.Namespace) -> bool:
+    # 48项目: HC_CMD_GRADE_INFO (StGradeInfo)
+    st_grade_header = create_header_with_ids(HC_CMD_GRADE_INFO, FSM_ID, HC_ID)
+    st_grade_body = create_st_grade_info(
+        n_qual=args.qual_num,
+        n_size=args.size_num,
+        classify_type=args.classify_type,
+        label_type=args.label_type
+    )
+    return deliver_packet(args, st_grade_header, st_grade_body, "StGradeInfo")
+
+
+def emit_end_control(args: argparse.Namespace, state: Optional[SimState], mode: str, batch_index: int = 0) -> bool:
+    """
+    发送 END_CLEAR / END_SAVE 并清空本地累计（对应 App 结束批次）
+    """
+    mode = (mode or "clear").lower()
+    if mode == "alternate":
+        cmd = "END_CLEAR" if (batch_index % 2 == 0) else "END_SAVE"
+    else:
+        cmd = "END_SAVE" if mode == "save" else "END_CLEAR"
+    ok = True
+    if PACKET_SINK is not None:
+        ok = PACKET_SINK.send_control(cmd, SERVER_IP, int(args.control_port))
+    elif not args.dry_run:
+        ok = send_control(cmd, SERVER_IP, int(args.control_port))
+    elif SHOW_SEND_LOGS:
+        log_info(f"[DryRun] Control {cmd}")
+    if state is not None:
+        state.reset()
+    if KPI_ENGINE is not None:
+        KPI_ENGINE.reset_shift(WALL_CLOCK())
+    return ok
+
+
 def run_simulation(args: argparse.Namespace):
     """
     持续运行模拟，不断发送更新的数据
@@ -903,225 +1245,3252 @@ def run_simulation(args: argparse.Namespace):
         log_info("Press Ctrl+C to stop.")
     
     # 初始状态 - 从0开始
-    current_yield = 0
-    current_total_weight = 0
-    exit_counts = [0] * MAX_EXIT_NUM # 维护持久的出口计数状态
-    exit_weight_counts = [0] * MAX_EXIT_NUM # 维护持久的出口重量(g)状态
-    dist_a = parse_distribution(args.dist)
-    dist_b = parse_distribution(args.dist2) if args.dist2 else []
-    start_time = time.time()
-    cycles_done = 0
+    state = SimState(args)
     
     try:
         seed_completed_batches(args)
         if args.stop_after_seed:
             return
         while True:
-            if args.cycles is not None and cycles_done >= args.cycles:
+            if args.cycles is not None and state.cycles_done >= args.cycles:
                 if SHOW_SEND_LOGS:
                     log_info("Simulation finished.")
                 return
 
             # 1. 模拟数据增长
             increment = random.randint(args.min_inc, args.max_inc) # 每次增加 N 个
-            current_yield += increment
-            
-            # 将增量分配给随机出口
-            for _ in range(increment):
-                dist = dist_a
-                if args.alternate and dist_b:
-                    dist = dist_b if (cycles_done % 2 == 1) else dist_a
-                exit_idx = choose_exit_index(dist)
-
-                if 0 <= exit_idx < MAX_EXIT_NUM:
-                    exit_counts[exit_idx] += 1
-                    w = random.randint(args.min_weight_g, args.max_weight_g)
-                    exit_weight_counts[exit_idx] += w
-                    current_total_weight += w
-            
-            if args.force_total_weight_from_exits:
-                current_total_weight = sum(exit_weight_counts)
-            
-            # 计算合格/不合格 (95% 合格率)
-            qualified = int(current_yield * 0.95)
-            unqualified = current_yield - qualified
-            
-            # 模拟速度波动 (300-600 个/分钟)
-            speed = random.randint(300, 600)
+            accumulate_fruit(args, state, increment)
             
             # --- 2. 发送统计数据 ---
-            if SHOW_SEND_LOGS:
-                log_info(f"[Statistics] Yield: {current_yield}, Weight: {current_total_weight/1000:.2f}kg, Speed: {speed}/min")
-            if args.print_percent:
-                print_top_exits(exit_counts, exit_weight_counts, top_n=args.topn)
-            stats_src_id = make_src_id(subsys_index=args.subsys, channel_index=args.stats_channel)
-            stats_header = create_header_with_ids(FSM_CMD_STATISTICS, stats_src_id, HC_ID)
-            stats_body = create_statistics(
-                n_total_cup_num=current_yield,
-                n_total_weight=current_total_weight,
-                n_qualified_count=qualified,
-                n_unqualified_count=unqualified,
-                n_interval_sum_per_minute=speed,
-                exit_counts=exit_counts,  # 传入持久化的出口计数
-                exit_weight_counts=exit_weight_counts,  # 传入持久化的出口重量(g)
-                n_qual=args.qual_num,
-                n_size=args.size_num,
-                subsys_index=args.subsys
-            )
-            if not args.dry_run:
-                send_once(stats_header, stats_body, "Statistics")
-            else:
-                if SHOW_SEND_LOGS:
-                    log_info(f"[DryRun] Statistics bytes: {len(stats_body)}")
-                    log_header_preview(stats_header, stats_body, "Statistics")
-            
+            emit_statistics(args, state)
             time.sleep(args.stats_interval_s)
 
             # --- 2.5 发送分级数据 (模拟两个通道的实时分级信息) ---
-            # 48项目: FSM_CMD_GRADEINFO (StFruitGradeInfo)
             if not args.no_grade:
                 for _ in range(random.randint(1, 2)):
-                    ipm_index = args.grade_ipm
-                    if ipm_index < 0:
-                        ipm_index = random.randint(0, max(0, args.max_ipm - 1))
-                    grade_src_id = make_src_id(subsys_index=args.subsys, ipm_index=ipm_index)
-                    grade_header = create_header_with_ids(FSM_CMD_GRADEINFO, grade_src_id, HC_ID)
-                    grade_body = create_grade_info(
-                        channel0_exit=random.randint(0, 9),
-                        channel1_exit=random.randint(0, 9),
-                        route_id=0
-                    )
-                    if not args.dry_run:
-                        send_once(grade_header, grade_body, "GradeInfo")
-                    else:
-                        if SHOW_SEND_LOGS:
-                            log_info(f"[DryRun] GradeInfo bytes: {len(grade_body)}")
-                            log_header_preview(grade_header, grade_body, "GradeInfo")
+                    emit_grade(args)
                     time.sleep(0.2)
             
             # --- 3. 发送重量数据 (模拟单个果实) ---
             # 随机发送 1-3 个单果数据
             if not args.no_weight:
                 for _ in range(random.randint(1, 3)):
-                    single_weight = random.randint(100, 250)
-                    exit_id = random.randint(0, 9)
-                    if SHOW_SEND_LOGS:
-                        log_info(f"[WeightInfo] Weight: {single_weight}g, ExitIndex0: {exit_id}")
-                    
-                    weight_src_id = make_src_id(subsys_index=args.subsys, channel_index=args.weight_channel)
-                    weight_header = create_header_with_ids(FSM_CMD_WEIGHTINFO, weight_src_id, HC_ID)
-                    weight_body = create_weight_info(current_weight=single_weight, current_exit=exit_id)
-                    if not args.dry_run:
-                        send_once(weight_header, weight_body, "WeightInfo")
-                    else:
-                        if SHOW_SEND_LOGS:
-                            log_info(f"[DryRun] WeightInfo bytes: {len(weight_body)}")
-                            log_header_preview(weight_header, weight_body, "WeightInfo")
+                    emit_weight(args)
                     time.sleep(0.3)
             
             # --- 4. 发送等级设置信息 (UI表头) ---
-            # 48项目: HC_CMD_GRADE_INFO (StGradeInfo)
-            if not args.no_st_grade and (cycles_done % 5 == 0):
-                st_grade_header = create_header_with_ids(HC_CMD_GRADE_INFO, FSM_ID, HC_ID)
-                st_grade_body = create_st_grade_info(
-                    n_qual=args.qual_num,
-                    n_size=args.size_num,
-                    classify_type=args.classify_type,
-                    label_type=args.label_type
-                )
-                if not args.dry_run:
-                    send_once(st_grade_header, st_grade_body, "StGradeInfo")
-                else:
-                    if SHOW_SEND_LOGS:
-                        log_info(f"[DryRun] StGradeInfo bytes: {len(st_grade_body)}")
-                        log_header_preview(st_grade_header, st_grade_body, "StGradeInfo")
+            if not args.no_st_grade and (state.cycles_done % 5 == 0):
+                emit_st_grade(args)
                 time.sleep(0.2)
 
             # 等待下一轮
-            cycles_done += 1
+            state.cycles_done += 1
             time.sleep(args.loop_interval_s)
 
     except KeyboardInterrupt:
         if SHOW_SEND_LOGS:
             log_info("Simulation stopped by user.")
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Mock FSM device for HarmonyOS host")
-    parser.add_argument("--ip", default=SERVER_IP, help="鸿蒙设备/模拟器IP（运行App的一侧）")
-    parser.add_argument("--host", dest="ip", help="同 --ip 的别名")
-    parser.add_argument("--port", type=int, default=SERVER_PORT)
-    parser.add_argument("--control-port", type=int, default=CONTROL_PORT, help="PLC/控制端口（用于触发结束批次）")
-    parser.add_argument("--cmd-server", action="store_true", help="启动命令接收服务（用于接收鸿蒙下发的测试/配置命令）")
-    parser.add_argument("--cmd-server-only", action="store_true", help="仅启动命令接收服务，不发送统计数据")
-    parser.add_argument("--no-cmd-server", action="store_true", help="不启动命令接收服务（仅作为客户端发送统计数据）")
-    parser.add_argument("--cmd-port", type=int, default=CMD_SERVER_PORT, help="命令接收服务端口")
-    parser.add_argument("--cmd-server-host", default="0.0.0.0", help="命令接收服务绑定IP")
-    parser.add_argument("--seed", type=int, default=None)
-    parser.add_argument("--seed-completed", type=int, default=0, help="预先生成N条已完成批次（需App支持END_CLEAR/END_SAVE）")
-    parser.add_argument("--seed-completed-cycles", type=int, default=2, help="每条已完成批次发送统计包次数")
-    parser.add_argument("--seed-completed-interval-s", type=float, default=0.6, help="预置批次发送间隔")
-    parser.add_argument("--end-mode", default="clear", choices=["clear", "save", "alternate"], help="预置批次结束模式")
-    parser.add_argument("--stop-after-seed", action="store_true", help="仅生成已完成批次后退出")
+# ==================== 声明式负载场景 ====================
+# 场景文件(JSON)示例见 tools/scenarios/example_shift.json：
+# {
+#   "name": "...", "seed": 42, "subsystems": [0, 1],
+#   "defaults": {"stats_period_s": 1.0, "fruit_per_s": 8, "grade_hz": 1, "weight_hz": 2,
+#                "st_grade_period_s": 0, "dist": "1:60,2:30,3:10", "weight_g": [120, 180]},
+#   "phases": [
+#     {"name": "warmup", "duration_s": 60, "fruit_per_s": [0, 8]},           # [起, 止] 表示线性爬坡
+#     {"name": "burst", "duration_s": 10, "fruit_per_s": 30, "weight_hz": 10},
+#     {"name": "stall", "type": "stall", "duration_s": 20},                  # 停线：仅统计包，产量不增长
+#     {"name": "sub1-offline", "duration_s": 30, "offline": [1]},            # 子系统离线：该子系统不发任何包
+#     {"name": "batch-end", "duration_s": 0, "end": "save"}                  # 阶段结束时发 END_SAVE / END_CLEAR
+#   ]
+# }
+# 每个阶段可用 "subsystems": {"1": {"fruit_per_s": 4, "dist": "5:100"}} 覆盖单个子系统的参数。
 
-    parser.add_argument("--dist", default="1:60,2:30,3:10", help="出口分布，例: 1:60,2:30,3:10（出口号从1开始）")
-    parser.add_argument("--dist2", default="", help="第二套出口分布（配合 --alternate 使用）")
-    parser.add_argument("--alternate", action="store_true", help="每轮循环在 dist/dist2 之间交替，方便观察波浪快速变化")
+SCENARIO_PHASE_KEYS = (
+    "stats_period_s", "fruit_per_s", "grade_hz", "weight_hz", "st_grade_period_s", "dist", "weight_g"
+)
+SCENARIO_EVENT_ORDER = {"end": 0, "stats": 1, "st_grade": 2, "grade": 3, "weight": 4}
 
-    parser.add_argument("--min-inc", type=int, default=1)
-    parser.add_argument("--max-inc", type=int, default=5)
-    parser.add_argument("--min-weight-g", type=int, default=120)
-    parser.add_argument("--max-weight-g", type=int, default=180)
 
-    parser.add_argument("--stats-interval-s", type=float, default=1.0)
-    parser.add_argument("--loop-interval-s", type=float, default=2.0)
-    parser.add_argument("--cycles", type=int, default=None, help="循环次数（不填则无限循环）")
+class ScenarioEvent:
+    __slots__ = ("t", "seq", "kind", "subsys", "phase", "increment", "dist", "weight_range", "mode")
 
-    parser.add_argument("--no-grade", action="store_true", help="不发送 FSM_CMD_GRADEINFO")
-    parser.add_argument("--no-st-grade", action="store_true", help="不发送 HC_CMD_GRADE_INFO (StGradeInfo)")
-    parser.add_argument("--no-weight", action="store_true", help="不发送 FSM_CMD_WEIGHTINFO")
-    parser.add_argument("--dry-run", action="store_true", help="仅打印，不发TCP数据")
-    parser.add_argument("--show-send-logs", action="store_true", help="显示客户端发送日志（默认只显示服务器收到的数据）")
-    parser.add_argument("--log-file", default="", help="日志文件路径（为空则不写文件）")
-    parser.add_argument("--log-level", default=LOG_LEVEL, help="日志级别：DEBUG/INFO/WARNING/ERROR")
-    parser.add_argument("--no-log-console", action="store_true", help="不输出到控制台，仅写文件")
+    def __init__(self, t: float, kind: str, subsys: int, phase: str) -> None:
+        self.t = t
+        self.seq = 0
+        self.kind = kind
+        self.subsys = subsys
+        self.phase = phase
+        self.increment = 0
+        self.dist: List[Tuple[int, float]] = []
+        self.weight_range: Tuple[int, int] = (120, 180)
+        self.mode = ""
 
-    parser.add_argument("--subsys", type=int, default=0, help="子系统索引(0-based)，影响 srcId 生成")
-    parser.add_argument("--max-ipm", type=int, default=4, help="随机发送分级时的 IPM 个数(0-based count)")
-    parser.add_argument("--grade-ipm", type=int, default=-1, help="固定分级包来源 IPM 索引(0-based)，-1 表示随机")
-    parser.add_argument("--stats-channel", type=int, default=0, help="统计包来源通道索引(0-11)")
-    parser.add_argument("--weight-channel", type=int, default=0, help="重量包来源通道索引(0-11)")
-    parser.add_argument("--qual-num", type=int, default=3, help="质量等级数量")
-    parser.add_argument("--size-num", type=int, default=4, help="尺寸等级数量")
-    parser.add_argument("--classify-type", type=int, default=1, help="分级类型位标志")
-    parser.add_argument("--label-type", type=int, default=1, help="贴标类型(0/1)")
 
-    parser.add_argument("--print-percent", action="store_true", help="打印出口占比TopN（与鸿蒙 EXIT_PERCENT 逻辑一致）")
-    parser.add_argument("--topn", type=int, default=6)
-    parser.add_argument("--force-total-weight-from-exits", action="store_true", help="让 totalWeight 始终等于各出口重量之和")
-    parser.add_argument("--dump-packet", choices=["stats", "grade", "weight", "st-grade"], help="输出单包完整字节流并退出")
+def _ramp_ends(spec) -> Tuple[float, float]:
+    if isinstance(spec, (list, tuple)):
+        if len(spec) != 2:
+            raise ValueError(f"ramp must be [from, to], got {spec!r}")
+        return float(spec[0]), float(spec[1])
+    v = float(spec or 0.0)
+    return v, v
 
-    args = parser.parse_args()
 
-    SERVER_IP = args.ip
-    SERVER_PORT = args.port
-    SHOW_SEND_LOGS = bool(args.show_send_logs)
-    LOG_FILE = args.log_file or None
-    LOG_TO_CONSOLE = not args.no_log_console
-    LOGGER = setup_logging(LOG_FILE, args.log_level, LOG_TO_CONSOLE)
-    if args.seed is not None:
-        random.seed(args.seed)
+def _rate_event_times(t0: float, duration: float, r0: float, r1: float, carry: float) -> Tuple[List[float], float]:
+    """
+    线性速率 r(t) = r0 + (r1 - r0) * t / duration 下的确定性事件时刻
+    累计量 carry + ∫r 每跨过一个整数产生一个事件；返回 (时刻列表, 新 carry)
+    """
+    if duration <= 0:
+        return [], carry
+    a = r0
+    b = (r1 - r0) / duration
+    total = carry + a * duration + 0.5 * b * duration * duration
+    times: List[float] = []
+    n = 1
+    while n <= total + 1e-9:
+        need = n - carry
+        if abs(b) < 1e-12:
+            t = need / a
+        else:
+            t = (-a + math.sqrt(max(0.0, a * a + 2.0 * b * need))) / b
+        times.append(t0 + min(duration, max(0.0, t)))
+        n += 1
+    return times, max(0.0, total - (n - 1))
 
-    if args.dump_packet:
-        name, header, body = build_dump_packet(args)
-        packet = header + body
-        print(f"{name} len={len(packet)} hex={packet.hex()}")
-        raise SystemExit(0)
 
-    if args.cmd_server_only:
-        run_cmd_server(args)
-    else:
-        if not args.no_cmd_server:
-            import threading
-            t = threading.Thread(target=run_cmd_server, args=(args,), daemon=True)
-            t.start()
-        run_simulation(args)
+def load_scenario(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        scenario = json.load(f)
+    if not isinstance(scenario.get("phases"), list) or not scenario["phases"]:
+        raise ValueError(f"scenario {path}: 'phases' must be a non-empty list")
+    return scenario
+
+
+def compile_scenario(scenario: Dict, default_subsys: int = 0) -> List[ScenarioEvent]:
+    """
+    把场景展开成按时间排序的事件表（纯函数，不依赖时钟），回放时逐条执行
+    """
+    subsystems = [int(x) for x in scenario.get("subsystems", [default_subsys])]
+    defaults = dict(scenario.get("defaults", {}))
+    events: List[ScenarioEvent] = []
+    fruit_carry = {sid: 0.0 for sid in subsystems}
+    grade_carry = {sid: 0.0 for sid in subsystems}
+    weight_carry = {sid: 0.0 for sid in subsystems}
+    t0 = 0.0
+
+    for idx, phase in enumerate(scenario["phases"]):
+        name = str(phase.get("name", f"phase{idx}"))
+        duration = float(phase.get("duration_s", 0.0))
+        if duration < 0:
+            raise ValueError(f"phase {name}: duration_s must be >= 0")
+        offline = {int(x) for x in phase.get("offline", [])}
+        overrides = {int(k): v for k, v in phase.get("subsystems", {}).items()}
+
+        for sid in subsystems:
+            if sid in offline or overrides.get(sid, {}).get("offline"):
+                continue
+            cfg = {k: defaults.get(k) for k in SCENARIO_PHASE_KEYS}
+            cfg.update({k: phase[k] for k in SCENARIO_PHASE_KEYS if k in phase})
+            cfg.update({k: v for k, v in overrides.get(sid, {}).items() if k in SCENARIO_PHASE_KEYS})
+            if phase.get("type") == "stall":
+                cfg["fruit_per_s"] = 0
+                cfg["grade_hz"] = 0
+                cfg["weight_hz"] = 0
+
+            dist = parse_distribution(str(cfg.get("dist") or ""))
+            w_lo, w_hi = (cfg.get("weight_g") or [120, 180])
+            weight_range = (int(w_lo), int(w_hi))
+
+            # 统计包：阶段内每 stats_period_s 一次，增量 = 期间累计果数的整数部分
+            period = float(cfg.get("stats_period_s") or 1.0)
+            f0, f1 = _ramp_ends(cfg.get("fruit_per_s"))
+            slope = (f1 - f0) / duration if duration > 0 else 0.0
+            k = 1
+            reported = 0
+            while duration > 0 and k * period <= duration + 1e-9:
+                tk = k * period
+                cum = fruit_carry[sid] + f0 * tk + 0.5 * slope * tk * tk
+                ev = ScenarioEvent(t0 + tk, "stats", sid, name)
+                ev.increment = int(cum) - reported
+                reported += ev.increment
+                ev.dist = dist
+                ev.weight_range = weight_range
+                events.append(ev)
+                k += 1
+            if duration > 0:
+                fruit_carry[sid] = fruit_carry[sid] + f0 * duration + 0.5 * slope * duration * duration - reported
+
+            g0, g1 = _ramp_ends(cfg.get("grade_hz"))
+            times, grade_carry[sid] = _rate_event_times(t0, duration, g0, g1, grade_carry[sid])
+            events.extend(ScenarioEvent(t, "grade", sid, name) for t in times)
+            r0, r1 = _ramp_ends(cfg.get("weight_hz"))
+            times, weight_carry[sid] = _rate_event_times(t0, duration, r0, r1, weight_carry[sid])
+            events.extend(ScenarioEvent(t, "weight", sid, name) for t in times)
+
+            st_period = float(cfg.get("st_grade_period_s") or 0.0)
+            if st_period > 0:
+                k = 0
+                while k * st_period < duration:
+                    events.append(ScenarioEvent(t0 + k * st_period, "st_grade", sid, name))
+                    k += 1
+
+        end_mode = phase.get("end")
+        if end_mode:
+            if str(end_mode).lower() not in ("save", "clear"):
+                raise ValueError(f"phase {name}: end must be 'save' or 'clear', got {end_mode!r}")
+            ev = ScenarioEvent(t0 + duration, "end", -1, name)
+            ev.mode = str(end_mode).lower()
+            events.append(ev)
+        t0 += duration
+
+    # 同一时刻：先 END，再统计，再单果；子系统号小的在前
+    events.sort(key=lambda e: (round(e.t, 9), SCENARIO_EVENT_ORDER[e.kind], e.subsys))
+    for i, ev in enumerate(events):
+        ev.seq = i
+    return events
+
+
+def run_scenario(
+    args: argparse.Namespace,
+    scenario: Dict,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep
+) -> Dict[str, Dict[str, float]]:
+    """
+    按事件表回放场景：绝对截止时间（t0 + t / speed），随机数以场景 seed 固定，
+    同一场景文件每次回放产生完全相同的包序列
+    """
+    events = compile_scenario(scenario, default_subsys=args.subsys)
+    seed = scenario.get("seed", args.seed if args.seed is not None else 0)
+    random.seed(seed)
+    speed = max(1e-6, float(args.scenario_speed))
+
+    sub_args: Dict[int, argparse.Namespace] = {}
+    states: Dict[int, SimState] = {}
+    for sid in {ev.subsys for ev in events if ev.subsys >= 0}:
+        a = copy.copy(args)
+        a.subsys = sid
+        sub_args[sid] = a
+        states[sid] = SimState(a)
+
+    report: Dict[str, Dict[str, float]] = {}
+    batch_index = 0
+    name = scenario.get("name", "scenario")
+    log_info(f"[Scenario] {name}: phases={len(scenario['phases'])} events={len(events)} seed={seed} speed=x{speed:g}")
+
+    t0 = clock()
+    try:
+        for ev in events:
+            target = t0 + ev.t / speed
+            now = clock()
+            if target > now:
+                sleep(target - now)
+                now = clock()
+            late = max(0.0, now - target)
+
+            ph = report.setdefault(ev.phase, {"events": 0, "ok": 0, "fail": 0, "fruit": 0, "max_late_ms": 0.0,
+                                              "start_s": now - t0, "end_s": now - t0})
+            if ev.kind == "end":
+                for st in states.values():
+                    st.reset()
+                ok = emit_end_control(args, None, ev.mode, batch_index)
+                batch_index += 1
+            else:
+                a = sub_args[ev.subsys]
+                if ev.kind == "stats":
+                    st = states[ev.subsys]
+                    accumulate_fruit(a, st, ev.increment, dist_override=ev.dist or None,
+                                     weight_range=ev.weight_range)
+                    ph["fruit"] += ev.increment
+                    ok = emit_statistics(a, st)
+                    st.cycles_done += 1
+                elif ev.kind == "grade":
+                    ok = emit_grade(a)
+                elif ev.kind == "weight":
+                    ok = emit_weight(a)
+                else:
+                    ok = emit_st_grade(a)
+
+            ph["events"] += 1
+            ph["ok" if ok else "fail"] += 1
+            ph["max_late_ms"] = max(ph["max_late_ms"], late * 1000.0)
+            ph["end_s"] = clock() - t0
+    except KeyboardInterrupt:
+        log_info("[Scenario] stopped by user.")
+
+    for phase_name, ph in report.items():
+        wall = max(1e-9, ph["end_s"] - ph["start_s"])
+        log_info(
+            f"[Scenario] phase={phase_name} events={ph['events']} ok={ph['ok']} fail={ph['fail']} "
+            f"fruit={ph['fruit']} wall={wall:.2f}s rate={ph['events'] / wall:.1f}ev/s max_late={ph['max_late_ms']:.2f}ms"
+        )
+    return report
+
+
+# ==================== 拆包/粘包 压力模式 ====================
+# 在真实帧流中按比例注入：拆分写、多帧合并写、垃圾前缀、错误 dstId、截断包体、
+# 未知命令、逐字节慢速发送；--torture-loopback 时由本地“可重同步”接收端统计
+# 有效吞吐与重同步耗时（Native TcpServer 遇到 SYNC 不匹配会直接断开连接）。
+
+TORTURE_KINDS = ("split", "coalesce", "garbage", "wrong_dst", "truncate", "unknown", "drip")
+UNKNOWN_CMD_ID = 0x7FFF
+
+
+def torture_body_lengths() -> Dict[int, int]:
+    """
+    与 native_module.cpp setDataLength 一致：包体长度由命令号决定
+    """
+    return {
+        FSM_CMD_STATISTICS: expected_statistics_size(),
+        FSM_CMD_GRADEINFO: expected_grade_info_size(),
+        FSM_CMD_WEIGHTINFO: expected_weight_result_size(),
+    }
+
+
+def parse_torture_rates(spec: str) -> Dict[str, float]:
+    """
+    解析注入比例，例如: "split:0.1,garbage:0.05,drip:0.01"（每帧独立按概率触发）
+    """
+    rates = {k: 0.0 for k in TORTURE_KINDS}
+    for part in [p.strip() for p in (spec or "").split(",") if p.strip()]:
+        if ":" not in part:
+            continue
+        k, v = part.split(":", 1)
+        k = k.strip()
+        if k not in rates:
+            raise ValueError(f"unknown torture kind '{k}', expected one of {TORTURE_KINDS}")
+        rates[k] = max(0.0, min(1.0, float(v)))
+    return rates
+
+
+def build_frame_pool(args: argparse.Namespace, size: int = 64) -> List[bytes]:
+    state = SimState(args)
+    pool: List[bytes] = []
+    for i in range(size):
+        if i % 8 == 0:
+            accumulate_fruit(args, state, random.randint(args.min_inc, args.max_inc))
+            header = create_header_with_ids(FSM_CMD_STATISTICS, make_src_id(args.subsys, channel_index=args.stats_channel), HC_ID)
+            body = create_statistics(
+                n_total_cup_num=state.current_yield,
+                n_total_weight=state.current_total_weight,
+                exit_counts=state.exit_counts,
+                exit_weight_counts=state.exit_weight_counts,
+                n_qual=args.qual_num,
+                n_size=args.size_num,
+                subsys_index=args.subsys
+            )
+        elif i % 2 == 0:
+            header = create_header_with_ids(FSM_CMD_GRADEINFO, make_src_id(args.subsys, ipm_index=0), HC_ID)
+            body = create_grade_info(random.randint(0, 9), random.randint(0, 9), 0)
+        else:
+            header = create_header_with_ids(FSM_CMD_WEIGHTINFO, make_src_id(args.subsys, channel_index=args.weight_channel), HC_ID)
+            body = create_weight_info(random.randint(100, 250), random.randint(0, 9))
+        pool.append(header + body)
+    return pool
+
+
+def random_garbage(n: int) -> bytes:
+    out = bytearray(random.getrandbits(8) for _ in range(n))
+    # 保证垃圾里不出现 "SYNC"，否则就不是纯垃圾前缀
+    return bytes(out).replace(b"SYNC", b"SYNX")
+
+
+class ResyncReceiver:
+    """
+    可重同步的参考接收端：扫描 SYNC，校验 dstId 与命令号，按命令号取包体长度
+    包体长度只由命令号推出：按该长度算出的包体内若出现 SYNC，说明帧被截断、吞掉了下一帧，
+    计为 truncated 并从那个 SYNC 重同步
+    记录有效帧、丢弃字节、重同步次数与重同步耗时（从首个坏字节到下一个有效帧）
+    """
+    def __init__(self, body_lengths: Dict[int, int], local_dst_id: int = HC_ID) -> None:
+        self.body_lengths = body_lengths
+        self.local_dst_id = local_dst_id
+        self.buf = bytearray()
+        self.frames = 0
+        self.frame_bytes = 0
+        self.wrong_dst = 0
+        self.unknown_cmd = 0
+        self.truncated = 0
+        self.skipped_bytes = 0
+        self.resyncs = 0
+        self.resync_times: List[float] = []
+        self._corrupt_since: Optional[float] = None
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+
+    def _mark_corrupt(self, now: float) -> None:
+        if self._corrupt_since is None:
+            self._corrupt_since = now
+            self.resyncs += 1
+
+    def feed(self, data: bytes, now: float) -> None:
+        if self.first_at is None:
+            self.first_at = now
+        self.buf += data
+        self._scan(now, eof=False)
+
+    def finish(self, now: float) -> None:
+        """
+        连接关闭：最后一帧之后不会再有 SYNC，照常收下；剩余不足一帧的字节计为丢弃
+        """
+        self._scan(now, eof=True)
+        if self.buf:
+            self._mark_corrupt(now)
+            self.skipped_bytes += len(self.buf)
+            self.buf.clear()
+        self._corrupt_since = None  # 下一条连接重新开始计重同步
+
+    def _scan(self, now: float, eof: bool) -> None:
+        buf = self.buf
+        pos = 0
+        while True:
+            if len(buf) - pos < 16:
+                break
+            if buf[pos:pos + 4] != b"SYNC":
+                j = buf.find(b"SYNC", pos + 1)
+                self._mark_corrupt(now)
+                if j < 0:
+                    keep = max(pos, len(buf) - 3)
+                    self.skipped_bytes += keep - pos
+                    pos = keep
+                    break
+                self.skipped_bytes += j - pos
+                pos = j
+                continue
+            _, src_id, dst_id, cmd_id = struct.unpack_from("<4I", buf, pos)
+            body_len = self.body_lengths.get(cmd_id)
+            if body_len is None:
+                self.unknown_cmd += 1
+                self._mark_corrupt(now)
+                self.skipped_bytes += 4
+                pos += 4
+                continue
+            end = pos + 16 + body_len
+            if len(buf) < end:
+                break
+            if not eof and len(buf) < end + 3:
+                break  # 可能有 SYNC 跨在帧尾，等帧尾之后 3 字节收全再判
+            j = buf.find(b"SYNC", pos + 4, end + 3)
+            if j >= 0:
+                # 包体里出现下一帧的 SYNC：本帧被截断；帧尾之后的垃圾则不影响本帧，由下一轮跳过
+                self.truncated += 1
+                self._mark_corrupt(now)
+                self.skipped_bytes += j - pos
+                pos = j
+                continue
+            if dst_id != self.local_dst_id:
+                self.wrong_dst += 1
+            else:
+                self.frames += 1
+                self.frame_bytes += 16 + body_len
+                self.last_at = now
+                if self._corrupt_since is not None:
+                    self.resync_times.append(now - self._corrupt_since)
+                    self._corrupt_since = None
+            pos = end
+        if pos:
+            del buf[:pos]
+
+    def summary(self) -> Dict[str, float]:
+        span = max(1e-9, (self.last_at or 0.0) - (self.first_at or 0.0))
+        rt = sorted(self.resync_times)
+        return {
+            "frames": self.frames,
+            "goodput_mb_s": self.frame_bytes / span / 1e6,
+            "frames_per_s": self.frames / span,
+            "wrong_dst": self.wrong_dst,
+            "unknown_cmd": self.unknown_cmd,
+            "truncated": self.truncated,
+            "skipped_bytes": self.skipped_bytes,
+            "resyncs": self.resyncs,
+            "resync_avg_ms": (sum(rt) / len(rt) * 1000.0) if rt else 0.0,
+            "resync_p95_ms": (rt[min(len(rt) - 1, int(len(rt) * 0.95))] * 1000.0) if rt else 0.0,
+            "resync_max_ms": (rt[-1] * 1000.0) if rt else 0.0,
+        }
+
+
+def start_loopback_receiver(receiver: ResyncReceiver) -> Tuple[socket.socket, int, "threading.Thread"]:
+    import threading
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(4)
+    port = srv.getsockname()[1]
+
+    def serve() -> None:
+        while True:
+            try:
+                conn, _ = srv.accept()
+            except OSError:
+                return
+            with conn:
+                while True:
+                    try:
+                        chunk = conn.recv(65536)
+                    except OSError:
+                        break
+                    if not chunk:
+                        break
+                    receiver.feed(chunk, time.perf_counter())
+            receiver.finish(time.perf_counter())
+
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+    return srv, port, t
+
+
+def torture_stream(args: argparse.Namespace, host: str, port: int, rates: Dict[str, float], frames: int) -> Dict[str, float]:
+    pool = build_frame_pool(args)
+    body_lengths = torture_body_lengths()
+    injected = {k: 0 for k in TORTURE_KINDS}
+    sent_bytes = 0
+    reconnects = 0
+    drip_delay = max(0.0, float(args.drip_delay_ms)) / 1000.0
+    sock: Optional[socket.socket] = None
+
+    def connect() -> socket.socket:
+        s = socket.create_connection((host, port), timeout=5)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return s
+
+    def write(data: bytes) -> None:
+        nonlocal sock, reconnects, sent_bytes
+        for _ in range(2):
+            try:
+                if sock is None:
+                    sock = connect()
+                sock.sendall(data)
+                sent_bytes += len(data)
+                return
+            except OSError:
+                # Native 端在 SYNC 错误时断开连接：重连计数，丢掉这次写
+                reconnects += 1
+                try:
+                    if sock is not None:
+                        sock.close()
+                except OSError:
+                    pass
+                sock = None
+
+    t0 = time.perf_counter()
+    pending = bytearray()
+    for i in range(frames):
+        frame = bytearray(pool[i % len(pool)])
+        cmd_id = struct.unpack_from("<I", frame, 12)[0]
+        if random.random() < rates["wrong_dst"]:
+            struct.pack_into("<I", frame, 8, HC_ID ^ 0x0F0F)
+            injected["wrong_dst"] += 1
+        if random.random() < rates["truncate"]:
+            cut = random.randint(1, max(1, body_lengths.get(cmd_id, 16) - 1))
+            del frame[len(frame) - cut:]
+            injected["truncate"] += 1
+        if random.random() < rates["unknown"]:
+            unk = create_header_with_ids(UNKNOWN_CMD_ID, FSM_ID, HC_ID) + random_garbage(random.randint(4, 64))
+            frame = bytearray(unk) + frame
+            injected["unknown"] += 1
+        if random.random() < rates["garbage"]:
+            frame = bytearray(random_garbage(random.randint(1, 128))) + frame
+            injected["garbage"] += 1
+
+        if random.random() < rates["coalesce"]:
+            # 与后续帧合并成一次写（粘包）
+            pending += frame
+            injected["coalesce"] += 1
+            continue
+        data = bytes(pending + frame)
+        pending = bytearray()
+
+        if random.random() < rates["drip"]:
+            injected["drip"] += 1
+            for b in range(len(data)):
+                write(data[b:b + 1])
+                if drip_delay > 0:
+                    time.sleep(drip_delay)
+        elif random.random() < rates["split"]:
+            injected["split"] += 1
+            cuts = sorted(random.sample(range(1, len(data)), k=min(len(data) - 1, random.randint(1, 3))))
+            last = 0
+            for c in cuts + [len(data)]:
+                write(data[last:c])
+                last = c
+        else:
+            write(data)
+    if pending:
+        write(bytes(pending))
+    elapsed = max(1e-9, time.perf_counter() - t0)
+    if sock is not None:
+        sock.close()
+    out: Dict[str, float] = {"frames": frames, "sent_bytes": sent_bytes, "elapsed_s": elapsed,
+                             "send_mb_s": sent_bytes / elapsed / 1e6, "reconnects": reconnects}
+    out.update({f"inj_{k}": v for k, v in injected.items()})
+    return out
+
+
+def run_torture(args: argparse.Namespace) -> None:
+    rates = parse_torture_rates(args.torture)
+    frames = int(args.torture_frames)
+    passes = [("baseline", {k: 0.0 for k in TORTURE_KINDS}), ("torture", rates)] if args.torture_baseline \
+        else [("torture", rates)]
+    results: Dict[str, Dict[str, float]] = {}
+    for name, pass_rates in passes:
+        if args.torture_loopback:
+            receiver = ResyncReceiver(torture_body_lengths())
+            srv, port, t = start_loopback_receiver(receiver)
+            sender = torture_stream(args, "127.0.0.1", port, pass_rates, frames)
+            time.sleep(0.2)
+            srv.close()
+            t.join(timeout=1.0)
+            result = dict(sender)
+            result.update({f"rx_{k}": v for k, v in receiver.summary().items()})
+        else:
+            result = torture_stream(args, SERVER_IP, SERVER_PORT, pass_rates, frames)
+        results[name] = result
+        log_info(f"[Torture] {name}: " + " ".join(
+            f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+
+    if "baseline" in results and args.torture_loopback:
+        b = results["baseline"]
+        t = results["torture"]
+        ratio = t["rx_goodput_mb_s"] / b["rx_goodput_mb_s"] if b["rx_goodput_mb_s"] > 0 else 0.0
+        lost = b["rx_frames"] - t["rx_frames"]
+        log_info(
+            f"[Torture] goodput {b['rx_goodput_mb_s']:.2f} -> {t['rx_goodput_mb_s']:.2f} MB/s (x{ratio:.2f}), "
+            f"frames lost={lost}, resyncs={t['rx_resyncs']} avg/p95/max="
+            f"{t['rx_resync_avg_ms']:.3f}/{t['rx_resync_p95_ms']:.3f}/{t['rx_resync_max_ms']:.3f}ms"
+        )
+
+
+# ==================== 背压感知发送 ====================
+# 发射器只负责入队；发送线程按令牌桶速率取包，并用 AIMD 根据连接耗时/失败调整速率：
+#   失败或超时 -> 速率减半；连接耗时超过目标 -> 乘 0.85；否则小步加速。
+# 队列满时按策略丢包：先丢最旧的 Statistics（累计快照，新包可覆盖旧包），
+# 再丢最旧的单果/表头包，END_* 控制命令永不丢弃。最终收敛的速率即接收端的实际承载能力。
+
+class _QueuedPacket:
+    __slots__ = ("kind", "name", "header", "body", "cmd", "enqueued_at")
+
+    def __init__(self, kind: str, name: str, header: bytes, body: bytes, cmd: str = "") -> None:
+        self.kind = kind
+        self.name = name
+        self.header = header
+        self.body = body
+        self.cmd = cmd
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return len(self.header) + len(self.body) if self.kind != "control" else len(self.cmd)
+
+
+def socket_unsent_bytes(sock: socket.socket) -> int:
+    """
+    内核发送队列中尚未发出的字节数（Linux TIOCOUTQ；其他平台返回 0）
+    """
+    try:
+        import fcntl
+        import termios
+        buf = fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, b"\x00\x00\x00\x00")
+        return struct.unpack("i", buf)[0]
+    except Exception:
+        return 0
+
+
+class BackpressureSender:
+    def __init__(self, args: argparse.Namespace, host: Optional[str] = None, port: Optional[int] = None,
+                 label: str = "Backpressure") -> None:
+        import threading
+        self.host = host or SERVER_IP
+        self.port = int(port or SERVER_PORT)
+        self.label = label
+        self.control_port = int(args.control_port)
+        self.timeout_s = float(args.bp_timeout_s)
+        self.rate = float(args.bp_initial_rate)
+        self.min_rate = float(args.bp_min_rate)
+        self.max_rate = float(args.bp_max_rate)
+        self.target_s = float(args.bp_target_ms) / 1000.0
+        self.max_queue = max(1, int(args.bp_queue))
+        self.queue: "deque[_QueuedPacket]" = deque()
+        self.queued_bytes = 0
+        self.cond = threading.Condition()
+        self.running = True
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+
+        self.sent = 0
+        self.sent_bytes = 0
+        self.failed = 0
+        self.dropped: Dict[str, int] = {}
+        self.max_unsent = 0
+        self.connect_ms: "deque[float]" = deque(maxlen=2048)
+        self.rate_history: "deque[float]" = deque(maxlen=200)
+        self.service_s: "deque[float]" = deque(maxlen=64)
+        self.lag_ms: "deque[float]" = deque(maxlen=2048)  # 入队到发送完成
+        self.t0 = time.monotonic()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    # ---- sink 接口 ----
+    def send_packet(self, header: bytes, body: bytes, name: str) -> bool:
+        kind = "statistics" if name.startswith("Statistics") else "data"
+        return self._enqueue(_QueuedPacket(kind, name, header, body))
+
+    def send_control(self, cmd: str, host: str, port: int) -> bool:
+        return self._enqueue(_QueuedPacket("control", f"Control:{cmd}", b"", b"", cmd))
+
+    def _enqueue(self, item: _QueuedPacket) -> bool:
+        with self.cond:
+            accepted = True
+            if len(self.queue) >= self.max_queue and item.kind != "control":
+                accepted = self._drop_one(item)
+            if accepted:
+                self.queue.append(item)
+                self.queued_bytes += item.size
+                self.cond.notify()
+            return accepted
+
+    def _drop_one(self, incoming: _QueuedPacket) -> bool:
+        # 丢最旧的 Statistics -> 最旧的其他数据包 -> 丢弃新包；控制命令不动
+        for kind in ("statistics", "data"):
+            for i, q in enumerate(self.queue):
+                if q.kind == kind:
+                    del self.queue[i]
+                    self.queued_bytes -= q.size
+                    self.dropped[q.name] = self.dropped.get(q.name, 0) + 1
+                    return True
+        self.dropped[incoming.name] = self.dropped.get(incoming.name, 0) + 1
+        return False
+
+    # ---- 发送线程 ----
+    def _take_token(self) -> None:
+        while self.running:
+            now = time.monotonic()
+            self.tokens = min(max(1.0, self.rate * 0.1), self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return
+            time.sleep((1.0 - self.tokens) / max(self.rate, 1e-6))
+
+    def _worker(self) -> None:
+        while True:
+            with self.cond:
+                while self.running and not self.queue:
+                    self.cond.wait(0.5)
+                if not self.queue:
+                    return
+            self._take_token()
+            with self.cond:
+                if not self.queue:
+                    continue
+                item = self.queue.popleft()
+                self.queued_bytes -= item.size
+            t_send = time.monotonic()
+            ok, connect_s = self._send(item)
+            self._adjust(ok, connect_s, time.monotonic() - t_send)
+
+    def _send(self, item: _QueuedPacket) -> Tuple[bool, float]:
+        port = self.control_port if item.kind == "control" else self.port
+        payload = item.cmd.encode("utf-8") if item.kind == "control" else item.header + item.body
+        t0 = time.monotonic()
+        connect_s = self.timeout_s
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.settimeout(self.timeout_s)
+                s.connect((self.host, port))
+                connect_s = time.monotonic() - t0
+                s.sendall(payload)
+                unsent = socket_unsent_bytes(s)
+                if unsent > self.max_unsent:
+                    self.max_unsent = unsent
+            self.connect_ms.append(connect_s * 1000.0)
+            self.lag_ms.append((time.monotonic() - item.enqueued_at) * 1000.0)
+            self.sent += 1
+            self.sent_bytes += len(payload)
+            if SHOW_SEND_LOGS and item.kind != "control":
+                log_header_preview(item.header, item.body, item.name)
+            return True, connect_s
+        except Exception as e:
+            self.failed += 1
+            log_error(f"[{self.label}] send {item.name} failed: {e}")
+            return False, connect_s
+
+    def service_capacity(self) -> float:
+        # 单发送线程下，最近 64 包平均服务时间的倒数即接收端当前可承载的包速率
+        total = sum(self.service_s)
+        return len(self.service_s) / total if total > 0 else self.max_rate
+
+    def _adjust(self, ok: bool, connect_s: float, service_s: float) -> None:
+        self.service_s.append(service_s)
+        if not ok:
+            self.rate = max(self.min_rate, self.rate * 0.5)
+        elif connect_s > self.target_s:
+            self.rate = max(self.min_rate, self.rate * 0.85)
+        else:
+            # 加速不超过服务能力的 1.25 倍，避免令牌桶速率脱离实际吞吐无限上涨
+            ceiling = min(self.max_rate, max(self.min_rate, self.service_capacity() * 1.25))
+            self.rate = min(ceiling, self.rate + max(1.0, self.rate * 0.02))
+        self.rate_history.append(self.rate)
+
+    # ---- 报告 ----
+    def snapshot(self) -> Dict[str, float]:
+        elapsed = max(1e-9, time.monotonic() - self.t0)
+        lat = sorted(self.connect_ms)
+        hist = sorted(self.rate_history)
+        lag = sorted(self.lag_ms)
+        with self.cond:
+            depth = len(self.queue)
+            queued_bytes = self.queued_bytes
+            oldest_s = time.monotonic() - self.queue[0].enqueued_at if self.queue else 0.0
+        return {
+            "rate_now": self.rate,
+            "sustainable_rate": min(hist[len(hist) // 2] if hist else self.rate, self.service_capacity()),
+            "service_capacity": self.service_capacity(),
+            "achieved_pps": self.sent / elapsed,
+            "achieved_kb_s": self.sent_bytes / elapsed / 1024.0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": sum(self.dropped.values()),
+            "queue_depth": depth,
+            "queued_bytes": queued_bytes,
+            "max_unsent_bytes": self.max_unsent,
+            "connect_p50_ms": lat[len(lat) // 2] if lat else 0.0,
+            "connect_p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))] if lat else 0.0,
+            "lag_p50_ms": lag[len(lag) // 2] if lag else 0.0,
+            "lag_p95_ms": lag[min(len(lag) - 1, int(len(lag) * 0.95))] if lag else 0.0,
+            "oldest_queued_ms": oldest_s * 1000.0,
+        }
+
+    def log_report(self) -> None:
+        st = self.snapshot()
+        log_info(
+            f"[{self.label}] rate={st['rate_now']:.1f}pps sustainable~{st['sustainable_rate']:.1f}pps "
+            f"capacity~{st['service_capacity']:.1f}pps "
+            f"achieved={st['achieved_pps']:.1f}pps/{st['achieved_kb_s']:.1f}KB/s sent={st['sent']} "
+            f"failed={st['failed']} dropped={st['dropped']} queue={st['queue_depth']}({st['queued_bytes']}B) "
+            f"unsentMax={st['max_unsent_bytes']}B connect p50/p95={st['connect_p50_ms']:.2f}/{st['connect_p95_ms']:.2f}ms"
+        )
+        if self.dropped:
+            log_info(f"[{self.label}] dropped by type: " + ", ".join(f"{k}={v}" for k, v in sorted(self.dropped.items())))
+
+    def close(self, drain_timeout_s: float = 5.0) -> None:
+        deadline = time.monotonic() + drain_timeout_s
+        while time.monotonic() < deadline:
+            with self.cond:
+                if not self.queue:
+                    break
+            time.sleep(0.05)
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout=1.0)
+
+def parse_targets(spec: str, default_port: int) -> List[Tuple[str, int]]:
+    """
+    "192.168.1.10,192.168.1.11:9091" -> [(host, port), ...]，未写端口用 default_port
+    """
+    targets: List[Tuple[str, int]] = []
+    for part in (p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        host, sep, port = part.rpartition(":")
+        if not sep:
+            host, port = part, ""
+        targets.append((host, int(port) if port else default_port))
+    return targets
+
+
+class FanoutSink:
+    """
+    PACKET_SINK 实现：同一帧只编码一次，分发给 N 个目标
+    每个目标一个 BackpressureSender（独立连接/队列/限速线程），慢目标只会在自己的队列里丢包，不阻塞其它目标
+    """
+    def __init__(self, args: argparse.Namespace, targets: List[Tuple[str, int]]) -> None:
+        self.senders = [BackpressureSender(args, host, port, label=f"Fanout {host}:{port}") for host, port in targets]
+        self.frames = 0
+
+    def send_packet(self, header: bytes, body: bytes, name: str) -> bool:
+        self.frames += 1
+        accepted = [s.send_packet(header, body, name) for s in self.senders]
+        return any(accepted)
+
+    def send_control(self, cmd: str, host: str, port: int) -> bool:
+        return any([s.send_control(cmd, s.host, port) for s in self.senders])
+
+    def log_report(self) -> None:
+        log_info(f"[Fanout] frames={self.frames} targets={len(self.senders)}")
+        for s in self.senders:
+            st = s.snapshot()
+            log_info(
+                f"[Fanout] {s.host}:{s.port} delivered={st['sent']} ({st['achieved_pps']:.1f}pps) "
+                f"lag p50/p95={st['lag_p50_ms']:.1f}/{st['lag_p95_ms']:.1f}ms oldest={st['oldest_queued_ms']:.0f}ms "
+                f"queue={st['queue_depth']} dropped={st['dropped']} failed={st['failed']} rate={st['rate_now']:.1f}pps"
+            )
+
+    def close(self) -> None:
+        # 并行排空，避免慢目标把关闭时间串行叠加
+        import threading
+        threads = [threading.Thread(target=s.close) for s in self.senders]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+
+def start_periodic_reporter(fn: Callable[[], None], interval_s: float) -> None:
+    import threading
+
+    def loop() -> None:
+        while True:
+            time.sleep(interval_s)
+            fn()
+
+    threading.Thread(target=loop, daemon=True).start()
+
+
+# ==================== 长稳（soak）资源监控 ====================
+# 周期采样 RSS / tracemalloc / FD / 套接字状态 / GC，逐行写入 JSONL 时间序列；
+# 对窗口内样本做最小二乘斜率（每小时增量），超过阈值即告警。
+# 注意：tcp_* 是整机按端口统计（含同机其它进程、其它客户端），不是本进程独占的连接数。
+
+TCP_STATES = {
+    "01": "ESTABLISHED", "02": "SYN_SENT", "03": "SYN_RECV", "04": "FIN_WAIT1", "05": "FIN_WAIT2",
+    "06": "TIME_WAIT", "07": "CLOSE", "08": "CLOSE_WAIT", "09": "LAST_ACK", "0A": "LISTEN", "0B": "CLOSING",
+}
+SOAK_DEFAULT_SLOPES = "rss_kb=2048,fds=2,tcp_time_wait=200,tcp_close_wait=2,gc_objects=5000,traced_kb=1024,threads=1"
+
+
+def parse_slopes(spec: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip()] = float(v)
+    return out
+
+
+def read_rss_kb() -> Optional[int]:
+    """
+    当前 RSS（KB）；读不到 /proc 时返回 None，不拿峰值冒充当前值
+    """
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def read_peak_rss_kb() -> int:
+    """
+    进程生命周期内的峰值 RSS（KB），只增不减，不能用于判断泄漏是否仍在发生
+    """
+    import resource
+    import sys
+    peak = int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS 单位为字节
+
+
+def count_fds() -> int:
+    import os
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return -1
+
+
+def tcp_state_counts(ports: set) -> Dict[str, int]:
+    """
+    整机 /proc/net/tcp{,6} 中本端或对端端口属于 ports 的连接按状态计数
+    （TIME_WAIT 不归属进程，只能按端口归因，因此同机其它进程用这些端口的连接也会计入）
+    """
+    counts: Dict[str, int] = {}
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path, "r", encoding="ascii") as f:
+                next(f, None)
+                for line in f:
+                    cols = line.split()
+                    if len(cols) < 4:
+                        continue
+                    remote_port = int(cols[2].rsplit(":", 1)[1], 16)
+                    local_port = int(cols[1].rsplit(":", 1)[1], 16)
+                    if remote_port in ports or local_port in ports:
+                        state = TCP_STATES.get(cols[3], cols[3])
+                        counts[state] = counts.get(state, 0) + 1
+        except OSError:
+            continue
+    return counts
+
+
+def log_file_bytes() -> int:
+    total = 0
+    for h in LOGGER.handlers:
+        stream = getattr(h, "stream", None)
+        if isinstance(h, logging.FileHandler) and stream is not None:
+            try:
+                total += stream.tell()
+            except (OSError, ValueError):
+                pass
+    return total
+
+
+class SoakMonitor:
+    """
+    长稳监控：sample() 由后台线程按 --soak-interval-s 调用
+    """
+    def __init__(self, args: argparse.Namespace) -> None:
+        import collections
+        import gc
+        import threading
+        self.args = args
+        self.gc = gc
+        self.threading = threading
+        self.path = args.soak_out or time.strftime("soak_%Y%m%d_%H%M%S.jsonl")
+        self.out = open(self.path, "a", encoding="utf-8", buffering=1)
+        self.slopes = parse_slopes(args.soak_slopes)
+        window = max(3, int(args.soak_window_s / max(1e-6, args.soak_interval_s)))
+        self.history: "collections.deque" = collections.deque(maxlen=window)
+        self.ports = {int(args.port), int(args.control_port), int(args.cmd_port)}
+        self.t0 = time.monotonic()
+        # 采样线程与 close() 共用：close 之后 sample() 不再写已关闭的文件
+        self.lock = threading.Lock()
+        self.closed = False
+        self.alerts = 0
+        self.alerting: set = set()
+        self.baseline = None
+        self.top_n = int(args.soak_top)
+        if self.top_n > 0:
+            import tracemalloc
+            self.tracemalloc = tracemalloc
+            tracemalloc.start(max(1, int(args.soak_frames)))
+            self.baseline = tracemalloc.take_snapshot()
+
+    def _tracemalloc_sample(self, rec: dict) -> None:
+        tm = self.tracemalloc
+        current, peak = tm.get_traced_memory()
+        rec["traced_kb"] = current // 1024
+        rec["traced_peak_kb"] = peak // 1024
+        snap = tm.take_snapshot().filter_traces((
+            tm.Filter(False, tm.__file__),
+            tm.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        # 相对启动基线的增长，比绝对占用更能指向泄漏点
+        stats = snap.compare_to(self.baseline, "lineno")[: self.top_n]
+        rec["top_growth"] = [
+            {"where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "kb": s.size // 1024,
+             "diff_kb": s.size_diff // 1024, "count": s.count}
+            for s in stats
+        ]
+
+    def sample(self) -> Optional[dict]:
+        with self.lock:
+            if self.closed:
+                return None
+            return self._sample()
+
+    def _sample(self) -> dict:
+        gc = self.gc
+        t = time.monotonic() - self.t0
+        tcp = tcp_state_counts(self.ports)
+        gen_stats = gc.get_stats()
+        rec = {
+            "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "t_s": round(t, 1),
+            "rss_kb": read_rss_kb(),
+            "rss_peak_kb": read_peak_rss_kb(),
+            "fds": count_fds(),
+            "threads": self.threading.active_count(),
+            "tcp_established": tcp.get("ESTABLISHED", 0),
+            "tcp_time_wait": tcp.get("TIME_WAIT", 0),
+            "tcp_close_wait": tcp.get("CLOSE_WAIT", 0),
+            "tcp_states": tcp,
+            "tcp_scope_ports": sorted(self.ports),
+            "gc_objects": len(gc.get_objects()),
+            "gc_counts": list(gc.get_count()),
+            "gc_collections": [s.get("collections", 0) for s in gen_stats],
+            "gc_uncollectable": sum(s.get("uncollectable", 0) for s in gen_stats),
+            "log_bytes": log_file_bytes(),
+        }
+        if self.top_n > 0:
+            self._tracemalloc_sample(rec)
+        self.history.append(rec)
+        rec["alerts"] = self._check_slopes()
+        self.out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        return rec
+
+    def slope_per_hour(self, key: str) -> Optional[float]:
+        pts = [(r["t_s"], r[key]) for r in self.history if isinstance(r.get(key), (int, float))]
+        if len(pts) < 3:
+            return None
+        n = float(len(pts))
+        mx = sum(p[0] for p in pts) / n
+        my = sum(p[1] for p in pts) / n
+        sxx = sum((p[0] - mx) ** 2 for p in pts)
+        if sxx <= 0:
+            return None
+        return sum((p[0] - mx) * (p[1] - my) for p in pts) / sxx * 3600.0
+
+    def _check_slopes(self) -> List[dict]:
+        # 窗口填满前斜率对启动期的冷启动增长过于敏感，不告警
+        if len(self.history) < self.history.maxlen:
+            return []
+        fired = []
+        for key, limit in self.slopes.items():
+            slope = self.slope_per_hour(key)
+            if slope is None:
+                continue
+            if slope > limit:
+                fired.append({"metric": key, "slope_per_h": round(slope, 2), "limit_per_h": limit})
+                if key not in self.alerting:
+                    self.alerts += 1
+                    self.alerting.add(key)
+                    log_error(f"[Soak] ALERT {key} growing {slope:.1f}/h (limit {limit:g}/h) "
+                              f"now={self.history[-1][key]}")
+            else:
+                self.alerting.discard(key)
+        return fired
+
+    def log_report(self) -> None:
+        rec = self.sample()
+        if rec is not None:
+            self._log_sample(rec)
+
+    def _log_sample(self, rec: dict) -> None:
+        top = rec.get("top_growth") or []
+        where = f" top={top[0]['where']}(+{top[0]['diff_kb']}KB)" if top else ""
+        rss = f"{rec['rss_kb']}KB" if rec["rss_kb"] is not None else "n/a"
+        log_info(
+            f"[Soak] t={rec['t_s'] / 3600.0:.2f}h rss={rss} rss_peak={rec['rss_peak_kb']}KB fds={rec['fds']} "
+            f"threads={rec['threads']} host_tcp@ports(est/tw/cw)="
+            f"{rec['tcp_established']}/{rec['tcp_time_wait']}/{rec['tcp_close_wait']} "
+            f"gc_objects={rec['gc_objects']} alerts={self.alerts}{where}"
+        )
+
+    def close(self) -> None:
+        # 持锁完成最后一次采样并置 closed，之后到点的后台采样直接放弃
+        with self.lock:
+            if self.closed:
+                return
+            rec = self._sample()
+            self.closed = True
+            self.out.close()
+        self._log_sample(rec)
+        slopes = {k: self.slope_per_hour(k) for k in self.slopes}
+        log_info("[Soak] slopes/h " + " ".join(f"{k}={v:.1f}" for k, v in slopes.items() if v is not None)
+                 + f" -> {self.path}")
+
+
+# ==================== UDP 批量发送（单果实时流） ====================
+# 数据报格式（小端）：
+#   UdpBatchHeader: magic "FBAT"(4) + seq u32 + frameCount u16 + flags u16 + sendTsUs u32   = 16 bytes
+#   之后紧跟 frameCount 个原样帧（SYNC + src + dst + cmd + body），包体长度由命令号决定
+# 只有 FSM_CMD_GRADEINFO / FSM_CMD_WEIGHTINFO 走 UDP，其它包仍走原 TCP 短连接。
+
+UDP_BATCH_MAGIC = b"FBAT"
+UDP_BATCH_HEADER = struct.Struct("<4sIHHI")
+UDP_PORT = 9091
+UDP_STREAM_CMDS = (FSM_CMD_GRADEINFO, FSM_CMD_WEIGHTINFO)
+
+
+def _wall_us32() -> int:
+    return (time.time_ns() // 1000) & 0xFFFFFFFF
+
+
+class UdpBatchSink:
+    """
+    PACKET_SINK 实现：单果帧按 MTU 打包成数据报，满包或超过 flush_ms 即发送
+    dry_run 时照常打包计数，但不做任何 socket 发送
+    """
+    def __init__(self, host: str, port: int, mtu: int, flush_ms: float, dry_run: bool = False) -> None:
+        import threading
+        self.addr = (host, port)
+        self.mtu = max(UDP_BATCH_HEADER.size + 64, int(mtu))
+        self.flush_s = max(0.0, float(flush_ms)) / 1000.0
+        self.dry_run = dry_run
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.batch = bytearray(UDP_BATCH_HEADER.size)
+        self.batch_frames = 0
+        self.batch_started = 0.0
+        self.seq = 0
+        self.datagrams = 0
+        self.frames = 0
+        self.bytes = 0
+        self.errors = 0
+        self.t0 = time.monotonic()
+        self.running = True
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+
+    def send_packet(self, header: bytes, body: bytes, name: str) -> bool:
+        cmd_id = struct.unpack_from("<I", header, 12)[0]
+        if cmd_id not in UDP_STREAM_CMDS:
+            if self.dry_run:
+                return True
+            return send_once(header, body, name)
+        frame_len = len(header) + len(body)
+        with self.lock:
+            if self.batch_frames and len(self.batch) + frame_len > self.mtu:
+                self._flush_locked()
+            if not self.batch_frames:
+                self.batch_started = time.monotonic()
+            self.batch += header
+            self.batch += body
+            self.batch_frames += 1
+            if len(self.batch) + frame_len > self.mtu:
+                self._flush_locked()
+        return True
+
+    def send_control(self, cmd: str, host: str, port: int) -> bool:
+        return True if self.dry_run else send_control(cmd, host, port)
+
+    def _flush_locked(self) -> None:
+        if not self.batch_frames:
+            return
+        UDP_BATCH_HEADER.pack_into(self.batch, 0, UDP_BATCH_MAGIC, self.seq & 0xFFFFFFFF, self.batch_frames, 0, _wall_us32())
+        try:
+            if not self.dry_run:
+                self.sock.sendto(self.batch, self.addr)
+            self.datagrams += 1
+            self.frames += self.batch_frames
+            self.bytes += len(self.batch)
+        except OSError as e:
+            self.errors += 1
+            log_error(f"[UDP] sendto failed: {e}")
+        self.seq += 1
+        self.batch = bytearray(UDP_BATCH_HEADER.size)
+        self.batch_frames = 0
+
+    def _flush_loop(self) -> None:
+        while self.running:
+            time.sleep(max(0.001, self.flush_s / 2 if self.flush_s > 0 else 0.001))
+            with self.lock:
+                if self.batch_frames and time.monotonic() - self.batch_started >= self.flush_s:
+                    self._flush_locked()
+
+    def log_report(self) -> None:
+        elapsed = max(1e-9, time.monotonic() - self.t0)
+        per_dgram = self.frames / self.datagrams if self.datagrams else 0.0
+        log_info(
+            f"[UDP] {'dry-run (not sent)' if self.dry_run else 'sent'} datagrams={self.datagrams} frames={self.frames} ({per_dgram:.1f}/dgram) "
+            f"rate={self.frames / elapsed:.1f}fps {self.datagrams / elapsed:.1f}dgram/s "
+            f"{self.bytes / elapsed / 1024.0:.1f}KB/s errors={self.errors}"
+        )
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush_locked()
+        self.running = False
+        self.flusher.join(timeout=1.0)
+        self.sock.close()
+
+
+class UdpBatchStats:
+    """
+    接收端统计：序号缺口=丢包，序号回退=乱序，重复序号=重复；有效负载按帧字节计
+    """
+    def __init__(self) -> None:
+        self.body_lengths = torture_body_lengths()
+        self.datagrams = 0
+        self.frames = 0
+        self.frame_bytes = 0
+        self.bad = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.max_seq = -1
+        self.seen_recent: "deque[int]" = deque(maxlen=4096)
+        self.seen_set: set = set()
+        self.latency_us: "deque[int]" = deque(maxlen=4096)
+        self.by_cmd: Dict[int, int] = {}
+        self.t0 = time.monotonic()
+
+    def _remember(self, seq: int) -> None:
+        if len(self.seen_recent) == self.seen_recent.maxlen:
+            self.seen_set.discard(self.seen_recent[0])
+        self.seen_recent.append(seq)
+        self.seen_set.add(seq)
+
+    def on_datagram(self, data: bytes) -> None:
+        if len(data) < UDP_BATCH_HEADER.size:
+            self.bad += 1
+            return
+        magic, seq, count, _, ts_us = UDP_BATCH_HEADER.unpack_from(data, 0)
+        if magic != UDP_BATCH_MAGIC:
+            self.bad += 1
+            return
+        self.datagrams += 1
+        self.latency_us.append((_wall_us32() - ts_us) & 0xFFFFFFFF)
+        if seq in self.seen_set:
+            self.duplicates += 1
+            return
+        if seq > self.max_seq:
+            if self.max_seq >= 0 and seq > self.max_seq + 1:
+                self.lost += seq - self.max_seq - 1
+            self.max_seq = seq
+        else:
+            # 之前按丢包计过的序号迟到了：改记为乱序
+            self.reordered += 1
+            self.lost = max(0, self.lost - 1)
+        self._remember(seq)
+
+        pos = UDP_BATCH_HEADER.size
+        for _ in range(count):
+            if len(data) - pos < 16 or data[pos:pos + 4] != b"SYNC":
+                self.bad += 1
+                return
+            cmd_id = struct.unpack_from("<I", data, pos + 12)[0]
+            body_len = self.body_lengths.get(cmd_id)
+            if body_len is None or len(data) - pos < 16 + body_len:
+                self.bad += 1
+                return
+            self.frames += 1
+            self.frame_bytes += 16 + body_len
+            self.by_cmd[cmd_id] = self.by_cmd.get(cmd_id, 0) + 1
+            pos += 16 + body_len
+
+    def log_report(self) -> None:
+        elapsed = max(1e-9, time.monotonic() - self.t0)
+        expected = self.max_seq + 1
+        loss_pct = self.lost * 100.0 / expected if expected > 0 else 0.0
+        lat = sorted(self.latency_us)
+        p50 = lat[len(lat) // 2] / 1000.0 if lat else 0.0
+        p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] / 1000.0 if lat else 0.0
+        cmds = " ".join(f"0x{k:04X}={v}" for k, v in sorted(self.by_cmd.items()))
+        log_info(
+            f"[UDPRecv] datagrams={self.datagrams} frames={self.frames} goodput={self.frame_bytes / elapsed / 1024.0:.1f}KB/s "
+            f"({self.frames / elapsed:.1f}fps) lost={self.lost} ({loss_pct:.3f}%) reordered={self.reordered} "
+            f"dup={self.duplicates} bad={self.bad} latency p50/p99={p50:.2f}/{p99:.2f}ms {cmds}"
+        )
+
+
+def run_udp_receiver(args: argparse.Namespace) -> None:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 5000000)
+    sock.bind((args.cmd_server_host, int(args.udp_port)))
+    sock.settimeout(0.5)
+    stats = UdpBatchStats()
+    log_info(f"[UDPRecv] Listening on {args.cmd_server_host}:{args.udp_port} ...")
+    next_report = time.monotonic() + args.udp_report_s
+    try:
+        while True:
+            try:
+                data = sock.recv(65535)
+                stats.on_datagram(data)
+            except socket.timeout:
+                pass
+            if time.monotonic() >= next_report:
+                stats.log_report()
+                next_report += args.udp_report_s
+    except KeyboardInterrupt:
+        log_info("[UDPRecv] stopped.")
+    finally:
+        stats.log_report()
+        sock.close()
+
+
+# ==================== IPM 图像流模拟 ====================
+# 帧格式与 native TcpServer(nReadDataPack) 一致：
+#   IMAGE / SPLICE / SPOT:  SYNC 头(16) + int32 图像长度 + 图像数据
+#   SHUTTER_ADJUST:         SYNC 头(16) + StShutterAdjust(4 x MAX_COLOR_CAMERA_NUM x u16 = 24 bytes)
+# 图像数据放在预分配的匿名 mmap（或 --image-file 映射的原始文件，ACCESS_COPY）中，
+# 发送时用 sendmsg([头部 memoryview, 图像 memoryview]) 直接发出，不拼接、不复制。
+
+IMAGE_PORT = 1127          # ConstPreDefine.HC_PORT1_NUM（图像链路）
+IPM_CMD_IMAGE = 0x3000
+IPM_CMD_IMAGE_SPLICE = 0x3002
+IPM_CMD_IMAGE_SPOT = 0x3003
+IPM_CMD_SHUTTER_ADJUST = 0x3004
+IPM_BASE_ID = 0x0101       # 子系统 1 的第 1 个 IPM，第 n 个为 IPM_BASE_ID + n
+MAX_COLOR_CAMERA_NUM = 3
+MAX_SPLICE_IMAGE_WIDTH = 3200
+MAX_SPLICE_IMAGE_HEIGHT = 512
+SHUTTER_ADJUST_SIZE = 4 * MAX_COLOR_CAMERA_NUM * 2
+IMAGE_KIND_CMDS = {
+    "image": IPM_CMD_IMAGE,
+    "splice": IPM_CMD_IMAGE_SPLICE,
+    "spot": IPM_CMD_IMAGE_SPOT,
+    "shutter": IPM_CMD_SHUTTER_ADJUST,
+}
+
+
+def image_body_size(args: argparse.Namespace, kind: str) -> int:
+    bpp = max(1, int(args.image_bpp))
+    if kind == "shutter":
+        return SHUTTER_ADJUST_SIZE
+    if kind == "splice":
+        return MAX_SPLICE_IMAGE_WIDTH * MAX_SPLICE_IMAGE_HEIGHT * bpp
+    if kind == "spot":
+        return max(1, args.image_width // 4) * max(1, args.image_height // 4) * bpp * max(1, args.image_cameras)
+    return args.image_width * args.image_height * bpp * max(1, args.image_cameras)
+
+
+class ImageFramePool:
+    """
+    预分配的图像帧池：slots 个槽位循环使用
+    - prefix: 每个槽位的 SYNC 头 + 长度字段（一次性打包好）
+    - body:   匿名 mmap 或文件 mmap 中的图像数据；每帧只原地改写开头 8 字节（帧号+时间戳）
+    """
+    def __init__(self, kind: str, src_id: int, body_len: int, slots: int, source_path: str = "") -> None:
+        import mmap
+        self.kind = kind
+        self.cmd_id = IMAGE_KIND_CMDS[kind]
+        self.body_len = int(body_len)
+        self.slots = max(1, int(slots))
+        self.has_length = kind != "shutter"
+        prefix_len = 20 if self.has_length else 16
+        self.prefix = bytearray(prefix_len * self.slots)
+        for i in range(self.slots):
+            struct.pack_into("<4I", self.prefix, i * prefix_len, SYNC_FLAG, src_id, HC_ID, self.cmd_id)
+            if self.has_length:
+                struct.pack_into("<i", self.prefix, i * prefix_len + 16, self.body_len)
+        self.prefix_len = prefix_len
+        self._prefix_view = memoryview(self.prefix)
+
+        self._file = None
+        if source_path:
+            self._file = open(source_path, "rb")
+            self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_COPY)
+            if len(self.mm) < self.body_len:
+                raise ValueError(f"--image-file {source_path}: {len(self.mm)} bytes < frame size {self.body_len}")
+            self.body_slots = max(1, min(self.slots, len(self.mm) // self.body_len))
+        else:
+            self.body_slots = self.slots
+            self.mm = mmap.mmap(-1, self.body_len * self.body_slots)
+            self._fill_pattern()
+        self.source = "file" if self._file else "anon-mmap"
+        self._body_view = memoryview(self.mm)
+        self.sent = 0
+
+    def _fill_pattern(self) -> None:
+        if self.kind == "shutter":
+            for i in range(self.body_slots):
+                vals = [1000 + (i * 7 + k * 13) % 500 for k in range(4 * MAX_COLOR_CAMERA_NUM)]
+                struct.pack_into(f"<{len(vals)}H", self.mm, i * self.body_len, *vals)
+            return
+        # 每个槽位一种斜向渐变，初始化时填一次，发送时不再生成像素
+        row = bytes(range(256)) * 2
+        for i in range(self.body_slots):
+            base = i * self.body_len
+            pattern = row[i % 256:i % 256 + 256]
+            filled = 0
+            while filled < self.body_len:
+                chunk = min(len(pattern), self.body_len - filled)
+                self.mm[base + filled:base + filled + chunk] = pattern[:chunk]
+                filled += chunk
+
+    def next_frame(self) -> Tuple[memoryview, memoryview]:
+        slot = self.sent % self.slots
+        body_slot = self.sent % self.body_slots
+        off = body_slot * self.body_len
+        if self.has_length and self.body_len >= 8:
+            struct.pack_into("<II", self.mm, off, self.sent & 0xFFFFFFFF, _wall_us32())
+        self.sent += 1
+        p = slot * self.prefix_len
+        return self._prefix_view[p:p + self.prefix_len], self._body_view[off:off + self.body_len]
+
+    def close(self) -> None:
+        self._prefix_view.release()
+        self._body_view.release()
+        self.mm.close()
+        if self._file:
+            self._file.close()
+
+
+def sendmsg_all(sock: socket.socket, parts: List[memoryview]) -> int:
+    """sendmsg 可能只发出一部分，按已发字节推进各个 memoryview 直至全部发完"""
+    pending = [p for p in parts if len(p)]
+    total = 0
+    while pending:
+        n = sock.sendmsg(pending)
+        total += n
+        while n and pending:
+            if n >= len(pending[0]):
+                n -= len(pending[0])
+                pending.pop(0)
+            else:
+                pending[0] = pending[0][n:]
+                n = 0
+    return total
+
+
+class ImageStreamEmitter:
+    """按帧建立短连接（native TcpServer 每个连接只收一帧），记录连接/发送耗时"""
+    def __init__(self, pool: ImageFramePool, host: str, port: int, timeout_s: float) -> None:
+        self.pool = pool
+        self.addr = (host, port)
+        self.timeout_s = timeout_s
+        self.frames = 0
+        self.failures = 0
+        self.bytes = 0
+        self.connect_s: "deque[float]" = deque(maxlen=1024)
+        self.send_s: "deque[float]" = deque(maxlen=1024)
+
+    def emit(self) -> None:
+        prefix, body = self.pool.next_frame()
+        t0 = time.perf_counter()
+        try:
+            with socket.create_connection(self.addr, timeout=self.timeout_s) as s:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 8 * 1024 * 1024)
+                t1 = time.perf_counter()
+                sent = sendmsg_all(s, [prefix, body])
+                t2 = time.perf_counter()
+        except OSError as e:
+            self.failures += 1
+            if self.failures <= 3 or self.failures % 100 == 0:
+                log_error(f"[Image] {self.pool.kind} send failed ({self.failures}): {e}")
+            return
+        self.frames += 1
+        self.bytes += sent
+        self.connect_s.append(t1 - t0)
+        self.send_s.append(t2 - t1)
+
+    def reset_counters(self) -> None:
+        self.frames = 0
+        self.failures = 0
+        self.bytes = 0
+        self.connect_s.clear()
+        self.send_s.clear()
+
+    def summary(self, elapsed_s: float) -> Dict[str, float]:
+        def p(vals: "deque[float]", q: float) -> float:
+            s = sorted(vals)
+            return s[min(len(s) - 1, int(len(s) * q))] * 1000.0 if s else 0.0
+        elapsed_s = max(1e-9, elapsed_s)
+        return {
+            "frames": self.frames,
+            "failures": self.failures,
+            "fps": self.frames / elapsed_s,
+            "mb_s": self.bytes / elapsed_s / (1024.0 * 1024.0),
+            "connect_p50_ms": p(self.connect_s, 0.5),
+            "send_p50_ms": p(self.send_s, 0.5),
+            "send_p95_ms": p(self.send_s, 0.95),
+        }
+
+
+def start_image_loopback_receiver() -> Tuple[int, Dict[str, int]]:
+    """
+    本地接收端：按 native TcpServer 的方式每个连接读一帧（头 + 长度 + 数据）后关闭
+    用于在没有设备端 App 时测发送侧上限
+    """
+    import threading
+    lengths = {IPM_CMD_SHUTTER_ADJUST: SHUTTER_ADJUST_SIZE}
+    counters = {"frames": 0, "bytes": 0, "bad": 0}
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(128)
+    buf = bytearray(8 * 1024 * 1024)
+    view = memoryview(buf)
+
+    def read_exact(conn: socket.socket, n: int) -> bool:
+        while n > 0:
+            got = conn.recv_into(view, min(n, len(buf)))
+            if got == 0:
+                return False
+            n -= got
+        return True
+
+    def loop() -> None:
+        while True:
+            conn, _ = srv.accept()
+            with conn:
+                if not read_exact(conn, 16):
+                    counters["bad"] += 1
+                    continue
+                sync, _, _, cmd = struct.unpack_from("<4I", buf, 0)
+                if sync != SYNC_FLAG:
+                    counters["bad"] += 1
+                    continue
+                if cmd in lengths:
+                    length = lengths[cmd]
+                else:
+                    if not read_exact(conn, 4):
+                        counters["bad"] += 1
+                        continue
+                    length = struct.unpack_from("<i", buf, 0)[0]
+                if read_exact(conn, length):
+                    counters["frames"] += 1
+                    counters["bytes"] += 16 + length
+                else:
+                    counters["bad"] += 1
+
+    threading.Thread(target=loop, daemon=True).start()
+    return srv.getsockname()[1], counters
+
+
+def run_image_stream(args: argparse.Namespace) -> None:
+    host = SERVER_IP
+    port = args.image_port
+    counters = None
+    if args.image_loopback:
+        port, counters = start_image_loopback_receiver()
+        log_info(f"[Image] loopback receiver on 127.0.0.1:{port}")
+
+    kinds = [k.strip() for k in args.image_kinds.split(",") if k.strip()]
+    for k in kinds:
+        if k not in IMAGE_KIND_CMDS:
+            raise SystemExit(f"--image-kinds: unknown kind {k!r}, expected {','.join(IMAGE_KIND_CMDS)}")
+
+    emitters: List[ImageStreamEmitter] = []
+    pools: List[ImageFramePool] = []
+    for idx, kind in enumerate(kinds):
+        for ipm in range(max(1, args.image_ipms)):
+            body_len = image_body_size(args, kind)
+            pool = ImageFramePool(kind, IPM_BASE_ID + ipm, body_len, args.image_slots,
+                                  args.image_file if kind != "shutter" else "")
+            pools.append(pool)
+            emitters.append(ImageStreamEmitter(pool, host, port, args.image_timeout_s))
+            log_info(f"[Image] stream {kind}#{ipm} cmd=0x{pool.cmd_id:04X} src=0x{IPM_BASE_ID + ipm:04X} "
+                     f"frame={body_len / 1024.0:.1f}KB slots={pool.slots} source={pool.source}")
+
+    def run_step(fps: float, duration_s: float) -> Tuple[Dict[str, float], TimerScheduler]:
+        scheduler = TimerScheduler()
+        for i, em in enumerate(emitters):
+            em.reset_counters()
+            # 各路错开相位，避免同一时刻集中建连
+            scheduler.add_rate(f"{em.pool.kind}#{i}", fps, em.emit, phase_s=i / (fps * len(emitters)))
+        t0 = time.monotonic()
+        scheduler.run(duration_s=duration_s)
+        elapsed = time.monotonic() - t0
+        agg = {"fps": 0.0, "mb_s": 0.0, "frames": 0, "failures": 0, "send_p95_ms": 0.0}
+        for em in emitters:
+            s = em.summary(elapsed)
+            agg["fps"] += s["fps"]
+            agg["mb_s"] += s["mb_s"]
+            agg["frames"] += s["frames"]
+            agg["failures"] += s["failures"]
+            agg["send_p95_ms"] = max(agg["send_p95_ms"], s["send_p95_ms"])
+        missed = sum(e.missed for e in scheduler.emitters.values())
+        agg["missed"] = missed
+        return agg, scheduler
+
+    try:
+        if not args.image_sweep:
+            agg, scheduler = run_step(args.image_fps, args.duration_s or 10.0)
+            scheduler.log_stats()
+            for em in emitters:
+                s = em.summary(args.duration_s or 10.0)
+                log_info(f"[Image] {em.pool.kind} frames={s['frames']} fail={s['failures']} fps={s['fps']:.1f} "
+                         f"{s['mb_s']:.1f}MB/s connect p50={s['connect_p50_ms']:.2f}ms send p50/p95="
+                         f"{s['send_p50_ms']:.2f}/{s['send_p95_ms']:.2f}ms")
+            log_info(f"[Image] total fps={agg['fps']:.1f} {agg['mb_s']:.1f}MB/s missed={agg['missed']}")
+        else:
+            # 逐级提高帧率，直到实际帧率跟不上目标（<90%）或出现失败，上一档即饱和帧率
+            fps = args.image_fps
+            best = None
+            while fps <= args.image_sweep_max_fps:
+                target = fps * len(emitters)
+                agg, _ = run_step(fps, args.image_sweep_step_s)
+                ok = agg["failures"] == 0 and agg["fps"] >= 0.9 * target
+                log_info(f"[ImageSweep] per-stream {fps:.1f}fps target={target:.1f} achieved={agg['fps']:.1f}fps "
+                         f"{agg['mb_s']:.1f}MB/s missed={agg['missed']} fail={agg['failures']} "
+                         f"send p95={agg['send_p95_ms']:.2f}ms {'OK' if ok else 'SATURATED'}")
+                if not ok:
+                    break
+                best = (fps, agg)
+                fps *= args.image_sweep_factor
+            if best:
+                log_info(f"[ImageSweep] saturation ~{best[0]:.1f}fps/stream "
+                         f"({best[1]['fps']:.1f}fps, {best[1]['mb_s']:.1f}MB/s total)")
+            else:
+                log_info("[ImageSweep] saturated at the starting rate; lower --image-fps")
+        if counters is not None:
+            log_info(f"[Image] loopback received frames={counters['frames']} bytes={counters['bytes']} bad={counters['bad']}")
+    finally:
+        for pool in pools:
+            pool.close()
+
+
+# ==================== 下发配置的版本化存储 ====================
+# App 下发的配置按 tools/stglobal_codec.py 的 MAX64 布局解码；每次下发与上一版本按字段比对
+# （先按 64 字节块比较 memoryview，只解码有变化字节所在的字段），统计下发量、实际变化量与解码耗时，
+# 用来评估“只发增量”能省多少。
+HC_CMD_SYS_CONFIG = 0x0050
+HC_CMD_EXIT_INFO = 0x0052
+HC_CMD_GLOBAL_INFO = 0x005B
+# 命令 -> (日志名, 结构体名)；HC_CMD_GRADE_INFO 即上面的 HC_CMD_GRADE_INFO（StGradeInfo）
+CONFIG_PUSH_LAYOUTS = {
+    HC_CMD_SYS_CONFIG: ("SYS_CONFIG", "StSysConfig"),
+    HC_CMD_GRADE_INFO: ("GRADE_INFO", "StGradeInfo"),
+    HC_CMD_EXIT_INFO: ("EXIT_INFO", "StExitInfo"),
+    HC_CMD_GLOBAL_INFO: ("GLOBAL_INFO", "StGlobal"),
+}
+DELTA_FIELD_OVERHEAD = 8  # 增量下发时每个字段的 offset u32 + len u32
+
+
+def load_struct_codecs() -> Optional[object]:
+    import os
+    tools_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tools")
+    if tools_dir not in sys.path:
+        sys.path.insert(0, tools_dir)
+    try:
+        import stglobal_codec
+    except ImportError as e:
+        log_error(f"[ConfigStore] tools/stglobal_codec.py unavailable ({e}); storing raw bodies only")
+        return None
+    return stglobal_codec
+
+
+class ConfigVersion:
+    __slots__ = ("version", "body", "fields", "t_wall", "src_id")
+
+    def __init__(self, version: int, body: bytes, fields: Optional[dict], src_id: int) -> None:
+        self.version = version
+        self.body = body
+        self.fields = fields
+        self.t_wall = time.time()
+        self.src_id = src_id
+
+
+class ConfigStore:
+    """
+    每种配置保留最近 --config-history 个版本（按下发源 srcId 区分子系统）
+    """
+    def __init__(self, args: argparse.Namespace) -> None:
+        import threading
+        self.args = args
+        self.lock = threading.Lock()
+        self.codecs = load_struct_codecs()
+        self.history: Dict[Tuple[int, int], "deque[ConfigVersion]"] = {}
+        # 日志名 -> [下发次数, 下发字节, 变化字节, 增量估算字节, 与上版完全相同次数, 解码总 ms]
+        self.totals: Dict[str, List[float]] = {}
+
+    def codec_for(self, cmd: int):
+        if self.codecs is None:
+            return None
+        return self.codecs.get_struct_codec(CONFIG_PUSH_LAYOUTS[cmd][1])
+
+    def latest(self, cmd: int, src_id: int = 0) -> Optional[ConfigVersion]:
+        versions = self.history.get((cmd, src_id))
+        return versions[-1] if versions else None
+
+    def handle(self, cmd: int, src_id: int, dst_id: int, body: bytes) -> None:
+        label, struct_name = CONFIG_PUSH_LAYOUTS[cmd]
+        codec = self.codec_for(cmd)
+        # 只有长度与结构体完全一致才按结构体解码；按出口/按尺寸等级分段下发的包长度不同，走原始字节比对
+        decodable = codec is not None and len(body) == codec.size
+        t0 = time.perf_counter()
+        fields = codec.decode(body) if decodable else None
+        decode_ms = (time.perf_counter() - t0) * 1000.0
+
+        with self.lock:
+            key = (cmd, src_id)
+            versions = self.history.setdefault(key, deque(maxlen=max(1, self.args.config_history)))
+            prev = versions[-1] if versions else None
+            cur = ConfigVersion(prev.version + 1 if prev else 1, bytes(body), fields, src_id)
+            versions.append(cur)
+            if prev is not None and prev.fields is not None:
+                # 只保留最新版的解码结果，历史版本留原始字节
+                prev.fields = None
+
+        t1 = time.perf_counter()
+        rows: List[tuple] = []
+        if prev is None:
+            changed = delta = len(body)
+        elif decodable and len(prev.body) == codec.size:
+            rows = codec.diff(prev.body, cur.body)
+            changed = 0
+            for path, _old, _new, idx in rows:
+                f = codec.by_path[path]
+                changed += f.size if idx is None else len(idx) * (f.size // max(1, f.count))
+            delta = changed + DELTA_FIELD_OVERHEAD * len(rows)
+        else:
+            changed = self._raw_diff_bytes(prev.body, cur.body)
+            delta = changed + DELTA_FIELD_OVERHEAD
+        diff_ms = (time.perf_counter() - t1) * 1000.0
+
+        t = self.totals.setdefault(label, [0, 0, 0, 0, 0, 0.0])
+        t[0] += 1
+        t[1] += len(body)
+        t[2] += changed
+        t[3] += delta
+        t[4] += 1 if (prev is not None and changed == 0) else 0
+        t[5] += decode_ms
+        layout_note = struct_name if decodable else f"raw ({len(body)}B, {struct_name} is {codec.size if codec else '?'}B)"
+        log_info(
+            f"[ConfigStore] {label} v{cur.version} src=0x{src_id:04X} push={len(body)}B {layout_note} "
+            f"decode={decode_ms:.2f}ms diff={diff_ms:.2f}ms changed_fields={len(rows)} changed={changed}B "
+            f"delta~{min(delta, len(body))}B ({100.0 * min(delta, len(body)) / max(1, len(body)):.1f}% of push)"
+        )
+        if rows and self.codecs is not None and self.args.config_diff_lines > 0:
+            for line in self.codecs.format_diff(rows[: self.args.config_diff_lines], limit=4):
+                log_info(f"[ConfigStore]   {line}")
+
+    @staticmethod
+    def _raw_diff_bytes(a: bytes, b: bytes, block: int = 64) -> int:
+        ma, mb = memoryview(a), memoryview(b)
+        n = max(len(ma), len(mb))
+        changed = 0
+        for off in range(0, n, block):
+            a_blk, b_blk = ma[off:off + block], mb[off:off + block]
+            if a_blk != b_blk:
+                changed += sum(1 for x, y in zip(a_blk, b_blk) if x != y) + abs(len(a_blk) - len(b_blk))
+        return changed
+
+    def log_report(self) -> None:
+        for label, (n, pushed, changed, delta, same, decode_ms) in sorted(self.totals.items()):
+            saved = 100.0 * (1.0 - min(delta, pushed) / max(1, pushed))
+            log_info(
+                f"[ConfigStore] {label}: pushes={int(n)} identical={int(same)} pushed={int(pushed)}B "
+                f"changed={int(changed)}B delta~{int(delta)}B (delta push saves {saved:.1f}%) "
+                f"decode avg={decode_ms / max(1, n):.2f}ms"
+            )
+
+
+# ==================== 烧写 Boot/WAM 固件（模拟 bootloader） ====================
+# 上位机每个 HC_CMD_*_FLASH_BURN 命令帧携带一块固件：
+#   FlashChunkHeader（小端）：imageSize u32 + offset u32 + chunkCrc32 u32 + imageCrc32 u32 + flags u32 = 20 bytes
+#   之后紧跟 chunk 数据；flags bit0 = 最后一块
+# 数据直接 recv_into 映射文件对应区间（不在内存里拼整包），逐块校验 chunkCrc，并增量累计整包 CRC。
+# 进度回包：BOOT -> FSM_CMD_BOOT_FLASH_PROGRESS（App 按文本解析，4 字节 "42%"），
+#           WAM  -> FSM_CMD_BURN_FLASH_PROGRESS（int32 百分比，失败为 -1）
+HC_CMD_BOOT_FLASH_BURN = 0x0100
+HC_CMD_WAM_FLASH_BURN = 0x011E
+FSM_CMD_BURN_FLASH_PROGRESS = 0x1006
+FSM_CMD_BOOT_FLASH_PROGRESS = 0x1009
+FLASH_CHUNK_HEADER = struct.Struct("<5I")
+FLASH_FLAG_LAST = 0x1
+FLASH_BURN_TARGETS = {
+    HC_CMD_BOOT_FLASH_BURN: ("boot", FSM_CMD_BOOT_FLASH_PROGRESS),
+    HC_CMD_WAM_FLASH_BURN: ("wam", FSM_CMD_BURN_FLASH_PROGRESS),
+}
+
+
+class FlashSession:
+    def __init__(self, path: str, image_size: int, image_crc: int) -> None:
+        import mmap
+        import os
+        self.path = path
+        self.size = image_size
+        self.image_crc = image_crc
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self.fd, image_size)
+        self.mm = mmap.mmap(self.fd, image_size)
+        self.view = memoryview(self.mm)
+        self.expected = 0
+        self.crc = 0
+        self.chunks = 0
+        self.max_chunk = 0
+        self.dups = 0
+        self.crc_errors = 0
+        self.last_pct = -1
+        self.t_start = time.perf_counter()
+        self.chunk_lat: "deque[float]" = deque(maxlen=65536)
+
+    def close(self) -> None:
+        import os
+        self.view.release()
+        self.mm.flush()
+        self.mm.close()
+        os.close(self.fd)
+
+
+class FlashBootloader:
+    """
+    命令服务内的 bootloader：每个目标（boot/wam）同一时间一个烧写会话，必须按 offset 顺序写入
+    """
+    def __init__(self, args: argparse.Namespace) -> None:
+        import os
+        self.args = args
+        self.dir = args.flash_dir
+        os.makedirs(self.dir, exist_ok=True)
+        self.sessions: Dict[str, FlashSession] = {}
+        self.history: List[dict] = []
+
+    def _progress(self, name: str, progress_cmd: int, src_id: int, dst_id: int, pct: int) -> None:
+        if progress_cmd == FSM_CMD_BOOT_FLASH_PROGRESS:
+            text = "ERR" if pct < 0 else f"{pct}%"
+            body = text.encode("ascii").ljust(4, b"\x00")
+        else:
+            body = struct.pack("<i", pct)
+        header = create_header_with_ids(progress_cmd, dst_id or FSM_ID, src_id or HC_ID)
+        deliver_packet(self.args, header, body, f"FlashProgress[{name}]")
+
+    def _abort(self, name: str, progress_cmd: int, src_id: int, dst_id: int, reason: str) -> None:
+        sess = self.sessions.pop(name, None)
+        if sess is not None:
+            sess.close()
+        log_error(f"[Flash] {name} aborted: {reason}")
+        self._progress(name, progress_cmd, src_id, dst_id, -1)
+
+    def receive(self, conn: socket.socket, cmd: int, src_id: int, dst_id: int, body_len: int) -> None:
+        import os
+        import zlib
+        name, progress_cmd = FLASH_BURN_TARGETS[cmd]
+        t0 = time.perf_counter()
+        head = _recv_exact(conn, FLASH_CHUNK_HEADER.size)
+        if len(head) < FLASH_CHUNK_HEADER.size:
+            log_error(f"[Flash] {name}: short chunk header")
+            return
+        image_size, offset, chunk_crc, image_crc, flags = FLASH_CHUNK_HEADER.unpack(head)
+        n = body_len - FLASH_CHUNK_HEADER.size
+        sess = self.sessions.get(name)
+        if offset == 0 and (sess is None or sess.size != image_size or sess.image_crc != image_crc):
+            # 新镜像才重开会话；同一镜像的首块重传按下面的重复块丢弃
+            if sess is not None:
+                sess.close()
+            path = os.path.join(self.dir, f"{name}.bin")
+            sess = self.sessions[name] = FlashSession(path, image_size, image_crc)
+            log_info(f"[Flash] {name}: start image={image_size} bytes crc=0x{image_crc:08X} -> {path}")
+        if sess is None:
+            self._drain(conn, n)
+            self._abort(name, progress_cmd, src_id, dst_id, f"chunk at offset {offset} without session")
+            return
+        if n < 0 or offset + n > sess.size or image_size != sess.size:
+            self._abort(name, progress_cmd, src_id, dst_id, f"chunk [{offset},+{n}) outside image {sess.size}")
+            return
+        if offset < sess.expected:
+            # 重传的旧块：读掉丢弃，映射内容已校验过
+            self._drain(conn, n)
+            sess.dups += 1
+            return
+        if offset > sess.expected:
+            self._drain(conn, n)
+            self._abort(name, progress_cmd, src_id, dst_id, f"gap: expected offset {sess.expected}, got {offset}")
+            return
+
+        dst = sess.view[offset:offset + n]
+        got = 0
+        while got < n:
+            r = conn.recv_into(dst[got:], n - got)
+            if r == 0:
+                break
+            got += r
+        if got < n:
+            dst.release()
+            self._abort(name, progress_cmd, src_id, dst_id, f"connection closed mid-chunk ({got}/{n})")
+            return
+        if zlib.crc32(dst) != chunk_crc:
+            dst.release()
+            sess.crc_errors += 1
+            self._abort(name, progress_cmd, src_id, dst_id, f"chunk crc mismatch at offset {offset}")
+            return
+        sess.crc = zlib.crc32(dst, sess.crc)
+        dst.release()
+        if self.args.flash_chunk_overhead_ms > 0:
+            time.sleep(self.args.flash_chunk_overhead_ms / 1000.0)  # 擦写/提交的固定开销
+        sess.expected = offset + n
+        sess.chunks += 1
+        sess.max_chunk = max(sess.max_chunk, n)
+        sess.chunk_lat.append(time.perf_counter() - t0)
+
+        pct = sess.expected * 100 // max(1, sess.size)
+        last = bool(flags & FLASH_FLAG_LAST) or sess.expected == sess.size
+        if last and (sess.expected != sess.size or sess.crc != sess.image_crc):
+            self._abort(name, progress_cmd, src_id, dst_id,
+                        f"image crc 0x{sess.crc:08X} != 0x{sess.image_crc:08X} (written {sess.expected}/{sess.size})")
+            return
+        if last or pct >= sess.last_pct + self.args.flash_progress_step:
+            sess.last_pct = pct
+            self._progress(name, progress_cmd, src_id, dst_id, pct)
+        if last:
+            self._finish(name, sess)
+
+    @staticmethod
+    def _drain(conn: socket.socket, n: int) -> None:
+        scratch = bytearray(min(max(0, n), 65536))
+        left = n
+        while left > 0:
+            r = conn.recv_into(scratch, min(left, len(scratch)))
+            if r == 0:
+                return
+            left -= r
+
+    def _finish(self, name: str, sess: FlashSession) -> None:
+        self.sessions.pop(name, None)
+        elapsed = time.perf_counter() - sess.t_start
+        lat = sorted(sess.chunk_lat)
+        rec = {
+            "target": name,
+            "bytes": sess.size,
+            "chunks": sess.chunks,
+            "chunk_bytes": sess.max_chunk,
+            "elapsed_s": elapsed,
+            "mb_s": sess.size / (1024 * 1024) / max(1e-9, elapsed),
+            "chunk_p50_ms": lat[len(lat) // 2] * 1000.0 if lat else 0.0,
+            "chunk_p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000.0 if lat else 0.0,
+            "dups": sess.dups,
+        }
+        sess.close()
+        self.history.append(rec)
+        log_info(
+            f"[Flash] {name}: done {rec['bytes']} bytes in {rec['chunks']} chunks of {rec['chunk_bytes']}B, "
+            f"{rec['elapsed_s']:.2f}s {rec['mb_s']:.2f}MB/s chunk p50/p95={rec['chunk_p50_ms']:.2f}/"
+            f"{rec['chunk_p95_ms']:.2f}ms dups={rec['dups']} crc=0x{sess.crc:08X} OK"
+        )
+
+    def log_report(self) -> None:
+        if not self.history:
+            return
+        log_info("[Flash] chunk size vs throughput/latency:")
+        for rec in sorted(self.history, key=lambda r: (r["target"], r["chunk_bytes"])):
+            log_info(f"[Flash]   {rec['target']:4s} chunk={rec['chunk_bytes']:>8d}B chunks={rec['chunks']:>6d} "
+                     f"{rec['mb_s']:8.2f}MB/s p50={rec['chunk_p50_ms']:.3f}ms p95={rec['chunk_p95_ms']:.3f}ms")
+
+
+# ==================== 称重波形（FSM_CMD_WAVEINFO） ====================
+# StWaveInfo（structures.h）：nChannelId(i32) + waveform0[256](u16) + waveform1[256](u16) + fruitweight(f32) = 1032 字节
+# waveform0 为原始 ADC 采样，waveform1 为 8 点滑动平均后的曲线；每帧 256 点，帧率 = 采样率 / 256（每通道）
+WAVE_POINTS = 256
+WAVE_BODY_SIZE = 4 + WAVE_POINTS * 2 * 2 + 4
+WAVE_ADC_OFFSET = 2000      # 空秤 ADC 零点
+WAVE_COUNTS_PER_G = 20.0    # 称重传感器灵敏度（counts/g）
+WAVE_CUP_TARE_G = 60.0      # 果杯自重
+WAVE_FILTER_TAPS = 8
+
+
+class WaveChannel:
+    """
+    单通道载荷传感器波形：果杯经过（梯形台阶）+ 水果冲击（台阶 + 衰减振荡）+ 噪声 + 零漂
+    合成结果以整帧写入环形缓冲区（ring 个 StWaveInfo 槽位），发送时按序取出
+    """
+    def __init__(self, channel: int, args: argparse.Namespace, noise_table: "array") -> None:
+        from array import array
+        self.channel = channel
+        self.args = args
+        self.noise = noise_table
+        self.n = 0  # 全局采样序号
+        self.period = max(8, int(round(args.wave_sample_hz / max(0.1, args.wave_cup_hz))))
+        self.cup_tmpl, self.fruit_tmpl = self._templates(self.period)
+        self.cup_weights: Dict[int, float] = {}
+        self.drift = 0.0
+        self.filter_state = array("H", [WAVE_ADC_OFFSET] * WAVE_FILTER_TAPS)
+        self.ring = bytearray(WAVE_BODY_SIZE * max(2, args.wave_ring))
+        self.slots = len(self.ring) // WAVE_BODY_SIZE
+        self.write_idx = 0
+        self.read_idx = 0
+        mv = memoryview(self.ring)
+        self.views = []
+        for i in range(self.slots):
+            base = i * WAVE_BODY_SIZE
+            self.views.append((
+                mv[base:base + 4].cast("i"),
+                mv[base + 4:base + 4 + WAVE_POINTS * 2].cast("H"),
+                mv[base + 4 + WAVE_POINTS * 2:base + 4 + WAVE_POINTS * 4].cast("H"),
+                mv[base + WAVE_BODY_SIZE - 4:base + WAVE_BODY_SIZE].cast("f"),
+            ))
+
+    @staticmethod
+    def _templates(period: int) -> Tuple[List[float], List[float]]:
+        # 杯在秤台上的占空约 60%，上升/下降沿各 10%
+        import math
+        ramp = max(1, period // 10)
+        on = max(1, int(period * 0.6))
+        start = (period - on - 2 * ramp) // 2
+        cup = [0.0] * period
+        fruit = [0.0] * period
+        for i in range(period):
+            k = i - start
+            if k < 0 or k >= on + 2 * ramp:
+                level = 0.0
+            elif k < ramp:
+                level = k / ramp
+            elif k < ramp + on:
+                level = 1.0
+            else:
+                level = (on + 2 * ramp - k) / ramp
+            cup[i] = level
+            # 水果落杯冲击：上升沿之后的阻尼振荡，逐渐收敛到台阶值
+            ring_k = k - ramp
+            osc = 0.0
+            if 0 <= ring_k < on:
+                osc = 0.35 * math.exp(-ring_k / max(1.0, on / 6.0)) * math.sin(2 * math.pi * ring_k / max(4.0, on / 5.0))
+            fruit[i] = level * (1.0 + osc)
+        return cup, fruit
+
+    def _cup_weight(self, cup: int) -> float:
+        w = self.cup_weights.get(cup)
+        if w is None:
+            w = random.uniform(self.args.min_weight_g, self.args.max_weight_g) if random.random() < self.args.wave_fill else 0.0
+            self.cup_weights[cup] = w
+            self.cup_weights.pop(cup - 4, None)
+        return w
+
+    def _synthesize(self, slot: int) -> None:
+        ch_id, w0, w1, fw = self.views[slot]
+        period = self.period
+        cup_tmpl, fruit_tmpl = self.cup_tmpl, self.fruit_tmpl
+        tare = WAVE_CUP_TARE_G * WAVE_COUNTS_PER_G
+        noise = self.noise
+        nlen = len(noise)
+        noff = random.randrange(nlen)
+        amp = self.args.wave_noise
+        # 零漂：慢随机游走，限制在 ±200 counts
+        self.drift = max(-200.0, min(200.0, self.drift + random.gauss(0.0, 1.5)))
+        base = WAVE_ADC_OFFSET + self.drift
+        taps = self.filter_state
+        acc = sum(taps)
+        n = self.n
+        cup = n // period
+        phase = n % period
+        load = self._cup_weight(cup) * WAVE_COUNTS_PER_G
+        centre_w = 0.0
+        for i in range(WAVE_POINTS):
+            v = base + tare * cup_tmpl[phase] + load * fruit_tmpl[phase] + amp * noise[(noff + i) % nlen]
+            raw = 0 if v < 0 else (65535 if v > 65535 else int(v))
+            w0[i] = raw
+            j = i % WAVE_FILTER_TAPS
+            acc += raw - taps[j]
+            taps[j] = raw
+            w1[i] = acc // WAVE_FILTER_TAPS
+            if phase == period // 2 and load > 0:
+                centre_w = load / WAVE_COUNTS_PER_G
+            phase += 1
+            if phase == period:
+                phase = 0
+                cup += 1
+                load = self._cup_weight(cup) * WAVE_COUNTS_PER_G
+        self.n = n + WAVE_POINTS
+        ch_id[0] = self.channel
+        fw[0] = centre_w
+
+    def next_body(self) -> bytes:
+        # 读指针追上写指针时一次性补满半个环（批量合成，发送路径只取槽位）
+        if self.read_idx == self.write_idx:
+            for _ in range(max(1, self.slots // 2)):
+                self._synthesize(self.write_idx % self.slots)
+                self.write_idx += 1
+        slot = self.read_idx % self.slots
+        self.read_idx += 1
+        base = slot * WAVE_BODY_SIZE
+        # 拷贝出槽位：PACKET_SINK 可能排队持有 body，不能引用会被覆盖的环形缓冲区
+        return bytes(self.ring[base:base + WAVE_BODY_SIZE])
+
+
+class WaveformGenerator:
+    """
+    多通道轮转出帧：总帧率 = 通道数 * 采样率 / 256
+    """
+    def __init__(self, args: argparse.Namespace) -> None:
+        from array import array
+        rnd = random.Random(args.seed)
+        noise = array("f", (rnd.gauss(0.0, 1.0) for _ in range(65536)))
+        self.channels = [WaveChannel(ch, args, noise) for ch in range(max(1, args.wave_channels))]
+        self.next_ch = 0
+        self.frames = 0
+
+    @property
+    def frame_rate_hz(self) -> float:
+        args = self.channels[0].args
+        return len(self.channels) * args.wave_sample_hz / WAVE_POINTS
+
+    def next_frame(self) -> Tuple[int, bytes]:
+        ch = self.channels[self.next_ch]
+        self.next_ch = (self.next_ch + 1) % len(self.channels)
+        self.frames += 1
+        return ch.channel, ch.next_body()
+
+
+WAVE_GENERATOR: Optional[WaveformGenerator] = None
+
+
+def emit_wave(args: argparse.Namespace) -> bool:
+    global WAVE_GENERATOR
+    if WAVE_GENERATOR is None:
+        WAVE_GENERATOR = WaveformGenerator(args)
+    channel, body = WAVE_GENERATOR.next_frame()
+    wave_src_id = make_src_id(subsys_index=args.subsys, channel_index=channel)
+    wave_header = create_header_with_ids(FSM_CMD_WAVEINFO, wave_src_id, HC_ID)
+    return deliver_packet(args, wave_header, body, "WaveInfo")
+
+
+# ==================== 单果追溯存储（DATA_TRACKING） ====================
+# 每个模拟果实一行，列式 array 存储（约 18 字节/果）；fruit_id 开放寻址哈希索引，时间列单调可二分
+TRACE_COLUMNS = (
+    ("fruit_id", "I"),
+    ("t_ms", "I"),       # 相对 epoch 的毫秒（u32 约 49 天）
+    ("cup", "H"),
+    ("channel", "B"),
+    ("weight", "H"),     # g
+    ("grades", "I"),     # weight/size/quality/final 各 1 字节
+    ("exit", "B"),
+)
+TRACE_CUPS = 256         # StWeightResult.cup_index 为 u8，按杯序循环
+TRACE_UNSORTED = 0xFF    # 未落入有效出口
+TRACE_DEFAULT_GRADES = (1, 2, 1, 1)  # 与 create_weight_info 的 weight/size/quality/final 等级一致
+TRACE_HASH_MUL = 0x9E3779B97F4A7C15  # Fibonacci 哈希，取乘积高位作槽号
+TRACE_MAX_LOAD = 0.7
+
+
+class FruitTraceStore:
+    """
+    单果追溯：accumulate_fruit 每分选一个果实 record() 一行（fruit_id 顺序分配）并写入哈希索引；
+    emit_weight 的单果上报取其中的行，线上的 fruit_id 与统计/入库一致
+    - locate(fid)：哈希查行，微秒级回答"某个果去了哪个出口"
+    - between(t0, t1)：时间列二分，取时间窗内的行区间
+    """
+    def __init__(self, capacity: int = 0, first_id: int = 1) -> None:
+        from array import array
+        self.cols = {name: array(code) for name, code in TRACE_COLUMNS}
+        self.epoch = 0.0
+        self.next_id = first_id
+        self.enabled = True
+        self.last_ms = 0
+        self.reported_row = -1
+        bits = 16
+        while capacity and (1 << bits) * TRACE_MAX_LOAD < capacity:
+            bits += 1
+        self.rehashes = 0
+        self._alloc_index(bits)
+
+    def __len__(self) -> int:
+        return len(self.cols["fruit_id"])
+
+    def _alloc_index(self, bits: int) -> None:
+        from array import array
+        self.index = array("I", bytes(4 << bits))  # 行号 + 1，0 为空
+        self.mask = (1 << bits) - 1
+        self.shift = 64 - bits
+
+    def _slot(self, fid: int) -> int:
+        return (fid * TRACE_HASH_MUL & 0xFFFFFFFFFFFFFFFF) >> self.shift
+
+    def _insert(self, fid: int, row_plus_1: int) -> None:
+        index = self.index
+        fids = self.cols["fruit_id"]
+        mask = self.mask
+        i = self._slot(fid)
+        while True:
+            r = index[i]
+            if r == 0 or fids[r - 1] == fid:
+                index[i] = row_plus_1
+                return
+            i = (i + 1) & mask
+
+    def _grow(self) -> None:
+        self._alloc_index(64 - self.shift + 1)
+        self.rehashes += 1
+        for row, fid in enumerate(self.cols["fruit_id"]):
+            self._insert(fid, row + 1)
+
+    def record(self, weight: int, channel: int, grades: Tuple[int, int, int, int], exit_index: int) -> Tuple[int, int]:
+        now = WALL_CLOCK()
+        if not self.epoch:
+            self.epoch = now
+        # 时间列保持非递减，时间索引直接二分
+        t_ms = max(self.last_ms, min(0xFFFFFFFF, int((now - self.epoch) * 1000.0)))
+        self.last_ms = t_ms
+        fid = self.next_id
+        self.next_id = (fid + 1) & 0xFFFFFFFF or 1
+        row = len(self)
+        cup = row % TRACE_CUPS
+        c = self.cols
+        c["fruit_id"].append(fid)
+        c["t_ms"].append(t_ms)
+        c["cup"].append(cup)
+        c["channel"].append(channel & 0xFF)
+        c["weight"].append(max(0, min(0xFFFF, int(weight))))
+        c["grades"].append(grades[0] & 0xFF | (grades[1] & 0xFF) << 8 | (grades[2] & 0xFF) << 16 | (grades[3] & 0xFF) << 24)
+        c["exit"].append(exit_index & 0xFF)
+        if row + 1 > (self.mask + 1) * TRACE_MAX_LOAD:
+            self._grow()
+        else:
+            self._insert(fid, row + 1)
+        return fid, cup
+
+    def latest_unreported(self) -> int:
+        """最新一行若尚未被单果帧上报则返回行号，否则 -1。"""
+        row = len(self) - 1
+        if row <= self.reported_row:
+            return -1
+        self.reported_row = row
+        return row
+
+    def find_row(self, fid: int) -> int:
+        index = self.index
+        fids = self.cols["fruit_id"]
+        mask = self.mask
+        i = self._slot(fid)
+        while True:
+            r = index[i]
+            if r == 0:
+                return -1
+            if fids[r - 1] == fid:
+                return r - 1
+            i = (i + 1) & mask
+
+    def row(self, row: int) -> Dict[str, object]:
+        c = self.cols
+        g = c["grades"][row]
+        return {
+            "fruit_id": c["fruit_id"][row],
+            "time": self.epoch + c["t_ms"][row] / 1000.0,
+            "cup": c["cup"][row],
+            "channel": c["channel"][row],
+            "weight_g": c["weight"][row],
+            "grades": {"weight": g & 0xFF, "size": g >> 8 & 0xFF, "quality": g >> 16 & 0xFF, "final": g >> 24},
+            "exit": None if c["exit"][row] == TRACE_UNSORTED else c["exit"][row] + 1,
+        }
+
+    def locate(self, fid: int) -> Optional[Dict[str, object]]:
+        row = self.find_row(fid)
+        return None if row < 0 else self.row(row)
+
+    def between(self, t0: float, t1: float) -> range:
+        import bisect
+        col = self.cols["t_ms"]
+        lo = bisect.bisect_left(col, max(0, int((t0 - self.epoch) * 1000.0)))
+        hi = bisect.bisect_left(col, max(0, int((t1 - self.epoch) * 1000.0)))
+        return range(lo, hi)
+
+    def nbytes(self) -> int:
+        return sum(col.itemsize * len(col) for col in self.cols.values()) + self.index.itemsize * len(self.index)
+
+    def save(self, out_dir: str) -> None:
+        import os
+        os.makedirs(out_dir, exist_ok=True)
+        for name, col in list(self.cols.items()) + [("index", self.index)]:
+            with open(os.path.join(out_dir, f"{name}.bin"), "wb") as f:
+                col.tofile(f)
+        meta = {"rows": len(self), "epoch": self.epoch, "next_id": self.next_id, "slots": self.mask + 1,
+                "columns": dict(TRACE_COLUMNS), "hash_mul": TRACE_HASH_MUL, "cups": TRACE_CUPS}
+        with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+
+    @classmethod
+    def load(cls, in_dir: str) -> "FruitTraceStore":
+        import os
+        from array import array
+        with open(os.path.join(in_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(first_id=meta["next_id"])
+        store.epoch = meta["epoch"]
+        for name, code in list(TRACE_COLUMNS) + [("index", "I")]:
+            col = array(code)
+            count = meta["rows"] if name != "index" else meta["slots"]
+            with open(os.path.join(in_dir, f"{name}.bin"), "rb") as f:
+                col.fromfile(f, count)
+            if name == "index":
+                store.index = col
+            else:
+                store.cols[name] = col
+        store.mask = meta["slots"] - 1
+        store.shift = 64 - store.mask.bit_length()
+        store.last_ms = store.cols["t_ms"][-1] if meta["rows"] else 0
+        return store
+
+    def probe_latency_us(self, samples: int) -> float:
+        n = len(self)
+        if not n or samples <= 0:
+            return 0.0
+        fids = self.cols["fruit_id"]
+        keys = [fids[random.randrange(n)] for _ in range(samples)]
+        t0 = time.perf_counter()
+        for fid in keys:
+            self.locate(fid)
+        return (time.perf_counter() - t0) / samples * 1e6
+
+    def log_report(self, probe: int = 0) -> None:
+        n = len(self)
+        mb = self.nbytes() / (1024 * 1024)
+        msg = (f"[Trace] fruits={n} next_id={self.next_id} {mb:.1f}MB ({self.nbytes() / max(1, n):.1f}B/fruit, "
+               f"index slots={self.mask + 1} load={n / (self.mask + 1):.2f} rehashes={self.rehashes}) "
+               f"recording={'on' if self.enabled else 'off'}")
+        if probe and n:
+            msg += f" locate={self.probe_latency_us(probe):.2f}us"
+        log_info(msg)
+
+
+def close_trace_store(args: argparse.Namespace) -> None:
+    if TRACE_STORE is None:
+        return
+    TRACE_STORE.log_report(args.trace_probe)
+    if args.trace_out:
+        TRACE_STORE.save(args.trace_out)
+        log_info(f"[Trace] saved {len(TRACE_STORE)} fruits -> {args.trace_out}")
+
+
+def run_trace_lookup(args: argparse.Namespace) -> None:
+    store = FruitTraceStore.load(args.trace_out)
+    log_info(f"[Trace] loaded {len(store)} fruits from {args.trace_out}")
+    for part in args.trace_lookup.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        t0 = time.perf_counter()
+        info = store.locate(int(part, 0))
+        us = (time.perf_counter() - t0) * 1e6
+        if info is None:
+            log_info(f"[Trace] fruit {part}: not found ({us:.1f}us)")
+            continue
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info["time"]))
+        where = "unsorted" if info["exit"] is None else f"exit E{info['exit']}"
+        log_info(f"[Trace] fruit {info['fruit_id']}: {where} at {when} cup={info['cup']} "
+                 f"channel={info['channel']} weight={info['weight_g']}g grades={info['grades']} ({us:.1f}us)")
+
+
+# ==================== 滑动窗口 KPI（加工信息/出口占比） ====================
+# 一条按秒分桶的环形缓冲（长度 = 最大窗口），每个窗口维护累计和 + 尾指针：
+# 每个果实进桶一次、出窗口一次，更新均摊 O(1)；快照不回扫历史
+class KpiEngine:
+    """
+    指标口径与 tb_FruitProcessInfo 一致：
+    - RealWeightCount      窗口内重量（kg）
+    - RealWeightCountPer   折算小时产量（个/h）
+    - SeparationEfficiency 落入有效出口的果实占比（%）
+    - SpeedPercent         每分钟产量 / 额定每分钟产量（%，封顶 100）
+    - AvgWeight            平均单果重（g）
+    另有班次累计（END_SAVE/END_CLEAR 清零）与各窗口出口占比（同 calc_exit_percent）
+    """
+    def __init__(self, windows: List[int], nominal_per_min: float) -> None:
+        import threading
+        from array import array
+        self.windows = sorted({max(1, int(w)) for w in windows}) or [60]
+        self.ring = self.windows[-1]
+        self.nominal_per_min = nominal_per_min
+        self.lock = threading.Lock()
+        self.b_sec = array("q", [-1]) * self.ring
+        self.b_count = array("I", bytes(4 * self.ring))
+        self.b_sorted = array("I", bytes(4 * self.ring))
+        self.b_weight = array("Q", bytes(8 * self.ring))
+        self.b_exits: List[Optional[Dict[int, List[int]]]] = [None] * self.ring
+        self.head = -1
+        self.first_sec = -1
+        # 每个窗口：[tail 秒, count, sorted, weight_g, exit_counts, exit_weights]
+        self.sums = {w: [0, 0, 0, 0, [0] * MAX_EXIT_NUM, [0] * MAX_EXIT_NUM] for w in self.windows}
+        self.shift = [0, 0, 0, [0] * MAX_EXIT_NUM, [0] * MAX_EXIT_NUM]
+        self.shift_start = 0.0
+        self.added = 0
+
+    def _evict(self, w: int, sec: int) -> None:
+        acc = self.sums[w]
+        limit = sec - w  # 秒 <= limit 的桶移出窗口
+        if acc[0] > limit:
+            return
+        if limit - acc[0] >= self.ring:
+            # 空档超过整个环：窗口内已无数据
+            acc[1] = acc[2] = acc[3] = 0
+            acc[4] = [0] * MAX_EXIT_NUM
+            acc[5] = [0] * MAX_EXIT_NUM
+            acc[0] = limit + 1
+            return
+        counts, weights = acc[4], acc[5]
+        for t in range(acc[0], limit + 1):
+            i = t % self.ring
+            if self.b_sec[i] != t:
+                continue
+            acc[1] -= self.b_count[i]
+            acc[2] -= self.b_sorted[i]
+            acc[3] -= self.b_weight[i]
+            for e, (n, wg) in (self.b_exits[i] or {}).items():
+                counts[e] -= n
+                weights[e] -= wg
+        acc[0] = limit + 1
+
+    def _advance(self, sec: int) -> None:
+        if sec <= self.head:
+            return
+        for w in self.windows:
+            self._evict(w, sec)
+        start = max(self.head + 1, sec - self.ring + 1)
+        for t in range(start, sec + 1):
+            i = t % self.ring
+            self.b_sec[i] = t
+            self.b_count[i] = 0
+            self.b_sorted[i] = 0
+            self.b_weight[i] = 0
+            self.b_exits[i] = None
+        self.head = sec
+
+    def add(self, now: float, weight_g: int, exit_index: int) -> None:
+        sec = int(now)
+        with self.lock:
+            if self.first_sec < 0:
+                self.first_sec = sec
+                self.shift_start = now
+                for acc in self.sums.values():
+                    acc[0] = sec
+            self._advance(sec)
+            sec = max(sec, self.head)  # 迟到的果实记入当前桶
+            i = sec % self.ring
+            ok = 0 <= exit_index < MAX_EXIT_NUM
+            self.b_count[i] += 1
+            self.b_weight[i] += weight_g
+            shift = self.shift
+            shift[0] += 1
+            shift[2] += weight_g
+            if ok:
+                self.b_sorted[i] += 1
+                shift[1] += 1
+                shift[3][exit_index] += 1
+                shift[4][exit_index] += weight_g
+                bucket = self.b_exits[i]
+                if bucket is None:
+                    bucket = self.b_exits[i] = {}
+                cell = bucket.get(exit_index)
+                if cell is None:
+                    bucket[exit_index] = [1, weight_g]
+                else:
+                    cell[0] += 1
+                    cell[1] += weight_g
+            for acc in self.sums.values():
+                acc[1] += 1
+                acc[3] += weight_g
+                if ok:
+                    acc[2] += 1
+                    acc[4][exit_index] += 1
+                    acc[5][exit_index] += weight_g
+            self.added += 1
+
+    def reset_shift(self, now: float) -> None:
+        with self.lock:
+            self.shift = [0, 0, 0, [0] * MAX_EXIT_NUM, [0] * MAX_EXIT_NUM]
+            self.shift_start = now
+
+    def _metrics(self, count: int, sorted_n: int, weight_g: int, span_s: float,
+                 exit_counts: List[int], exit_weights: List[int]) -> Dict[str, object]:
+        per_hour = count * 3600.0 / max(1e-9, span_s)
+        use_weight, percents = calc_exit_percent(exit_counts, exit_weights)
+        return {
+            "span_s": round(span_s, 1),
+            "fruits": count,
+            "RealWeightCount": weight_g / 1000.0,
+            "RealWeightCountPer": round(per_hour, 1),
+            "SeparationEfficiency": round(sorted_n * 100.0 / count, 2) if count else 0.0,
+            "SpeedPercent": round(min(100.0, per_hour / 60.0 * 100.0 / max(1e-9, self.nominal_per_min)), 2),
+            "AvgWeight": round(weight_g / count, 2) if count else 0.0,
+            "exit_basis": "weight" if use_weight else "count",
+            "exit_percent": {f"E{i + 1}": p for i, p in enumerate(percents) if p > 0},
+        }
+
+    def snapshot(self, now: float) -> Dict[str, Dict[str, object]]:
+        with self.lock:
+            now = max(now, float(self.head))
+            sec = int(now)
+            self._advance(sec)
+            out: Dict[str, Dict[str, object]] = {}
+            seen = sec - self.first_sec + 1 if self.first_sec >= 0 else 0
+            for w in self.windows:
+                acc = self.sums[w]
+                out[f"{w}s"] = self._metrics(acc[1], acc[2], acc[3], max(1, min(w, seen)), acc[4], acc[5])
+            sh = self.shift
+            out["shift"] = self._metrics(sh[0], sh[1], sh[2], max(1.0, now - self.shift_start) if sh[0] else 1.0,
+                                         sh[3], sh[4])
+            return out
+
+    def log_report(self, json_path: str = "", top_n: int = 6) -> None:
+        now = WALL_CLOCK()
+        snap = self.snapshot(now)
+        for name, m in snap.items():
+            top = sorted(m["exit_percent"].items(), key=lambda kv: -kv[1])[:top_n]
+            exits = ", ".join(f"{k}:{v:.2f}%" for k, v in top) or "-"
+            log_info(f"[KPI] {name:>6} fruits={m['fruits']} {m['RealWeightCount']:.2f}kg {m['RealWeightCountPer']:.0f}/h "
+                     f"eff={m['SeparationEfficiency']:.2f}% speed={m['SpeedPercent']:.1f}% avg={m['AvgWeight']:.1f}g "
+                     f"exits({m['exit_basis']}) {exits}")
+        if json_path:
+            with open(json_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"t": round(now, 3), "windows": snap}, ensure_ascii=False) + "\n")
+
+
+def parse_kpi_windows(spec: str) -> List[int]:
+    out = []
+    for part in spec.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        mult = 1
+        if part[-1] in "smh":
+            mult = {"s": 1, "m": 60, "h": 3600}[part[-1]]
+            part = part[:-1]
+        out.append(int(float(part) * mult))
+    return out
+
+
+# ==================== FSM 命令应答（有状态） ====================
+HC_CMD_WAVE_FORM_ON = 0x0009
+HC_CMD_WAVE_FORM_OFF = 0x000A
+HC_CMD_GRADEINFO_ON = 0x000F
+HC_CMD_GRADEINFO_OFF = 0x0010
+HC_CMD_WEIGHTINFO_ON = 0x0011
+HC_CMD_WEIGHTINFO_OFF = 0x0012
+HC_CMD_GETVERSION = 0x001A
+HC_CMD_DATA_TRACKING_ON = 0x000B
+HC_CMD_DATA_TRACKING_OFF = 0x000C
+FSM_CMD_GETVERSION = 0x1008
+BYTE_NUM_FSM_VERSION = 64
+
+# 命令 -> (发射器名, 开/关, 日志名)
+RESPONDER_STREAM_CMDS = {
+    HC_CMD_GRADEINFO_ON: ("grade", True, "GRADEINFO_ON"),
+    HC_CMD_GRADEINFO_OFF: ("grade", False, "GRADEINFO_OFF"),
+    HC_CMD_WEIGHTINFO_ON: ("weight", True, "WEIGHTINFO_ON"),
+    HC_CMD_WEIGHTINFO_OFF: ("weight", False, "WEIGHTINFO_OFF"),
+    HC_CMD_WAVE_FORM_ON: ("wave", True, "WAVE_FORM_ON"),
+    HC_CMD_WAVE_FORM_OFF: ("wave", False, "WAVE_FORM_OFF"),
+}
+
+
+class FsmResponder:
+    """
+    模拟 FSM 的命令应答与上报开关状态
+    - HC_CMD_GETVERSION -> 回 FSM_CMD_GETVERSION（64 字节版本串），延迟 = 收到命令到回包发出
+    - *_ON  -> 打开对应发射器，延迟 = 收到命令到该流第一帧发出
+    - *_OFF -> 关闭对应发射器，延迟 = 收到命令到状态生效；之后仍发出的帧计入 leaked
+    """
+    def __init__(self, args: argparse.Namespace) -> None:
+        import threading
+        self.args = args
+        self.version = args.fsm_version
+        self.lock = threading.Lock()
+        self.streams: Dict[str, bool] = {"grade": args.responder_streams_on, "weight": args.responder_streams_on,
+                                         "wave": args.responder_streams_on}
+        self.emitters: Dict[str, PeriodicEmitter] = {}
+        self.scheduler: Optional[TimerScheduler] = None
+        self.pending: Dict[str, Tuple[str, float]] = {}
+        self.latency: Dict[str, "deque[float]"] = {}
+        self.counts: Dict[str, int] = {}
+        self.leaked: Dict[str, int] = {}
+
+    def attach(self, scheduler: TimerScheduler) -> None:
+        self.scheduler = scheduler
+        for name in self.streams:
+            emitter = scheduler.emitters.get(name)
+            if emitter is None:
+                continue
+            emitter.enabled = self.streams[name]
+            emitter.callback = self._wrap(name, emitter.callback)
+            self.emitters[name] = emitter
+
+    def _wrap(self, name: str, callback: Callable[[], object]) -> Callable[[], object]:
+        def wrapped() -> object:
+            result = callback()
+            self.on_emitted(name)
+            return result
+        return wrapped
+
+    def _record(self, label: str, t_cmd: float) -> None:
+        self.latency.setdefault(label, deque(maxlen=1024)).append(time.perf_counter() - t_cmd)
+
+    def on_emitted(self, name: str) -> None:
+        with self.lock:
+            if not self.streams.get(name, False):
+                self.leaked[name] = self.leaked.get(name, 0) + 1
+                return
+            pending = self.pending.pop(name, None)
+            if pending:
+                self._record(*pending)
+
+    def handle(self, cmd: int, src_id: int, dst_id: int, body: bytes, t_recv: float) -> None:
+        if cmd == HC_CMD_GETVERSION:
+            self.counts["GETVERSION"] = self.counts.get("GETVERSION", 0) + 1
+            payload = self.version.encode("utf-8")[:BYTE_NUM_FSM_VERSION - 1]
+            payload = payload.ljust(BYTE_NUM_FSM_VERSION, b"\x00")
+            header = create_header_with_ids(FSM_CMD_GETVERSION, dst_id or FSM_ID, src_id or HC_ID)
+            deliver_packet(self.args, header, payload, "Version")
+            self._record("GETVERSION", t_recv)
+            return
+        if cmd in (HC_CMD_DATA_TRACKING_ON, HC_CMD_DATA_TRACKING_OFF):
+            on = cmd == HC_CMD_DATA_TRACKING_ON
+            label = "DATA_TRACKING_ON" if on else "DATA_TRACKING_OFF"
+            self.counts[label] = self.counts.get(label, 0) + 1
+            if TRACE_STORE is not None:
+                TRACE_STORE.enabled = on
+            self._record(label, t_recv)
+            log_info(f"[Responder] {label}: trace store {'-' if TRACE_STORE is None else ('on' if on else 'off')}")
+            return
+        spec = RESPONDER_STREAM_CMDS.get(cmd)
+        if spec is None:
+            return
+        name, on, label = spec
+        with self.lock:
+            self.counts[label] = self.counts.get(label, 0) + 1
+            self.streams[name] = on
+            emitter = self.emitters.get(name)
+            kick = on and emitter is not None and not emitter.enabled
+            if emitter is not None:
+                emitter.enabled = on
+            if kick:
+                self.pending[name] = (label, t_recv)
+            else:
+                # 没有对应发射器、已经开着或关闭命令时，状态切换即生效
+                self.pending.pop(name, None)
+                self._record(label, t_recv)
+        if kick and self.scheduler is not None:
+            # 从关到开立即发第一帧，而不是等到原周期的下一个截止点
+            self.scheduler.kick(name)
+        log_info(f"[Responder] {label}: {name} stream {'on' if on else 'off'}")
+
+    def log_report(self) -> None:
+        state = " ".join(f"{k}={'on' if v else 'off'}" for k, v in self.streams.items())
+        log_info(f"[Responder] state: {state} version={self.version!r}")
+        for label in sorted(self.latency):
+            vals = sorted(self.latency[label])
+            p50 = vals[len(vals) // 2] * 1000.0
+            p95 = vals[min(len(vals) - 1, int(len(vals) * 0.95))] * 1000.0
+            log_info(f"[Responder] {label} n={self.counts.get(label, 0)} cmd->effect p50/p95/max="
+                     f"{p50:.2f}/{p95:.2f}/{vals[-1] * 1000.0:.2f}ms")
+        if self.leaked:
+            log_info(f"[Responder] frames after OFF: {self.leaked}")
+
+
+# ==================== 虚拟时钟：时间压缩的班次模拟 ====================
+class VirtualClock:
+    """
+    TimerScheduler 的 clock/sleep 注入：sleep 只推进虚拟时间，不真正等待
+    wall() 为包内嵌时间戳（time_tag）使用的虚拟墙钟
+    """
+    def __init__(self, start_epoch: float) -> None:
+        self.t = 0.0
+        self.epoch = float(start_epoch)
+
+    def now(self) -> float:
+        return self.t
+
+    def sleep(self, dt: float) -> None:
+        if dt > 0:
+            self.t += dt
+
+    def wall(self) -> float:
+        return self.epoch + self.t
+
+    def wall_text(self) -> str:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.wall()))
+
+
+class VirtualShiftSink:
+    """
+    虚拟班次的 PACKET_SINK：
+    - capture: 原样帧顺序写入（.gz 结尾则 gzip 归档），可直接给 tools/qt_stream_tool.py list/replay
+      控制命令与批次边界写入 <capture>.events.jsonl（含虚拟时间与帧序号）
+    - db: 按 App 的落库方式写 harmony.db 结构：END_SAVE -> tb_FruitInfo + tb_ExportInfo，
+      每分钟（DatabaseSync 自动保存间隔）一行 tb_fruitprocessinfo_<year>
+    """
+    DB_TABLES = ("tb_FruitInfo", "tb_ExportInfo")
+
+    def __init__(self, args: argparse.Namespace, clock: VirtualClock, state: SimState) -> None:
+        self.args = args
+        self.clock = clock
+        self.state = state
+        self.frames = 0
+        self.bytes = 0
+        self.controls = 0
+        self.batches_saved = 0
+        self.process_rows = 0
+        self.batch_start = clock.wall_text()
+        self.last_yield = 0
+        self.last_weight = 0
+        self.out = None
+        self.events = None
+        if args.capture:
+            if args.capture.endswith(".gz"):
+                import gzip
+                self.out = gzip.open(args.capture, "wb", compresslevel=1)
+            else:
+                self.out = open(args.capture, "wb", buffering=1024 * 1024)
+            self.events = open(args.capture + ".events.jsonl", "w", encoding="utf-8")
+        self.db = None
+        if args.virtual_db:
+            self._open_db(args.virtual_db)
+
+    def _open_db(self, path: str) -> None:
+        import os
+        import sqlite3
+        schema_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "harmony.db")
+        if os.path.abspath(path) == os.path.abspath(schema_db):
+            raise SystemExit("--virtual-db must not be the bundled harmony.db template")
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")
+        src = sqlite3.connect(schema_db)
+        for name, sql in src.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type='table' AND name IN (?, ?)", self.DB_TABLES):
+            self.db.execute(sql.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+        src.close()
+        row = self.db.execute('SELECT MAX("CustomerID") FROM tb_FruitInfo').fetchone()
+        self.next_customer_id = int(row[0] or 0) + 1
+        self.year_tables: set = set()
+
+    def _process_table(self) -> str:
+        # 与 YearlyTableManager.getFruitProcessInfoTableName / 建表语句一致
+        year = time.localtime(self.clock.wall()).tm_year
+        table = f"tb_fruitprocessinfo_{max(1970, year)}"
+        if table not in self.year_tables:
+            self.db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (FID INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,"
+                "RealWeightCount REAL,RealWeightCountPer REAL,SeparationEfficiency REAL,SpeedPercent REAL,"
+                "AvgWeight REAL,RunningDate TEXT);"
+            )
+            self.year_tables.add(table)
+        return table
+
+    def _event(self, kind: str, **extra) -> None:
+        if self.events is not None:
+            rec = {"t": self.clock.wall_text(), "vt": round(self.clock.now(), 3), "frame": self.frames, "kind": kind}
+            rec.update(extra)
+            self.events.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    # ---- sink 接口 ----
+    def send_packet(self, header: bytes, body: bytes, name: str) -> bool:
+        if self.out is not None:
+            self.out.write(header)
+            self.out.write(body)
+        self.frames += 1
+        self.bytes += len(header) + len(body)
+        return True
+
+    def send_control(self, cmd: str, host: str, port: int) -> bool:
+        self.controls += 1
+        self._event("control", cmd=cmd, fruit=self.state.current_yield, weight_g=self.state.current_total_weight)
+        if self.db is not None and cmd == "END_SAVE" and self.state.current_yield > 0:
+            self._save_batch()
+        self.batch_start = self.clock.wall_text()
+        self.last_yield = 0
+        self.last_weight = 0
+        return True
+
+    def _save_batch(self) -> None:
+        cid = self.next_customer_id
+        self.next_customer_id += 1
+        start = self.batch_start
+        end = self.clock.wall_text()
+        exports = [(cid, i + 1, n, self.state.exit_weight_counts[i], f"出口{i + 1}")
+                   for i, n in enumerate(self.state.exit_counts) if n > 0]
+        self.db.execute(
+            'INSERT INTO tb_FruitInfo ("CustomerID","SysID","MajorCustomerID","ChainIdx","FBatchNo","CustomerName",'
+            '"FarmName","FruitName","SortBaseName","StartTime","EndTime","StartedState","CompletedState",'
+            '"BatchWeight","BatchNumber","QualityGradeSum","WeightOrSizeGradeSum","ExportSum","FVisible") '
+            'VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)',
+            (cid, self.args.subsys + 1, 0, "0", f"B{start[:10].replace('-', '')}{cid:07d}", "Mock", "Mock",
+             "Apple", "Weight", start, end, "1", "1", self.state.current_total_weight, self.state.current_yield,
+             self.args.qual_num, self.args.size_num, len(exports), 1),
+        )
+        self.db.executemany(
+            'INSERT INTO tb_ExportInfo ("CustomerID","ExportID","FruitNumber","FruitWeight","ExitName") '
+            'VALUES (?,?,?,?,?)', exports)
+        self.batches_saved += 1
+
+    def autosave(self, interval_s: float) -> None:
+        """DatabaseSync 自动保存：每个间隔写一行加工信息（增量产量/重量）"""
+        if self.db is None:
+            return
+        d_yield = self.state.current_yield - self.last_yield
+        d_weight = self.state.current_total_weight - self.last_weight
+        self.last_yield = self.state.current_yield
+        self.last_weight = self.state.current_total_weight
+        window = int(interval_s)
+        if KPI_ENGINE is not None and window in KPI_ENGINE.windows:
+            # 直接取同长度窗口的快照，不再按累计差分估算
+            m = KPI_ENGINE.snapshot(self.clock.wall())[f"{window}s"]
+            if not m["fruits"]:
+                return
+            self.db.execute(
+                f'INSERT INTO {self._process_table()} ("RealWeightCount","RealWeightCountPer","SeparationEfficiency",'
+                '"SpeedPercent","AvgWeight","RunningDate") VALUES (?,?,?,?,?,?)',
+                (m["RealWeightCount"], m["RealWeightCountPer"], m["SeparationEfficiency"],
+                 m["SpeedPercent"], m["AvgWeight"], self.clock.wall_text()),
+            )
+            self.process_rows += 1
+            return
+        if d_yield <= 0:
+            return
+        per_hour = d_yield * 3600.0 / max(1e-9, interval_s)
+        self.db.execute(
+            f'INSERT INTO {self._process_table()} ("RealWeightCount","RealWeightCountPer","SeparationEfficiency",'
+            '"SpeedPercent","AvgWeight","RunningDate") VALUES (?,?,?,?,?,?)',
+            (d_weight / 1000.0, per_hour, round(random.uniform(92.0, 99.5), 2),
+             min(100.0, per_hour / 360.0), d_weight / d_yield, self.clock.wall_text()),
+        )
+        self.process_rows += 1
+
+    def close(self) -> None:
+        if self.out is not None:
+            self.out.close()
+        if self.events is not None:
+            self.events.close()
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+
+    def log_report(self) -> None:
+        log_info(
+            f"[Virtual] frames={self.frames} bytes={self.bytes / (1024 * 1024):.1f}MB controls={self.controls} "
+            f"batches_saved={self.batches_saved} process_rows={self.process_rows}"
+        )
+
+
+def parse_virtual_start(text: str) -> float:
+    if not text:
+        lt = time.localtime()
+        return time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, 6, 0, 0, 0, 0, -1))
+    fmt = "%Y-%m-%d %H:%M:%S" if len(text) > 10 else "%Y-%m-%d"
+    return time.mktime(time.strptime(text, fmt))
+
+
+def run_virtual_shift(args: argparse.Namespace) -> None:
+    """
+    全部发射器在虚拟时间上运行（无 sleep），按 CPU 速度生成 --virtual-hours 小时的数据
+    """
+    global PACKET_SINK, SHOW_SEND_LOGS, WALL_CLOCK
+    clock = VirtualClock(parse_virtual_start(args.virtual_start))
+    state = SimState(args)
+    sink = VirtualShiftSink(args, clock, state)
+    prev = (PACKET_SINK, SHOW_SEND_LOGS, WALL_CLOCK)
+    PACKET_SINK, SHOW_SEND_LOGS, WALL_CLOCK = sink, False, clock.wall
+
+    sched = build_scheduler(args, state, TimerScheduler(clock=clock.now, sleep=clock.sleep))
+    if sink.db is not None:
+        sched.add("autosave", args.autosave_s, lambda: sink.autosave(args.autosave_s), phase_s=args.autosave_s)
+    duration_s = args.virtual_hours * 3600.0
+    t_wall = time.perf_counter()
+
+    def progress() -> None:
+        wall = time.perf_counter() - t_wall
+        log_info(f"[Virtual] {clock.wall_text()} ({clock.now() / 3600.0:.1f}h simulated) frames={sink.frames} "
+                 f"wall={wall:.1f}s x{clock.now() / max(1e-9, wall):.0f}")
+        if sink.db is not None:
+            sink.db.commit()
+
+    sched.add("progress", 3600.0, progress, phase_s=3600.0)
+    log_info(f"[Virtual] start={clock.wall_text()} hours={args.virtual_hours:g} capture={args.capture or '-'} "
+             f"db={args.virtual_db or '-'}")
+    try:
+        sched.run(duration_s=duration_s)
+    except KeyboardInterrupt:
+        log_info("[Virtual] stopped by user.")
+    finally:
+        wall = time.perf_counter() - t_wall
+        sink.close()
+        if KPI_ENGINE is not None:
+            KPI_ENGINE.log_report(args.kpi_json, args.topn)  # 仍在虚拟时间上取快照
+        PACKET_SINK, SHOW_SEND_LOGS, WALL_CLOCK = prev
+        sched.log_stats()
+        sink.log_report()
+        close_trace_store(args)
+        log_info(f"[Virtual] simulated {clock.now() / 3600.0:.2f}h in {wall:.1f}s wall "
+                 f"(x{clock.now() / max(1e-9, wall):.0f}), end={clock.wall_text()}")
+
+
+def build_scheduler(args: argparse.Namespace, state: SimState, scheduler: Optional[TimerScheduler] = None) -> TimerScheduler:
+    """
+    按 CLI 参数为每个发射器登记各自的周期/速率
+    """
+    sched = scheduler or TimerScheduler()
+    batch_counter = [0]
+
+    def on_statistics() -> None:
+        accumulate_fruit(args, state, random.randint(args.min_inc, args.max_inc))
+        emit_statistics(args, state)
+        state.cycles_done += 1
+
+    def on_end_control() -> None:
+        emit_end_control(args, state, args.end_mode, batch_counter[0])
+        batch_counter[0] += 1
+
+    sched.add("statistics", args.stats_interval_s, on_statistics)
+    if not args.no_grade and args.grade_rate_hz > 0:
+        sched.add_rate("grade", args.grade_rate_hz, lambda: emit_grade(args))
+    if not args.no_weight and args.weight_rate_hz > 0:
+        sched.add_rate("weight", args.weight_rate_hz, lambda: emit_weight(args))
+    if not args.no_st_grade and args.st_grade_period_s > 0:
+        sched.add("st-grade", args.st_grade_period_s, lambda: emit_st_grade(args))
+    if args.end_period_s > 0:
+        sched.add("end-control", args.end_period_s, on_end_control, phase_s=args.end_period_s)
+    if args.wave or FSM_RESPONDER is not None:
+        # 应答模式下总是登记，由 HC_CMD_WAVE_FORM_ON/OFF 控制开关
+        sched.add_rate("wave", max(1, args.wave_channels) * args.wave_sample_hz / WAVE_POINTS, lambda: emit_wave(args))
+    if KPI_ENGINE is not None and args.kpi_report_s > 0:
+        sched.add("kpi", args.kpi_report_s, lambda: KPI_ENGINE.log_report(args.kpi_json, args.topn),
+                  phase_s=args.kpi_report_s)
+    if FSM_RESPONDER is not None:
+        FSM_RESPONDER.attach(sched)
+    return sched
+
+
+def run_scheduled_simulation(args: argparse.Namespace) -> None:
+    """
+    调度模式：各发射器按绝对截止时间运行，统计周期不随发送耗时漂移
+    """
+    log_info("Starting FSM Simulation (scheduler mode)...")
+    state = SimState(args)
+    sched = build_scheduler(args, state)
+    if args.sched_report_s > 0:
+        sched.add("report", args.sched_report_s, sched.log_stats, phase_s=args.sched_report_s)
+
+    def done() -> bool:
+        return args.cycles is not None and state.cycles_done >= args.cycles
+
+    try:
+        seed_completed_batches(args)
+        if args.stop_after_seed:
+            return
+        sched.run(duration_s=args.duration_s, until=done)
+    except KeyboardInterrupt:
+        log_info("Simulation stopped by user.")
+    finally:
+        sched.log_stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock FSM device for HarmonyOS host")
+    parser.add_argument("--ip", default=SERVER_IP, help="鸿蒙设备/模拟器IP（运行App的一侧）")
+    parser.add_argument("--host", dest="ip", help="同 --ip 的别名")
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--control-port", type=int, default=CONTROL_PORT, help="PLC/控制端口（用于触发结束批次）")
+    parser.add_argument("--cmd-server", action="store_true", help="启动命令接收服务（用于接收鸿蒙下发的测试/配置命令）")
+    parser.add_argument("--cmd-server-only", action="store_true", help="仅启动命令接收服务，不发送统计数据")
+    parser.add_argument("--no-cmd-server", action="store_true", help="不启动命令接收服务（仅作为客户端发送统计数据）")
+    parser.add_argument("--cmd-port", type=int, default=CMD_SERVER_PORT, help="命令接收服务端口")
+    parser.add_argument("--cmd-server-host", default="0.0.0.0", help="命令接收服务绑定IP")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--seed-completed", type=int, default=0, help="预先生成N条已完成批次（需App支持END_CLEAR/END_SAVE）")
+    parser.add_argument("--seed-completed-cycles", type=int, default=2, help="每条已完成批次发送统计包次数")
+    parser.add_argument("--seed-completed-interval-s", type=float, default=0.6, help="预置批次发送间隔")
+    parser.add_argument("--end-mode", default="clear", choices=["clear", "save", "alternate"], help="预置批次结束模式")
+    parser.add_argument("--stop-after-seed", action="store_true", help="仅生成已完成批次后退出")
+
+    parser.add_argument("--dist", default="1:60,2:30,3:10", help="出口分布，例: 1:60,2:30,3:10（出口号从1开始）")
+    parser.add_argument("--dist2", default="", help="第二套出口分布（配合 --alternate 使用）")
+    parser.add_argument("--alternate", action="store_true", help="每轮循环在 dist/dist2 之间交替，方便观察波浪快速变化")
+
+    parser.add_argument("--min-inc", type=int, default=1)
+    parser.add_argument("--max-inc", type=int, default=5)
+    parser.add_argument("--min-weight-g", type=int, default=120)
+    parser.add_argument("--max-weight-g", type=int, default=180)
+
+    parser.add_argument("--stats-interval-s", type=float, default=1.0)
+    parser.add_argument("--loop-interval-s", type=float, default=2.0)
+    parser.add_argument("--cycles", type=int, default=None, help="循环次数（不填则无限循环）")
+    parser.add_argument("--scheduler", action="store_true", help="调度模式：各发射器按独立周期/速率在单调时钟上运行（--stats-interval-s 即统计周期）")
+    parser.add_argument("--grade-rate-hz", type=float, default=0.75, help="调度模式：FSM_CMD_GRADEINFO 发送速率")
+    parser.add_argument("--weight-rate-hz", type=float, default=1.0, help="调度模式：FSM_CMD_WEIGHTINFO 发送速率")
+    parser.add_argument("--st-grade-period-s", type=float, default=10.0, help="调度模式：StGradeInfo 发送周期（0=不发）")
+    parser.add_argument("--end-period-s", type=float, default=0.0, help="调度模式：按 --end-mode 发送 END_* 的周期（0=不发）")
+    parser.add_argument("--sched-report-s", type=float, default=10.0, help="调度模式：漏拍/延迟统计输出周期（0=仅结束时输出）")
+    parser.add_argument("--duration-s", type=float, default=None, help="调度模式：运行时长（秒）")
+    parser.add_argument("--scenario", default="", help="按 JSON 场景文件回放负载（阶段：爬坡/稳定/突发/停线/离线/批次结束）")
+    parser.add_argument("--scenario-speed", type=float, default=1.0, help="场景回放倍速（2 表示两倍速）")
+    parser.add_argument("--scenario-report", default="", help="场景各阶段统计输出为 JSON 文件")
+    parser.add_argument("--torture", default="", help="拆包/粘包压力模式，注入比例例: split:0.1,coalesce:0.1,garbage:0.05,wrong_dst:0.02,truncate:0.02,unknown:0.02,drip:0.005")
+    parser.add_argument("--torture-frames", type=int, default=2000, help="压力模式发送帧数")
+    parser.add_argument("--torture-loopback", action="store_true", help="发往本地可重同步接收端并统计重同步耗时（不连 App）")
+    parser.add_argument("--torture-baseline", action="store_true", help="先跑一遍无注入基线，输出吞吐/重同步退化对比")
+    parser.add_argument("--backpressure", action="store_true", help="背压感知发送：入队 + 令牌桶 + AIMD 自适应速率，队列满按策略丢包")
+    parser.add_argument("--bp-initial-rate", type=float, default=50.0, help="背压：初始发送速率(包/秒)")
+    parser.add_argument("--bp-min-rate", type=float, default=1.0, help="背压：最低发送速率(包/秒)")
+    parser.add_argument("--bp-max-rate", type=float, default=5000.0, help="背压：最高发送速率(包/秒)")
+    parser.add_argument("--bp-target-ms", type=float, default=50.0, help="背压：连接耗时目标(ms)，超过即减速")
+    parser.add_argument("--bp-timeout-s", type=float, default=5.0, help="背压：单包连接/发送超时")
+    parser.add_argument("--bp-queue", type=int, default=256, help="背压：发送队列上限(包)")
+    parser.add_argument("--bp-report-s", type=float, default=5.0, help="背压：速率报告周期(秒，0=仅结束时)")
+    parser.add_argument("--virtual-hours", type=float, default=0.0, help="虚拟时钟模式：按 CPU 速度模拟 N 小时（不 sleep，不发网络）")
+    parser.add_argument("--virtual-start", type=str, default="", help="虚拟起始时间，如 \"2026-03-02 06:00:00\"（默认今天 06:00）")
+    parser.add_argument("--capture", type=str, default="", help="虚拟模式输出的原始帧文件（.gz 结尾则 gzip 归档）")
+    parser.add_argument("--virtual-db", type=str, default="", help="虚拟模式按 harmony.db 结构落库的目标库文件")
+    parser.add_argument("--autosave-s", type=float, default=60.0, help="虚拟落库的加工信息保存间隔（DatabaseSync 默认 60s）")
+    parser.add_argument("--soak", action="store_true", help="长稳模式：周期记录 RSS/tracemalloc/FD/套接字状态/GC 并按斜率告警")
+    parser.add_argument("--soak-interval-s", type=float, default=60.0, help="长稳采样间隔（秒）")
+    parser.add_argument("--soak-window-s", type=float, default=3600.0, help="斜率计算窗口（秒）")
+    parser.add_argument("--soak-out", type=str, default="", help="时间序列 JSONL 输出（默认 soak_<时间>.jsonl）")
+    parser.add_argument("--soak-slopes", type=str, default=SOAK_DEFAULT_SLOPES, help="每小时增长告警阈值，如 rss_kb=2048,fds=2")
+    parser.add_argument("--soak-top", type=int, default=5, help="tracemalloc 记录增长最多的前 N 处（0=不启用 tracemalloc）")
+    parser.add_argument("--soak-frames", type=int, default=1, help="tracemalloc 回溯帧数")
+    parser.add_argument("--wave", action="store_true", help="发送 FSM_CMD_WAVEINFO 称重波形（隐含 --scheduler）")
+    parser.add_argument("--wave-channels", type=int, default=2, help="波形通道数（轮流出帧）")
+    parser.add_argument("--wave-sample-hz", type=float, default=1000.0, help="每通道采样率；帧率 = 采样率 / 256")
+    parser.add_argument("--wave-cup-hz", type=float, default=10.0, help="每通道每秒经过的果杯数")
+    parser.add_argument("--wave-fill", type=float, default=0.85, help="果杯装果比例")
+    parser.add_argument("--wave-noise", type=float, default=6.0, help="ADC 噪声标准差（counts）")
+    parser.add_argument("--wave-ring", type=int, default=32, help="每通道环形缓冲区帧数")
+    parser.add_argument("--flash", action="store_true", help="命令服务模拟 bootloader：接收 HC_CMD_BOOT/WAM_FLASH_BURN 固件块并回进度")
+    parser.add_argument("--flash-dir", type=str, default="flash_images", help="烧写镜像（映射文件）输出目录")
+    parser.add_argument("--flash-progress-step", type=int, default=5, help="进度回包的百分比步长")
+    parser.add_argument("--flash-chunk-overhead-ms", type=float, default=0.0, help="每块模拟的擦写/提交耗时")
+    parser.add_argument("--no-config-store", action="store_true", help="命令服务不解码/版本化下发的配置")
+    parser.add_argument("--config-history", type=int, default=16, help="每种配置保留的版本数")
+    parser.add_argument("--config-diff-lines", type=int, default=8, help="每次下发打印的变化字段行数（0=不打印）")
+    parser.add_argument("--trace", action="store_true", help="单果追溯：记录每个模拟果实（fruit_id/杯号/通道/重量/等级/出口/时间）")
+    parser.add_argument("--trace-capacity", type=int, default=0, help="预计果实数，预分配哈希索引避免扩容重排")
+    parser.add_argument("--trace-out", type=str, default="", help="退出时保存追溯存储的目录（配合 --trace-lookup 查询）")
+    parser.add_argument("--trace-lookup", type=str, default="", help="从 --trace-out 目录加载并查询 fruit_id（逗号分隔）后退出")
+    parser.add_argument("--trace-probe", type=int, default=10000, help="报告时随机查询次数，输出平均定位耗时（0=不测）")
+    parser.add_argument("--kpi", action="store_true", help="滑动窗口 KPI：产量/效率/速度/均重/出口占比（按秒分桶环形缓冲）")
+    parser.add_argument("--kpi-windows", type=str, default="1m,10m", help="滑动窗口列表，如 60,10m,8h（另有班次累计）")
+    parser.add_argument("--kpi-report-s", type=float, default=10.0, help="KPI 报告间隔（0=只在退出时报告）")
+    parser.add_argument("--kpi-nominal-per-min", type=float, default=600.0, help="额定每分钟产量（SpeedPercent 的 100%%）")
+    parser.add_argument("--kpi-json", type=str, default="", help="每次报告追加一行 JSON 快照")
+    parser.add_argument("--targets", type=str, default="", help="多目标分发: host[:port],host[:port]...（每个目标独立连接/队列/背压，参数同 --bp-*）")
+    parser.add_argument("--udp", action="store_true", help="单果帧(GRADEINFO/WEIGHTINFO)改走 UDP 批量数据报，其它包仍走 TCP")
+    parser.add_argument("--udp-port", type=int, default=UDP_PORT, help="UDP 目标/监听端口")
+    parser.add_argument("--udp-mtu", type=int, default=1472, help="单个数据报最大字节数（1500 - IP/UDP 头）")
+    parser.add_argument("--udp-flush-ms", type=float, default=5.0, help="未满的批次最长等待时间(ms)")
+    parser.add_argument("--udp-receiver", action="store_true", help="启动本地 UDP 接收端，统计丢包/乱序/有效吞吐")
+    parser.add_argument("--udp-report-s", type=float, default=2.0, help="UDP 收发统计输出周期")
+    parser.add_argument("--image-stream", action="store_true", help="IPM 图像流模式：向图像端口发送 IMAGE/SPLICE/SPOT/SHUTTER_ADJUST 帧")
+    parser.add_argument("--image-port", type=int, default=IMAGE_PORT, help="图像链路端口（HC_PORT1_NUM）")
+    parser.add_argument("--image-kinds", type=str, default="image", help="图像帧种类，逗号分隔: image,splice,spot,shutter")
+    parser.add_argument("--image-ipms", type=int, default=1, help="模拟的 IPM 个数（每个 IPM 每种帧一路）")
+    parser.add_argument("--image-width", type=int, default=640, help="单相机图像宽")
+    parser.add_argument("--image-height", type=int, default=480, help="单相机图像高")
+    parser.add_argument("--image-bpp", type=int, default=3, help="每像素字节数")
+    parser.add_argument("--image-cameras", type=int, default=MAX_COLOR_CAMERA_NUM, help="每帧拼接的相机个数")
+    parser.add_argument("--image-fps", type=float, default=5.0, help="每路帧率（--image-sweep 时为起始帧率）")
+    parser.add_argument("--image-slots", type=int, default=4, help="预分配帧槽位数")
+    parser.add_argument("--image-file", type=str, default="", help="用 mmap 映射的原始图像文件作为帧数据")
+    parser.add_argument("--image-timeout-s", type=float, default=5.0, help="单帧连接/发送超时")
+    parser.add_argument("--image-sweep", action="store_true", help="逐级提高帧率，找出图像链路饱和帧率")
+    parser.add_argument("--image-sweep-step-s", type=float, default=3.0, help="每档帧率持续时间")
+    parser.add_argument("--image-sweep-factor", type=float, default=1.5, help="每档帧率倍数")
+    parser.add_argument("--image-sweep-max-fps", type=float, default=2000.0, help="扫描的最高每路帧率")
+    parser.add_argument("--image-loopback", action="store_true", help="发到本地模拟接收端（一连接一帧）")
+    parser.add_argument("--responder", action="store_true", help="命令端口按 FSM 应答：GETVERSION 回版本，*_ON/OFF 开关对应上报流（隐含 --scheduler）")
+    parser.add_argument("--responder-streams-on", action="store_true", help="启动时分级/重量/波形上报即为开启（默认关闭，等待 *_ON 命令）")
+    parser.add_argument("--fsm-version", type=str, default="FSM-MOCK V1.0.0", help="GETVERSION 回复的版本串（最多 63 字节）")
+    parser.add_argument("--responder-report-s", type=float, default=10.0, help="应答延迟统计输出周期")
+    parser.add_argument("--drip-delay-ms", type=float, default=0.1, help="逐字节发送时每字节间隔(ms)")
+
+    parser.add_argument("--no-grade", action="store_true", help="不发送 FSM_CMD_GRADEINFO")
+    parser.add_argument("--no-st-grade", action="store_true", help="不发送 HC_CMD_GRADE_INFO (StGradeInfo)")
+    parser.add_argument("--no-weight", action="store_true", help="不发送 FSM_CMD_WEIGHTINFO")
+    parser.add_argument("--dry-run", action="store_true", help="仅打印，不发TCP数据")
+    parser.add_argument("--show-send-logs", action="store_true", help="显示客户端发送日志（默认只显示服务器收到的数据）")
+    parser.add_argument("--log-file", default="", help="日志文件路径（为空则不写文件）")
+    parser.add_argument("--log-level", default=LOG_LEVEL, help="日志级别：DEBUG/INFO/WARNING/ERROR")
+    parser.add_argument("--no-log-console", action="store_true", help="不输出到控制台，仅写文件")
+
+    parser.add_argument("--subsys", type=int, default=0, help="子系统索引(0-based)，影响 srcId 生成")
+    parser.add_argument("--max-ipm", type=int, default=4, help="随机发送分级时的 IPM 个数(0-based count)")
+    parser.add_argument("--grade-ipm", type=int, default=-1, help="固定分级包来源 IPM 索引(0-based)，-1 表示随机")
+    parser.add_argument("--stats-channel", type=int, default=0, help="统计包来源通道索引(0-11)")
+    parser.add_argument("--weight-channel", type=int, default=0, help="重量包来源通道索引(0-11)")
+    parser.add_argument("--qual-num", type=int, default=3, help="质量等级数量")
+    parser.add_argument("--size-num", type=int, default=4, help="尺寸等级数量")
+    parser.add_argument("--classify-type", type=int, default=1, help="分级类型位标志")
+    parser.add_argument("--label-type", type=int, default=1, help="贴标类型(0/1)")
+
+    parser.add_argument("--print-percent", action="store_true", help="打印出口占比TopN（与鸿蒙 EXIT_PERCENT 逻辑一致）")
+    parser.add_argument("--topn", type=int, default=6)
+    parser.add_argument("--force-total-weight-from-exits", action="store_true", help="让 totalWeight 始终等于各出口重量之和")
+    parser.add_argument("--dump-packet", choices=["stats", "grade", "weight", "st-grade"], help="输出单包完整字节流并退出")
+
+    args = parser.parse_args()
+    # 发送出口只能选一种，组合时不再静默忽略其中一个
+    if args.udp and args.targets:
+        parser.error("--udp 不能与 --targets 同时使用（多目标分发只走 TCP）")
+    if args.udp and args.backpressure:
+        parser.error("--udp 不能与 --backpressure 同时使用（UDP 批量发送没有背压队列）")
+    if args.targets and args.dry_run:
+        parser.error("--targets 不能与 --dry-run 同时使用（多目标分发的发送线程没有 dry-run）")
+
+    SERVER_IP = args.ip
+    SERVER_PORT = args.port
+    SHOW_SEND_LOGS = bool(args.show_send_logs)
+    LOG_FILE = args.log_file or None
+    LOG_TO_CONSOLE = not args.no_log_console
+    LOGGER = setup_logging(LOG_FILE, args.log_level, LOG_TO_CONSOLE)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.dump_packet:
+        name, header, body = build_dump_packet(args)
+        packet = header + body
+        print(f"{name} len={len(packet)} hex={packet.hex()}")
+        raise SystemExit(0)
+
+    if args.torture:
+        run_torture(args)
+        raise SystemExit(0)
+
+    if args.image_stream:
+        run_image_stream(args)
+        raise SystemExit(0)
+
+    if args.trace_lookup:
+        run_trace_lookup(args)
+        raise SystemExit(0)
+    if args.trace:
+        TRACE_STORE = FruitTraceStore(capacity=args.trace_capacity)
+    if args.kpi:
+        kpi_windows = parse_kpi_windows(args.kpi_windows)
+        if args.virtual_hours > 0 and args.virtual_db:
+            kpi_windows.append(int(args.autosave_s))  # 自动保存行取同长度窗口
+        KPI_ENGINE = KpiEngine(kpi_windows, args.kpi_nominal_per_min)
+
+    if args.virtual_hours > 0:
+        run_virtual_shift(args)
+        raise SystemExit(0)
+
+    if args.udp_receiver:
+        run_udp_receiver(args)
+        raise SystemExit(0)
+
+    if args.responder:
+        FSM_RESPONDER = FsmResponder(args)
+        if args.responder_report_s > 0:
+            start_periodic_reporter(FSM_RESPONDER.log_report, args.responder_report_s)
+
+    if args.flash:
+        FLASH_BOOTLOADER = FlashBootloader(args)
+    if not args.no_config_store and (args.cmd_server_only or not args.no_cmd_server):
+        CONFIG_STORE = ConfigStore(args)
+
+    soak = None
+    if args.soak:
+        soak = SoakMonitor(args)
+        start_periodic_reporter(soak.log_report, args.soak_interval_s)
+
+    if args.cmd_server_only:
+        try:
+            run_cmd_server(args)
+        finally:
+            if FLASH_BOOTLOADER is not None:
+                FLASH_BOOTLOADER.log_report()
+            if CONFIG_STORE is not None:
+                CONFIG_STORE.log_report()
+            close_trace_store(args)
+            if KPI_ENGINE is not None:
+                KPI_ENGINE.log_report(args.kpi_json, args.topn)
+            if soak is not None:
+                soak.close()
+    else:
+        if not args.no_cmd_server:
+            import threading
+            t = threading.Thread(target=run_cmd_server, args=(args,), daemon=True)
+            t.start()
+        if args.targets:
+            PACKET_SINK = FanoutSink(args, parse_targets(args.targets, SERVER_PORT))
+            if args.bp_report_s > 0:
+                start_periodic_reporter(PACKET_SINK.log_report, args.bp_report_s)
+        elif args.udp:
+            PACKET_SINK = UdpBatchSink(SERVER_IP, args.udp_port, args.udp_mtu, args.udp_flush_ms, args.dry_run)
+            if args.udp_report_s > 0:
+                start_periodic_reporter(PACKET_SINK.log_report, args.udp_report_s)
+        elif args.backpressure and not args.dry_run:
+            PACKET_SINK = BackpressureSender(args)
+            if args.bp_report_s > 0:
+                start_periodic_reporter(PACKET_SINK.log_report, args.bp_report_s)
+        scheduled = not args.scenario and (args.scheduler or args.responder or args.wave)
+        if KPI_ENGINE is not None and args.kpi_report_s > 0 and not scheduled:
+            start_periodic_reporter(lambda: KPI_ENGINE.log_report(args.kpi_json, args.topn), args.kpi_report_s)
+        try:
+            if args.scenario:
+                scenario_report = run_scenario(args, load_scenario(args.scenario))
+                if args.scenario_report:
+                    with open(args.scenario_report, "w", encoding="utf-8") as f:
+                        json.dump(scenario_report, f, ensure_ascii=False, indent=2)
+            elif scheduled:
+                run_scheduled_simulation(args)
+            else:
+                run_simulation(args)
+        finally:
+            if isinstance(PACKET_SINK, (BackpressureSender, UdpBatchSink, FanoutSink)):
+                PACKET_SINK.close()
+                PACKET_SINK.log_report()
+            if FSM_RESPONDER is not None:
+                FSM_RESPONDER.log_report()
+            if FLASH_BOOTLOADER is not None:
+                FLASH_BOOTLOADER.log_report()
+            if CONFIG_STORE is not None:
+                CONFIG_STORE.log_report()
+            close_trace_store(args)
+            if KPI_ENGINE is not None:
+                KPI_ENGINE.log_report(args.kpi_json, args.topn)
+            if soak is not None:
+                soak.close()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+harmony.db 历史/导出查询基准 + 索引建议
+
+流程：
+- 从 harmony.db 复制表结构（不带数据）到一个基准库
+- 按 --batches 放大生成 tb_FruitInfo / tb_GradeInfo / tb_ExportInfo / tb_FaultInfo / tb_FruitProcessInfo
+- 跑一组与 App 历史页、导出页一致的代表性查询，记录 EXPLAIN QUERY PLAN 与耗时
+- 创建建议的覆盖索引后再跑一遍，输出前后对比
+
+示例：
+  python tools/db_query_bench.py --batches 50000
+  python tools/db_query_bench.py --batches 200000 --report bench.json --emit-sql indexes.sql
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+DEFAULT_SCHEMA_DB = Path(__file__).resolve().parent.parent / "harmony.db"
+BENCH_TABLES = ("tb_FruitInfo", "tb_GradeInfo", "tb_ExportInfo", "tb_FaultInfo", "tb_FruitProcessInfo")
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+# 建议索引：(名称, 建索引SQL)。覆盖 App 实际 where/join/order by 的列
+PROPOSED_INDEXES: List[Tuple[str, str]] = [
+    ("idx_fruitinfo_starttime",
+     'CREATE INDEX IF NOT EXISTS idx_fruitinfo_starttime ON tb_FruitInfo("StartTime", "CustomerID")'),
+    ("idx_fruitinfo_batchno",
+     'CREATE INDEX IF NOT EXISTS idx_fruitinfo_batchno ON tb_FruitInfo("FBatchNo")'),
+    ("idx_gradeinfo_customer",
+     'CREATE INDEX IF NOT EXISTS idx_gradeinfo_customer ON tb_GradeInfo("CustomerID", "FruitNumber", "FruitWeight")'),
+    ("idx_exportinfo_customer",
+     'CREATE INDEX IF NOT EXISTS idx_exportinfo_customer ON tb_ExportInfo("CustomerID", "ExportID", "FruitNumber", "FruitWeight")'),
+    ("idx_faultinfo_begindate",
+     'CREATE INDEX IF NOT EXISTS idx_faultinfo_begindate ON tb_FaultInfo("FBeginDate")'),
+    ("idx_processinfo_runningdate",
+     'CREATE INDEX IF NOT EXISTS idx_processinfo_runningdate ON tb_FruitProcessInfo("RunningDate")'),
+]
+
+
+class BenchQuery:
+    def __init__(self, name: str, sql: str, params: Sequence, note: str) -> None:
+        self.name = name
+        self.sql = sql
+        self.params = tuple(params)
+        self.note = note
+
+
+def copy_schema(schema_db: Path, out_db: Path) -> sqlite3.Connection:
+    src = sqlite3.connect(str(schema_db))
+    rows = src.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='table' AND sql IS NOT NULL"
+    ).fetchall()
+    src.close()
+    ddl = {name: sql for name, sql in rows}
+    missing = [t for t in BENCH_TABLES if t not in ddl]
+    if missing:
+        raise SystemExit(f"schema db missing tables: {missing}")
+
+    if out_db.exists():
+        out_db.unlink()
+    conn = sqlite3.connect(str(out_db))
+    for t in BENCH_TABLES:
+        conn.execute(ddl[t])
+    conn.commit()
+    return conn
+
+
+def populate(conn: sqlite3.Connection, batches: int, grades_per_batch: int, exits_per_batch: int,
+             faults: int, process_rows: int, days: int, seed: int) -> Tuple[datetime, datetime]:
+    rnd = random.Random(seed)
+    end = datetime(2026, 1, 1)
+    begin = end - timedelta(days=days)
+    span_s = int((end - begin).total_seconds())
+    fruits = ["Apple", "Orange", "Pear", "Kiwi", "Mango"]
+
+    fruit_rows = []
+    grade_rows = []
+    export_rows = []
+    # 批次按时间递增（与 App 顺序落库一致），CustomerID 自增
+    for i in range(batches):
+        cid = i + 1
+        st = begin + timedelta(seconds=int(span_s * i / max(1, batches)) + rnd.randint(0, 59))
+        et = st + timedelta(minutes=rnd.randint(20, 240))
+        number = rnd.randint(2000, 90000)
+        weight = number * rnd.randint(120, 260)
+        fruit_rows.append((
+            cid, 1, 0, "0", f"B{st:%Y%m%d}{cid:07d}", f"客户{cid % 997}", f"农场{cid % 131}",
+            fruits[cid % len(fruits)], "Weight", st.strftime(TIME_FMT), et.strftime(TIME_FMT),
+            "1", "1", weight, number, 3, 4, exits_per_batch, 1,
+        ))
+        for g in range(grades_per_batch):
+            n = rnd.randint(0, 5000)
+            grade_rows.append((cid, g, n // 20, n, n * rnd.randint(120, 260), f"Q{g // 4}", f"S{g % 4}"))
+        for e in range(exits_per_batch):
+            n = rnd.randint(0, 8000)
+            export_rows.append((cid, e + 1, n, n * rnd.randint(120, 260), f"出口{e + 1}"))
+
+    conn.executemany(
+        'INSERT INTO tb_FruitInfo ("CustomerID","SysID","MajorCustomerID","ChainIdx","FBatchNo","CustomerName",'
+        '"FarmName","FruitName","SortBaseName","StartTime","EndTime","StartedState","CompletedState",'
+        '"BatchWeight","BatchNumber","QualityGradeSum","WeightOrSizeGradeSum","ExportSum","FVisible") '
+        'VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', fruit_rows)
+    conn.executemany(
+        'INSERT INTO tb_GradeInfo ("CustomerID","GradeID","BoxNumber","FruitNumber","FruitWeight",'
+        '"QualityName","WeightOrSizeName") VALUES (?,?,?,?,?,?,?)', grade_rows)
+    conn.executemany(
+        'INSERT INTO tb_ExportInfo ("CustomerID","ExportID","FruitNumber","FruitWeight","ExitName") '
+        'VALUES (?,?,?,?,?)', export_rows)
+
+    fault_rows = []
+    for i in range(faults):
+        st = begin + timedelta(seconds=rnd.randint(0, span_s))
+        fault_rows.append((rnd.randint(0, 2), f"F{rnd.randint(1, 64):03d}", "故障", "mock", rnd.randint(0, 1),
+                           st.strftime(TIME_FMT), (st + timedelta(minutes=5)).strftime(TIME_FMT)))
+    conn.executemany(
+        'INSERT INTO tb_FaultInfo ("FType","FCode","FName","FMessage","FStatus","FBeginDate","FEndDate") '
+        'VALUES (?,?,?,?,?,?,?)', fault_rows)
+
+    proc_rows = []
+    for i in range(process_rows):
+        ts = begin + timedelta(seconds=int(span_s * i / max(1, process_rows)))
+        proc_rows.append((rnd.uniform(0, 9000), rnd.uniform(0, 100), rnd.uniform(80, 100),
+                          rnd.uniform(30, 100), rnd.uniform(120, 260), ts.strftime(TIME_FMT)))
+    conn.executemany(
+        'INSERT INTO tb_FruitProcessInfo ("RealWeightCount","RealWeightCountPer","SeparationEfficiency",'
+        '"SpeedPercent","AvgWeight","RunningDate") VALUES (?,?,?,?,?,?)', proc_rows)
+    conn.commit()
+    return begin, end
+
+
+def build_queries(conn: sqlite3.Connection, begin: datetime, end: datetime, batches: int, page_size: int,
+                  seed: int) -> List[BenchQuery]:
+    rnd = random.Random(seed + 1)
+    # 取中段 7 天窗口，模拟历史页默认筛选
+    mid = begin + (end - begin) / 2
+    w_from = mid.strftime(TIME_FMT)
+    w_to = (mid + timedelta(days=7)).strftime(TIME_FMT)
+    cid = rnd.randint(1, max(1, batches))
+    row = conn.execute('SELECT "FBatchNo" FROM tb_FruitInfo WHERE "CustomerID" = ?', (cid,)).fetchone()
+    batch_no = row[0] if row else ""
+    return [
+        BenchQuery(
+            "fruitinfo_page_by_date",
+            'SELECT * FROM tb_FruitInfo WHERE "StartTime" BETWEEN ? AND ? '
+            'ORDER BY "CustomerID" DESC LIMIT ? OFFSET ?',
+            (w_from, w_to, page_size, page_size),
+            "FruitInfoService.queryByFilters + 分页",
+        ),
+        BenchQuery(
+            "fruitinfo_by_batchno",
+            'SELECT "CustomerID" FROM tb_FruitInfo WHERE "FBatchNo" = ? LIMIT 1',
+            (batch_no,),
+            "FruitInfoService.upsertByBatchNo",
+        ),
+        BenchQuery(
+            "grade_join_by_date",
+            'SELECT f."CustomerID", SUM(g."FruitNumber"), SUM(g."FruitWeight") FROM tb_FruitInfo f '
+            'JOIN tb_GradeInfo g ON g."CustomerID" = f."CustomerID" '
+            'WHERE f."StartTime" BETWEEN ? AND ? GROUP BY f."CustomerID"',
+            (w_from, w_to),
+            "历史页等级汇总",
+        ),
+        BenchQuery(
+            "export_by_customer",
+            'SELECT "ExportID", "FruitNumber", "FruitWeight" FROM tb_ExportInfo WHERE "CustomerID" = ? '
+            'ORDER BY "ExportID"',
+            (cid,),
+            "导出页出口明细",
+        ),
+        BenchQuery(
+            "export_join_by_date",
+            'SELECT e."ExportID", SUM(e."FruitNumber"), SUM(e."FruitWeight") FROM tb_FruitInfo f '
+            'JOIN tb_ExportInfo e ON e."CustomerID" = f."CustomerID" '
+            'WHERE f."StartTime" BETWEEN ? AND ? GROUP BY e."ExportID"',
+            (w_from, w_to),
+            "出口统计按日期汇总",
+        ),
+        BenchQuery(
+            "fault_by_begindate",
+            'SELECT * FROM tb_FaultInfo WHERE "FBeginDate" BETWEEN ? AND ? ORDER BY "FBeginDate" DESC LIMIT 200',
+            (w_from, w_to),
+            "故障信息按日期筛选",
+        ),
+        BenchQuery(
+            "process_by_runningdate",
+            'SELECT AVG("SeparationEfficiency"), AVG("SpeedPercent"), AVG("AvgWeight") FROM tb_FruitProcessInfo '
+            'WHERE "RunningDate" BETWEEN ? AND ?',
+            (w_from, w_to),
+            "加工曲线按日期",
+        ),
+    ]
+
+
+def explain(conn: sqlite3.Connection, q: BenchQuery) -> List[str]:
+    rows = conn.execute("EXPLAIN QUERY PLAN " + q.sql, q.params).fetchall()
+    return [str(r[-1]) for r in rows]
+
+
+def time_query(conn: sqlite3.Connection, q: BenchQuery, repeat: int) -> Dict[str, float]:
+    samples: List[float] = []
+    rows = 0
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        rows = len(conn.execute(q.sql, q.params).fetchall())
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "rows": rows,
+    }
+
+
+def plan_has_full_scan(plan: List[str]) -> bool:
+    for line in plan:
+        if line.startswith("SCAN ") and "USING" not in line:
+            return True
+    return False
+
+
+def run_pass(conn: sqlite3.Connection, queries: List[BenchQuery], repeat: int) -> Dict[str, Dict]:
+    out: Dict[str, Dict] = {}
+    for q in queries:
+        plan = explain(conn, q)
+        stats = time_query(conn, q, repeat)
+        stats["plan"] = plan
+        stats["full_scan"] = plan_has_full_scan(plan)
+        out[q.name] = stats
+    return out
+
+
+def print_pass(title: str, result: Dict[str, Dict]) -> None:
+    print(f"==== {title} ====")
+    for name, r in result.items():
+        flag = "FULL-SCAN" if r["full_scan"] else "ok"
+        print(f"  {name:<26} median={r['median_ms']:9.3f}ms p95={r['p95_ms']:9.3f}ms rows={r['rows']:<6} [{flag}]")
+        for line in r["plan"]:
+            print(f"      plan: {line}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="harmony.db 代表性查询基准与索引建议")
+    ap.add_argument("--schema-db", default=str(DEFAULT_SCHEMA_DB), help="读取表结构的库（默认仓库内 harmony.db）")
+    ap.add_argument("--db", default="", help="基准库输出路径（默认临时目录，跑完删除）")
+    ap.add_argument("--batches", type=int, default=20000, help="tb_FruitInfo 批次数")
+    ap.add_argument("--grades", type=int, default=12, help="每批次 tb_GradeInfo 行数")
+    ap.add_argument("--exits", type=int, default=8, help="每批次 tb_ExportInfo 行数")
+    ap.add_argument("--faults", type=int, default=50000, help="tb_FaultInfo 行数")
+    ap.add_argument("--process-rows", type=int, default=200000, help="tb_FruitProcessInfo 行数")
+    ap.add_argument("--days", type=int, default=365, help="数据覆盖天数")
+    ap.add_argument("--page-size", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=7, help="每条查询重复次数")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--report", default="", help="JSON 报告输出路径")
+    ap.add_argument("--emit-sql", default="", help="把建议索引 DDL 写到文件")
+    args = ap.parse_args()
+
+    keep_db = bool(args.db)
+    db_path = Path(args.db) if keep_db else Path(tempfile.mkdtemp()) / "harmony_bench.db"
+    conn = copy_schema(Path(args.schema_db), db_path)
+
+    t0 = time.perf_counter()
+    begin, end = populate(conn, args.batches, args.grades, args.exits, args.faults,
+                          args.process_rows, args.days, args.seed)
+    print(f"[POPULATE] batches={args.batches} grades={args.batches * args.grades} "
+          f"exports={args.batches * args.exits} faults={args.faults} process={args.process_rows} "
+          f"in {time.perf_counter() - t0:.2f}s -> {db_path}")
+
+    queries = build_queries(conn, begin, end, args.batches, args.page_size, args.seed)
+    before = run_pass(conn, queries, args.repeat)
+    print_pass("BEFORE (no index)", before)
+
+    t0 = time.perf_counter()
+    for _, ddl in PROPOSED_INDEXES:
+        conn.execute(ddl)
+    conn.execute("ANALYZE")
+    conn.commit()
+    print(f"[INDEX] created {len(PROPOSED_INDEXES)} indexes in {time.perf_counter() - t0:.2f}s")
+
+    after = run_pass(conn, queries, args.repeat)
+    print_pass("AFTER (proposed indexes)", after)
+
+    print("==== SPEEDUP ====")
+    for q in queries:
+        b = before[q.name]["median_ms"]
+        a = after[q.name]["median_ms"]
+        ratio = b / a if a > 0 else float("inf")
+        print(f"  {q.name:<26} {b:9.3f}ms -> {a:9.3f}ms  x{ratio:7.1f}  ({q.note})")
+
+    print("==== PROPOSED INDEXES ====")
+    for _, ddl in PROPOSED_INDEXES:
+        print(f"  {ddl};")
+
+    if args.emit_sql:
+        Path(args.emit_sql).write_text("".join(f"{ddl};\n" for _, ddl in PROPOSED_INDEXES), encoding="utf-8")
+        print(f"[SQL] -> {args.emit_sql}")
+
+    if args.report:
+        report = {
+            "params": vars(args),
+            "indexes": [ddl for _, ddl in PROPOSED_INDEXES],
+            "queries": {q.name: {"sql": q.sql, "note": q.note,
+                                 "before": before[q.name], "after": after[q.name]} for q in queries},
+        }
+        Path(args.report).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[REPORT] -> {args.report}")
+
+    conn.close()
+    if not keep_db:
+        try:
+            os.remove(db_path)
+            os.rmdir(db_path.parent)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
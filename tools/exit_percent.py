@@ -0,0 +1,15 @@
+"""
+出口占比规则：mock_device.py 的模拟统计/KPI 与 qt_stream_tool.py analyze/follow 共用，
+保证两边对同一帧算出相同的占比（与 App 一致：有重量按重量占比，否则按数量占比）
+"""
+from typing import List, Sequence, Tuple
+
+
+def calc_exit_percent(exit_counts: Sequence[float], exit_weight_counts: Sequence[float]) -> Tuple[bool, List[float]]:
+    total_weight = sum(exit_weight_counts)
+    use_weight = total_weight > 0
+    values = exit_weight_counts if use_weight else exit_counts
+    base = total_weight if use_weight else sum(exit_counts)
+    if base <= 0:
+        return use_weight, [0.0] * len(values)
+    return use_weight, [round(v * 100.0 / base, 2) for v in values]
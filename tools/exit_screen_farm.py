@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+出口屏广播接收农场（SERVICE_HMI_*）：单个 asyncio 进程模拟最多 48 块出口屏
+
+出口屏消费 SERVICE_HMI_EXITSTATE / REFRESHSPEC / LABELERINFO / PACKINGINFO。App 侧广播链路尚未接通，
+这里先约定测试用帧格式：
+  SYNC + src u32 + dst u32（出口号，组播为 0xFFFF）+ cmd u32 + bodyLen u32 + body
+  body 以 16 字节探针开头：magic "XSCR" + seq u32 + sendTimeNs u64（CLOCK_REALTIME），其余为填充
+  不带探针的帧也会记录到达时间，只是不参与时延统计
+
+传输方式：
+  tcp   每块屏监听 base_port + (出口号-1)，主机逐屏单播（N 次发送）
+  udp   同上，UDP 单播
+  mcast 所有屏加入同一组播组/端口，主机一次发送
+
+子命令：
+  farm   启动接收农场，记录每屏到达时间，输出端到端时延与扇出时差（同一 seq 最早/最晚到达之差）
+  drive  模拟主机广播端，按 --rate-hz 轮流发送四种命令，统计主机 CPU 开销
+  bench  扫描出口数 × 更新频率，子进程起农场、本进程驱动，输出对照表
+
+示例：
+  python tools/exit_screen_farm.py farm --exits 48 --transport tcp --record arrivals.csv
+  python tools/exit_screen_farm.py drive --exits 48 --transport tcp --rate-hz 20 --duration 10
+  python tools/exit_screen_farm.py bench --exits 8,16,32,48 --rates 5,20,50 --transport tcp
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import struct
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+SYNC = b"SYNC"
+HC_ID = 0x1000
+MAX_EXIT_NUM = 48
+MCAST_DST = 0xFFFF
+
+SERVICE_HMI_EXITSTATE = 0x2002
+SERVICE_HMI_REFRESHSPEC = 0x2003
+SERVICE_HMI_LABELERINFO = 0x2004
+SERVICE_HMI_PACKINGINFO = 0x2005
+SCREEN_CMDS = {
+    SERVICE_HMI_EXITSTATE: "EXITSTATE",
+    SERVICE_HMI_REFRESHSPEC: "REFRESHSPEC",
+    SERVICE_HMI_LABELERINFO: "LABELERINFO",
+    SERVICE_HMI_PACKINGINFO: "PACKINGINFO",
+}
+
+FRAME_HEAD = struct.Struct("<4sIIII")  # sync, src, dst, cmd, bodyLen
+PROBE = struct.Struct("<4sIQ")         # magic, seq, sendTimeNs
+PROBE_MAGIC = b"XSCR"
+
+
+def percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(len(sorted_vals) * q))]
+
+
+# ==================== 接收农场 ====================
+class Farm:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.exits = max(1, min(MAX_EXIT_NUM, args.exits))
+        self.frames = [0] * (self.exits + 1)
+        self.by_cmd: Dict[int, int] = {}
+        self.latency_ms: Dict[int, List[float]] = {}
+        # seq -> [cmd, 最早到达 ns, 最晚到达 ns, 到达屏数]
+        self.pending: Dict[int, List[int]] = {}
+        self.spread_ms: List[float] = []
+        self.complete = 0
+        self.incomplete = 0
+        self.records: List[Tuple[int, int, int, int]] = []
+        self.first_ns = 0
+        self.last_ns = 0
+        self.cpu0 = time.process_time()
+        self.t0 = time.perf_counter()
+
+    def on_frame(self, exit_no: int, cmd: int, body: bytes) -> None:
+        t_ns = time.time_ns()
+        if not self.first_ns:
+            self.first_ns = t_ns
+        self.last_ns = t_ns
+        self.frames[exit_no] += 1
+        self.by_cmd[cmd] = self.by_cmd.get(cmd, 0) + 1
+        seq = -1
+        if len(body) >= PROBE.size:
+            magic, seq, send_ns = PROBE.unpack_from(body, 0)
+            if magic == PROBE_MAGIC:
+                self.latency_ms.setdefault(cmd, []).append((t_ns - send_ns) / 1e6)
+                slot = self.pending.get(seq)
+                if slot is None:
+                    self.pending[seq] = [cmd, t_ns, t_ns, 1]
+                else:
+                    slot[2] = t_ns
+                    slot[3] += 1
+                    if slot[3] == self.exits:
+                        self._close(seq)
+            else:
+                seq = -1
+        if self.args.record:
+            self.records.append((exit_no, cmd, seq, t_ns))
+
+    def _close(self, seq: int) -> None:
+        cmd, first, last, n = self.pending.pop(seq)
+        if n >= self.exits:
+            self.complete += 1
+            self.spread_ms.append((last - first) / 1e6)
+        else:
+            self.incomplete += 1
+
+    def flush(self, older_than_ns: int = 0) -> None:
+        now = time.time_ns()
+        for seq in [s for s, v in self.pending.items() if now - v[2] >= older_than_ns]:
+            self._close(seq)
+
+    def summary(self) -> dict:
+        self.flush()
+        all_lat = sorted(v for vals in self.latency_ms.values() for v in vals)
+        spread = sorted(self.spread_ms)
+        elapsed = time.perf_counter() - self.t0
+        total = sum(self.frames)
+        return {
+            "exits": self.exits,
+            "frames": total,
+            "broadcasts_complete": self.complete,
+            "broadcasts_incomplete": self.incomplete,
+            "e2e_p50_ms": percentile(all_lat, 0.50),
+            "e2e_p99_ms": percentile(all_lat, 0.99),
+            "e2e_max_ms": all_lat[-1] if all_lat else 0.0,
+            "spread_p50_ms": percentile(spread, 0.50),
+            "spread_p99_ms": percentile(spread, 0.99),
+            "farm_cpu_pct": (time.process_time() - self.cpu0) * 100.0 / max(1e-9, elapsed),
+            "per_cmd": {SCREEN_CMDS.get(c, hex(c)): n for c, n in sorted(self.by_cmd.items())},
+            "per_screen_min": min(self.frames[1:]),
+            "per_screen_max": max(self.frames[1:]),
+        }
+
+    def log_report(self) -> None:
+        s = self.summary()
+        print(f"[FARM] frames={s['frames']} complete={s['broadcasts_complete']} incomplete={s['broadcasts_incomplete']} "
+              f"e2e p50/p99={s['e2e_p50_ms']:.3f}/{s['e2e_p99_ms']:.3f}ms "
+              f"spread p50/p99={s['spread_p50_ms']:.3f}/{s['spread_p99_ms']:.3f}ms "
+              f"screen frames min/max={s['per_screen_min']}/{s['per_screen_max']} cpu={s['farm_cpu_pct']:.1f}%",
+              flush=True)
+
+    def write_records(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("exit,cmd,seq,arrival_ns\n")
+            for exit_no, cmd, seq, t_ns in self.records:
+                f.write(f"{exit_no},0x{cmd:04X},{seq},{t_ns}\n")
+
+
+class ScreenStream(asyncio.Protocol):
+    """TCP 出口屏：按 FRAME_HEAD.bodyLen 拆包"""
+
+    def __init__(self, farm: Farm, exit_no: int) -> None:
+        self.farm = farm
+        self.exit_no = exit_no
+        self.buf = bytearray()
+
+    def data_received(self, data: bytes) -> None:
+        buf = self.buf
+        buf += data
+        off = 0
+        while len(buf) - off >= FRAME_HEAD.size:
+            sync, _src, _dst, cmd, n = FRAME_HEAD.unpack_from(buf, off)
+            if sync != SYNC:
+                # 失步：丢到下一个 SYNC
+                nxt = buf.find(SYNC, off + 1)
+                off = len(buf) if nxt < 0 else nxt
+                continue
+            end = off + FRAME_HEAD.size + n
+            if end > len(buf):
+                break
+            self.farm.on_frame(self.exit_no, cmd, bytes(buf[off + FRAME_HEAD.size:end]))
+            off = end
+        del buf[:off]
+
+
+class ScreenDatagram(asyncio.DatagramProtocol):
+    def __init__(self, farm: Farm, exit_no: int) -> None:
+        self.farm = farm
+        self.exit_no = exit_no
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if len(data) < FRAME_HEAD.size:
+            return
+        sync, _src, _dst, cmd, n = FRAME_HEAD.unpack_from(data, 0)
+        if sync == SYNC:
+            self.farm.on_frame(self.exit_no, cmd, data[FRAME_HEAD.size:FRAME_HEAD.size + n])
+
+
+def mcast_socket(group: str, port: int, iface: str) -> socket.socket:
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    s.bind(("", port))
+    mreq = socket.inet_aton(group) + socket.inet_aton(iface)
+    s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    return s
+
+
+async def run_farm_async(farm: Farm) -> None:
+    args = farm.args
+    loop = asyncio.get_running_loop()
+    closers = []
+    for exit_no in range(1, farm.exits + 1):
+        port = args.base_port + exit_no - 1
+        if args.transport == "tcp":
+            srv = await loop.create_server(lambda e=exit_no: ScreenStream(farm, e), args.bind, port, reuse_address=True)
+            closers.append(srv.close)
+        elif args.transport == "udp":
+            tr, _ = await loop.create_datagram_endpoint(lambda e=exit_no: ScreenDatagram(farm, e),
+                                                        local_addr=(args.bind, port))
+            closers.append(tr.close)
+        else:
+            sock = mcast_socket(args.group, args.base_port, args.iface)
+            tr, _ = await loop.create_datagram_endpoint(lambda e=exit_no: ScreenDatagram(farm, e), sock=sock)
+            closers.append(tr.close)
+    print(f"[FARM] ready exits={farm.exits} transport={args.transport} base_port={args.base_port}", flush=True)
+
+    t_start = time.perf_counter()
+    last_report = t_start
+    try:
+        while True:
+            await asyncio.sleep(0.2)
+            now = time.perf_counter()
+            farm.flush(older_than_ns=int(args.settle_s * 1e9))
+            if args.report_s > 0 and now - last_report >= args.report_s:
+                farm.log_report()
+                last_report = now
+            if args.duration > 0 and now - t_start >= args.duration:
+                break
+            if args.idle_exit_s > 0 and farm.last_ns and time.time_ns() - farm.last_ns > args.idle_exit_s * 1e9:
+                break
+    finally:
+        for close in closers:
+            close()
+
+
+def cmd_farm(args: argparse.Namespace) -> None:
+    # Farm 在事件循环外创建：Ctrl+C（默认 --duration 0 时的正常停止方式）之后照常汇总、落盘
+    farm = Farm(args)
+    try:
+        asyncio.run(run_farm_async(farm))
+    except KeyboardInterrupt:
+        pass
+    farm.log_report()
+    if args.record:
+        farm.write_records(args.record)
+        print(f"[FARM] arrivals -> {args.record} ({len(farm.records)} rows)")
+    if args.summary_json:
+        print("FARM_SUMMARY " + json.dumps(farm.summary()), flush=True)
+
+
+# ==================== 主机广播端 ====================
+def parse_body_sizes(text: str) -> Dict[int, int]:
+    sizes = {SERVICE_HMI_EXITSTATE: 64, SERVICE_HMI_REFRESHSPEC: 256,
+             SERVICE_HMI_LABELERINFO: 128, SERVICE_HMI_PACKINGINFO: 256}
+    names = {v: k for k, v in SCREEN_CMDS.items()}
+    for part in (text or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            sizes[names[k.strip().upper()]] = max(PROBE.size, int(v))
+    return sizes
+
+
+def sendmsg_all(s: socket.socket, parts: List[memoryview]) -> None:
+    # 带超时的 socket 上 sendmsg 可能只发出一部分，按已发字节推进直到全部发完
+    while parts:
+        sent = s.sendmsg(parts)
+        while parts and sent >= len(parts[0]):
+            sent -= len(parts[0])
+            parts.pop(0)
+        if parts and sent:
+            parts[0] = parts[0][sent:]
+
+
+def drive(args: argparse.Namespace) -> dict:
+    exits = max(1, min(MAX_EXIT_NUM, args.exits))
+    sizes = parse_body_sizes(args.body_bytes)
+    cmds = list(sizes)
+    bodies = {cmd: bytearray(sizes[cmd]) for cmd in cmds}
+    if args.transport == "tcp":
+        socks = []
+        for exit_no in range(1, exits + 1):
+            s = socket.create_connection((args.host, args.base_port + exit_no - 1), timeout=5)
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            socks.append(s)
+    else:
+        usock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if args.transport == "mcast":
+            usock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+            usock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            usock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(args.iface))
+    # 各屏帧头预先打包（dst 不同），发送时只改 body 探针
+    heads = {cmd: [FRAME_HEAD.pack(SYNC, HC_ID, e, cmd, sizes[cmd]) for e in range(1, exits + 1)] for cmd in cmds}
+    mcast_heads = {cmd: FRAME_HEAD.pack(SYNC, HC_ID, MCAST_DST, cmd, sizes[cmd]) for cmd in cmds}
+
+    period = 1.0 / max(0.1, args.rate_hz)
+    rounds = max(1, int(args.duration * args.rate_hz))
+    send_us: List[float] = []
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    next_t = t0
+    for seq in range(rounds):
+        cmd = cmds[seq % len(cmds)]
+        body = bodies[cmd]
+        s0 = time.perf_counter()
+        PROBE.pack_into(body, 0, PROBE_MAGIC, seq, time.time_ns())
+        if args.transport == "tcp":
+            for s, head in zip(socks, heads[cmd]):
+                sendmsg_all(s, [memoryview(head), memoryview(body)])
+        elif args.transport == "udp":
+            for i, head in enumerate(heads[cmd]):
+                usock.sendmsg([head, body], [], 0, (args.host, args.base_port + i))
+        else:
+            usock.sendmsg([mcast_heads[cmd], body], [], 0, (args.group, args.base_port))
+        send_us.append((time.perf_counter() - s0) * 1e6)
+        next_t += period
+        delay = next_t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    if args.transport == "tcp":
+        for s in socks:
+            s.close()
+    else:
+        usock.close()
+    send_us.sort()
+    return {
+        "exits": exits,
+        "rate_hz": args.rate_hz,
+        "broadcasts": rounds,
+        "achieved_hz": rounds / elapsed,
+        "host_cpu_pct": cpu * 100.0 / max(1e-9, elapsed),
+        "host_cpu_us_per_broadcast": cpu * 1e6 / rounds,
+        "send_p50_us": percentile(send_us, 0.50),
+        "send_p99_us": percentile(send_us, 0.99),
+    }
+
+
+def cmd_drive(args: argparse.Namespace) -> None:
+    r = drive(args)
+    print(f"[DRIVE] exits={r['exits']} transport={args.transport} broadcasts={r['broadcasts']} "
+          f"rate={r['achieved_hz']:.1f}Hz host_cpu={r['host_cpu_pct']:.1f}% "
+          f"({r['host_cpu_us_per_broadcast']:.1f}us/broadcast) fan-out send p50/p99="
+          f"{r['send_p50_us']:.1f}/{r['send_p99_us']:.1f}us")
+
+
+# ==================== 扫描对照 ====================
+def cmd_bench(args: argparse.Namespace) -> None:
+    exit_list = [int(x) for x in args.exits.split(",") if x.strip()]
+    rate_list = [float(x) for x in args.rates.split(",") if x.strip()]
+    rows = []
+    for exits in exit_list:
+        for rate in rate_list:
+            farm_cmd = [sys.executable, __file__, "farm", "--exits", str(exits), "--transport", args.transport,
+                        "--base-port", str(args.base_port), "--group", args.group, "--iface", args.iface,
+                        "--idle-exit-s", "1", "--report-s", "0", "--summary-json"]
+            proc = subprocess.Popen(farm_cmd, stdout=subprocess.PIPE, text=True)
+            ready = proc.stdout.readline()
+            if "ready" not in ready:
+                proc.kill()
+                raise SystemExit(f"farm failed to start: {ready!r}")
+            ns = argparse.Namespace(exits=exits, transport=args.transport, host=args.host, base_port=args.base_port,
+                                    group=args.group, iface=args.iface, rate_hz=rate, duration=args.duration,
+                                    body_bytes=args.body_bytes)
+            d = drive(ns)
+            out, _ = proc.communicate(timeout=30)
+            farm = {}
+            for line in out.splitlines():
+                if line.startswith("FARM_SUMMARY "):
+                    farm = json.loads(line[len("FARM_SUMMARY "):])
+            delivered = farm.get("frames", 0) * 100.0 / max(1, d["broadcasts"] * exits)
+            rows.append((exits, rate, d, farm, delivered))
+            print(f"[BENCH] exits={exits:2d} rate={rate:6.1f}Hz host_cpu={d['host_cpu_pct']:5.1f}% "
+                  f"{d['host_cpu_us_per_broadcast']:7.1f}us/bc send_p99={d['send_p99_us']:7.1f}us "
+                  f"e2e p50/p99={farm.get('e2e_p50_ms', 0):.3f}/{farm.get('e2e_p99_ms', 0):.3f}ms "
+                  f"spread p50/p99={farm.get('spread_p50_ms', 0):.3f}/{farm.get('spread_p99_ms', 0):.3f}ms "
+                  f"delivered={delivered:.1f}% farm_cpu={farm.get('farm_cpu_pct', 0):.1f}%", flush=True)
+
+
+def add_common(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--transport", choices=["tcp", "udp", "mcast"], default="tcp", help="广播方式")
+    p.add_argument("--base-port", type=int, default=21000, help="出口 1 的端口（出口 n 为 base+n-1；组播共用 base）")
+    p.add_argument("--group", default="239.0.20.2", help="组播组地址（mcast）")
+    p.add_argument("--iface", default="127.0.0.1", help="组播收发接口地址")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="出口屏广播接收农场（SERVICE_HMI_*）与扇出时延/CPU 测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("farm", help="启动 N 块出口屏接收端")
+    add_common(p)
+    p.add_argument("--exits", type=int, default=MAX_EXIT_NUM, help="出口屏数量（<=48）")
+    p.add_argument("--bind", default="127.0.0.1")
+    p.add_argument("--duration", type=float, default=0.0, help="运行秒数（0=一直运行）")
+    p.add_argument("--idle-exit-s", type=float, default=0.0, help="收到数据后空闲 N 秒自动退出")
+    p.add_argument("--settle-s", type=float, default=1.0, help="同一 seq 等待其余屏到达的时间")
+    p.add_argument("--report-s", type=float, default=2.0, help="周期报告间隔（0=不报告）")
+    p.add_argument("--record", default="", help="逐屏到达时间 CSV 输出")
+    p.add_argument("--summary-json", action="store_true", help="退出时输出 FARM_SUMMARY JSON 行")
+    p.set_defaults(func=cmd_farm)
+
+    p = sub.add_parser("drive", help="模拟主机向出口屏广播")
+    add_common(p)
+    p.add_argument("--exits", type=int, default=MAX_EXIT_NUM)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--rate-hz", type=float, default=10.0, help="每秒广播次数（四种命令轮流）")
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--body-bytes", default="", help="各命令包体大小，如 EXITSTATE=64,PACKINGINFO=512")
+    p.set_defaults(func=cmd_drive)
+
+    p = sub.add_parser("bench", help="扫描出口数 × 更新频率")
+    add_common(p)
+    p.add_argument("--exits", default="8,16,32,48", help="出口数列表")
+    p.add_argument("--rates", default="5,20,50", help="更新频率列表（Hz）")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--duration", type=float, default=5.0, help="每组驱动秒数")
+    p.add_argument("--body-bytes", default="")
+    p.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
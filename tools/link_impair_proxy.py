@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+用户态链路劣化代理：放在 mock_device 与接收端（App / 出口屏）之间，模拟工业以太网 + 廉价交换机
+
+环境里不一定能用 tc/netem，这里在本机用 asyncio 转发 TCP/UDP，并按方向注入：
+  - 时延分布：const / uniform / normal / pareto（长尾），--delay-ms 为基准，--jitter-ms 为离散度
+  - 带宽上限：每个映射每个方向一条串行链路（令牌桶按字节排队），--bandwidth-kbps
+  - 停顿：每个数据块以 --stall-prob 概率额外停 --stall-ms（TCP 保序，后续数据一起被堵住）
+  - UDP 丢包 / 乱序：--loss，--reorder 概率把数据报多压 --reorder-ms，让后发的先到；
+    其余数据报按到达顺序 FIFO 释放（抖动不会自行造成乱序）
+  - TCP 复位：每条连接以 --reset-prob 概率在转发随机字节数（<= --reset-max-bytes）后发 RST
+时延在读到数据时采样，TCP 方向内按 FIFO 释放（不早于前一块），与真实链路一致
+
+映射：--map PROTO:LISTEN_PORT:TARGET_HOST:TARGET_PORT，可重复
+统计：每条连接（UDP 按客户端地址成会话）记录上下行字节、块数、排队时延、吞吐、是否被复位；
+     连接结束打印一行，退出时输出汇总，--stats-json 写出全部连接
+
+示例：
+  # App TCP 服务在 1279，mock_device 改发往 11279
+  python tools/link_impair_proxy.py --map tcp:11279:127.0.0.1:1279 --delay-ms 5 --jitter-ms 3 --dist pareto \\
+      --bandwidth-kbps 2000 --reset-prob 0.01
+  # 出口屏 UDP：丢包 + 乱序
+  python tools/link_impair_proxy.py --map udp:20999:127.0.0.1:21000 --loss 0.02 --reorder 0.05 --reorder-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import struct
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+RESET = object()  # 发送队列中的复位标记：不发 FIN，由连接处理方直接 RST
+
+
+class Impairment:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.rng = random.Random(args.seed)
+
+    def delay_s(self) -> float:
+        a = self.args
+        base = a.delay_ms
+        jitter = a.jitter_ms
+        if a.dist == "uniform":
+            ms = base + self.rng.uniform(-jitter, jitter)
+        elif a.dist == "normal":
+            ms = self.rng.gauss(base, jitter)
+        elif a.dist == "pareto":
+            # 多数落在基准附近，少量长尾
+            ms = base + jitter * (self.rng.paretovariate(a.pareto_alpha) - 1.0)
+        else:
+            ms = base
+        if a.stall_prob > 0 and self.rng.random() < a.stall_prob:
+            ms += a.stall_ms
+        return max(0.0, ms) / 1000.0
+
+    def drop(self) -> bool:
+        return self.args.loss > 0 and self.rng.random() < self.args.loss
+
+    def reorder_s(self) -> float:
+        if self.args.reorder > 0 and self.rng.random() < self.args.reorder:
+            return self.args.reorder_ms / 1000.0
+        return 0.0
+
+    def reset_after(self) -> int:
+        """本连接在转发多少字节后复位；-1 表示不复位。"""
+        if self.args.reset_prob > 0 and self.rng.random() < self.args.reset_prob:
+            return self.rng.randint(0, max(0, self.args.reset_max_bytes))
+        return -1
+
+
+class Shaper:
+    """一个方向的串行链路：按字节数排队，返回该块发完的时刻。"""
+
+    def __init__(self, kbps: float) -> None:
+        self.bytes_per_s = kbps * 1000.0 / 8.0 if kbps > 0 else 0.0
+        self.next_free = 0.0
+
+    def schedule(self, now: float, nbytes: int) -> float:
+        if self.bytes_per_s <= 0:
+            return now
+        start = max(now, self.next_free)
+        self.next_free = start + nbytes / self.bytes_per_s
+        return self.next_free
+
+
+class ConnStats:
+    def __init__(self, cid: int, proto: str, peer: str, listen_port: int) -> None:
+        self.cid = cid
+        self.proto = proto
+        self.peer = peer
+        self.listen_port = listen_port
+        self.t0 = time.monotonic()
+        self.t1 = 0.0
+        self.last_seen = self.t0
+        self.bytes = [0, 0]   # 上行（客户端->目标）、下行
+        self.chunks = [0, 0]
+        self.dropped = 0
+        self.reordered = 0
+        self.queued_s = 0.0
+        self.queued_max_s = 0.0
+        self.reset = False
+        self.error = ""
+
+    def queued(self, d: float) -> None:
+        self.last_seen = time.monotonic()
+        self.queued_s += d
+        if d > self.queued_max_s:
+            self.queued_max_s = d
+
+    def summary(self) -> dict:
+        dur = max(1e-9, (self.t1 or time.monotonic()) - self.t0)
+        n = max(1, self.chunks[0] + self.chunks[1])
+        return {
+            "id": self.cid, "proto": self.proto, "peer": self.peer, "listen_port": self.listen_port,
+            "duration_s": round(dur, 4), "bytes_up": self.bytes[0], "bytes_down": self.bytes[1],
+            "chunks_up": self.chunks[0], "chunks_down": self.chunks[1],
+            "kbps_up": round(self.bytes[0] * 8 / 1000.0 / dur, 1), "kbps_down": round(self.bytes[1] * 8 / 1000.0 / dur, 1),
+            "queue_avg_ms": round(self.queued_s / n * 1000.0, 3), "queue_max_ms": round(self.queued_max_s * 1000.0, 3),
+            "dropped": self.dropped, "reordered": self.reordered, "reset": self.reset, "error": self.error,
+        }
+
+
+class UdpLane:
+    """一个方向的 FIFO 发送队列：释放时刻不早于前一个数据报，保证未选中乱序的数据报按到达顺序送出。"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, send: Callable[[bytes], None]) -> None:
+        self.loop = loop
+        self.send = send
+        self.queue: "deque[Tuple[float, bytes]]" = deque()
+        self.last_at = 0.0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def push(self, at: float, data: bytes) -> None:
+        at = max(at, self.last_at)
+        self.last_at = at
+        self.queue.append((at, data))
+        if self.timer is None:
+            self.timer = self.loop.call_at(at, self._drain)
+
+    def _drain(self) -> None:
+        self.timer = None
+        now = self.loop.time()
+        q = self.queue
+        while q and q[0][0] <= now:
+            self.send(q.popleft()[1])
+        if q:
+            self.timer = self.loop.call_at(q[0][0], self._drain)
+
+    def cancel(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.queue.clear()
+
+
+class UdpSession:
+    """一个客户端地址一个会话：lanes[0] 发往目标（上行），lanes[1] 回给客户端（下行）。"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, st: ConnStats, front: asyncio.DatagramTransport,
+                 client: Tuple[str, int]) -> None:
+        self.st = st
+        self.up: Optional[asyncio.DatagramTransport] = None
+        self.backlog: List[bytes] = []
+        self.lanes = (UdpLane(loop, self._send_up), UdpLane(loop, lambda d: self._send_down(front, client, d)))
+
+    def attach(self, up: asyncio.DatagramTransport) -> None:
+        self.up = up
+
+    def _send_up(self, data: bytes) -> None:
+        if self.up is not None and not self.up.is_closing():
+            self.up.sendto(data)
+
+    @staticmethod
+    def _send_down(front: asyncio.DatagramTransport, client: Tuple[str, int], data: bytes) -> None:
+        if not front.is_closing():
+            front.sendto(data, client)
+
+    def close(self) -> None:
+        for lane in self.lanes:
+            lane.cancel()
+        if self.up is not None:
+            self.up.close()
+
+
+class Proxy:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.imp = Impairment(args)
+        self.conns: List[ConnStats] = []
+        self.next_id = 1
+        self.udp_sessions: List[dict] = []
+
+    def new_stats(self, proto: str, peer: str, listen_port: int) -> ConnStats:
+        st = ConnStats(self.next_id, proto, peer, listen_port)
+        self.next_id += 1
+        self.conns.append(st)
+        return st
+
+    def closed(self, st: ConnStats) -> None:
+        st.t1 = time.monotonic()
+        if self.args.quiet:
+            return
+        s = st.summary()
+        flag = " RESET" if st.reset else (f" error={st.error}" if st.error else "")
+        print(f"[PROXY] #{s['id']} {s['proto']} {s['peer']} -> :{s['listen_port']} {s['duration_s']:.3f}s "
+              f"up={s['bytes_up']}B/{s['chunks_up']} down={s['bytes_down']}B/{s['chunks_down']} "
+              f"{s['kbps_up']:.1f}/{s['kbps_down']:.1f}kbps queue avg/max={s['queue_avg_ms']:.2f}/{s['queue_max_ms']:.2f}ms"
+              f"{flag}", flush=True)
+
+    # ---------- TCP ----------
+    async def serve_tcp(self, listen_port: int, target: Tuple[str, int]) -> asyncio.AbstractServer:
+        shapers = (Shaper(self.args.bandwidth_kbps), Shaper(self.args.bandwidth_kbps))
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            peer = "%s:%d" % writer.get_extra_info("peername")[:2]
+            st = self.new_stats("tcp", peer, listen_port)
+            try:
+                up_reader, up_writer = await asyncio.open_connection(*target)
+            except OSError as e:
+                st.error = str(e)
+                hard_close(writer)
+                self.closed(st)
+                return
+            reset_at = self.imp.reset_after()
+            pumps = [
+                asyncio.create_task(self.pump(reader, up_writer, st, 0, shapers[0], reset_at)),
+                asyncio.create_task(self.pump(up_reader, writer, st, 1, shapers[1], -1)),
+            ]
+            done, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+            if st.reset or any(t.exception() for t in done):
+                for t in pending:
+                    t.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                hard_close(writer)
+                hard_close(up_writer)
+            else:
+                await asyncio.gather(*pending, return_exceptions=True)
+                writer.close()
+                up_writer.close()
+            for t in pumps:
+                if not t.cancelled() and t.exception() and not st.error:
+                    st.error = repr(t.exception())
+            self.closed(st)
+
+        return await asyncio.start_server(handle, self.args.bind, listen_port, reuse_address=True)
+
+    async def pump(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, st: ConnStats,
+                   direction: int, shaper: Shaper, reset_at: int) -> None:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.args.queue_chunks)
+
+        async def release() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    if writer.can_write_eof():
+                        writer.write_eof()
+                    return
+                if item is RESET:
+                    return
+                at, data = item
+                delay = at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+
+        sender = asyncio.create_task(release())
+        last = 0.0
+        try:
+            while True:
+                data = await reader.read(self.args.read_bytes)
+                if not data:
+                    break
+                if reset_at >= 0 and st.bytes[direction] + len(data) > reset_at:
+                    # 已排队的部分照常送达，随后两端都收到 RST
+                    keep = reset_at - st.bytes[direction]
+                    if keep > 0:
+                        await queue.put((max(last, loop.time()), data[:keep]))
+                        st.bytes[direction] += keep
+                        st.chunks[direction] += 1
+                    st.reset = True
+                    await queue.put(RESET)
+                    await sender
+                    return
+                now = loop.time()
+                # 先按带宽排队发完，再叠加传播时延；TCP 不乱序，不早于上一块
+                at = max(last, shaper.schedule(now, len(data)) + self.imp.delay_s())
+                last = at
+                st.queued(at - now)
+                st.bytes[direction] += len(data)
+                st.chunks[direction] += 1
+                await queue.put((at, data))
+            await queue.put(None)
+            await sender
+        finally:
+            if not sender.done():
+                sender.cancel()
+
+    # ---------- UDP ----------
+    async def serve_udp(self, listen_port: int, target: Tuple[str, int]) -> asyncio.DatagramTransport:
+        loop = asyncio.get_running_loop()
+        proxy = self
+        shapers = (Shaper(self.args.bandwidth_kbps), Shaper(self.args.bandwidth_kbps))
+        sessions: Dict[Tuple[str, int], UdpSession] = {}
+
+        def forward(sess: "UdpSession", data: bytes, direction: int) -> None:
+            st = sess.st
+            if proxy.imp.drop():
+                st.dropped += 1
+                return
+            now = loop.time()
+            at = shapers[direction].schedule(now, len(data)) + proxy.imp.delay_s()
+            extra = proxy.imp.reorder_s()
+            st.bytes[direction] += len(data)
+            st.chunks[direction] += 1
+            lane = sess.lanes[direction]
+            if extra:
+                # 只有被选中乱序的数据报单独排期，越过后面的数据报
+                st.reordered += 1
+                st.queued(at + extra - now)
+                loop.call_at(at + extra, lane.send, data)
+            else:
+                st.queued(max(at, lane.last_at) - now)
+                lane.push(at, data)
+
+        class Upstream(asyncio.DatagramProtocol):
+            def __init__(self, sess: "UdpSession") -> None:
+                self.sess = sess
+
+            def datagram_received(self, data: bytes, addr) -> None:
+                forward(self.sess, data, 1)
+
+        class Front(asyncio.DatagramProtocol):
+            def datagram_received(self, data: bytes, addr) -> None:
+                sess = sessions.get(addr)
+                if sess is None:
+                    # 同步登记会话，端点建立前到达的数据报按序暂存
+                    st = proxy.new_stats("udp", "%s:%d" % addr[:2], listen_port)
+                    sess = sessions[addr] = UdpSession(loop, st, front, addr)
+                    loop.create_task(self.open_session(sess))
+                if sess.up is None:
+                    sess.backlog.append(data)
+                    return
+                forward(sess, data, 0)
+
+            async def open_session(self, sess: "UdpSession") -> None:
+                try:
+                    up, _ = await loop.create_datagram_endpoint(lambda: Upstream(sess), remote_addr=target)
+                except OSError as e:
+                    sess.st.error = str(e)
+                    sess.backlog.clear()
+                    return
+                sess.attach(up)
+                backlog, sess.backlog = sess.backlog, []
+                for data in backlog:
+                    forward(sess, data, 0)
+
+        front, _ = await loop.create_datagram_endpoint(Front, local_addr=(self.args.bind, listen_port))
+
+        async def reap() -> None:
+            # UDP 会话空闲超时即视为连接结束
+            while True:
+                await asyncio.sleep(0.5)
+                now = time.monotonic()
+                for addr, sess in list(sessions.items()):
+                    if now - sess.st.last_seen > self.args.udp_idle_s and not sess.backlog:
+                        sess.close()
+                        del sessions[addr]
+                        self.closed(sess.st)
+
+        self.udp_sessions.append(sessions)
+        loop.create_task(reap())
+        return front
+
+    def report(self) -> None:
+        done = [c for c in self.conns if c.t1]
+        up = sum(c.bytes[0] for c in self.conns)
+        down = sum(c.bytes[1] for c in self.conns)
+        resets = sum(1 for c in self.conns if c.reset)
+        errors = sum(1 for c in self.conns if c.error)
+        dropped = sum(c.dropped for c in self.conns)
+        reordered = sum(c.reordered for c in self.conns)
+        kbps = sorted(c.summary()["kbps_up"] for c in done)
+        mid = kbps[len(kbps) // 2] if kbps else 0.0
+        print(f"[PROXY] conns={len(self.conns)} closed={len(done)} up={up}B down={down}B resets={resets} "
+              f"errors={errors} udp_dropped={dropped} udp_reordered={reordered} per-conn up p50={mid:.1f}kbps",
+              flush=True)
+
+
+def hard_close(writer: asyncio.StreamWriter) -> None:
+    """SO_LINGER=0 后关闭，对端收到 RST 而不是 FIN。"""
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        except OSError:
+            pass
+    writer.transport.abort()
+
+
+def parse_map(text: str) -> Tuple[str, int, str, int]:
+    parts = text.split(":")
+    if len(parts) != 4 or parts[0] not in ("tcp", "udp"):
+        raise argparse.ArgumentTypeError(f"映射格式应为 PROTO:LISTEN_PORT:TARGET_HOST:TARGET_PORT，收到 {text!r}")
+    return parts[0], int(parts[1]), parts[2], int(parts[3])
+
+
+async def run_proxy(proxy: Proxy) -> None:
+    args = proxy.args
+    closers = []
+    for proto, listen_port, host, port in args.map:
+        if proto == "tcp":
+            srv = await proxy.serve_tcp(listen_port, (host, port))
+            closers.append(srv.close)
+        else:
+            tr = await proxy.serve_udp(listen_port, (host, port))
+            closers.append(tr.close)
+        print(f"[PROXY] {proto} {args.bind}:{listen_port} -> {host}:{port}", flush=True)
+    print(f"[PROXY] delay={args.delay_ms}ms jitter={args.jitter_ms}ms dist={args.dist} "
+          f"bandwidth={args.bandwidth_kbps or '-'}kbps stall={args.stall_prob}/{args.stall_ms}ms "
+          f"loss={args.loss} reorder={args.reorder}/{args.reorder_ms}ms reset={args.reset_prob}", flush=True)
+
+    t0 = time.monotonic()
+    last_report = t0
+    try:
+        while True:
+            await asyncio.sleep(0.2)
+            now = time.monotonic()
+            if args.report_s > 0 and now - last_report >= args.report_s:
+                proxy.report()
+                last_report = now
+            if args.duration > 0 and now - t0 >= args.duration:
+                break
+    finally:
+        for close in closers:
+            close()
+        for sessions in proxy.udp_sessions:
+            for sess in sessions.values():
+                sess.close()
+                proxy.closed(sess.st)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="用户态 TCP/UDP 链路劣化代理（时延分布/带宽/停顿/丢包/乱序/复位）")
+    parser.add_argument("--map", type=parse_map, action="append", required=True,
+                        help="PROTO:LISTEN_PORT:TARGET_HOST:TARGET_PORT，可重复")
+    parser.add_argument("--bind", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="单向基准时延")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="抖动（uniform 为 ±，normal 为标准差，pareto 为尾部尺度）")
+    parser.add_argument("--dist", choices=["const", "uniform", "normal", "pareto"], default="uniform", help="时延分布")
+    parser.add_argument("--pareto-alpha", type=float, default=2.5, help="pareto 形状参数（越小尾越长）")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0.0, help="每个映射每个方向的带宽上限（0=不限）")
+    parser.add_argument("--stall-prob", type=float, default=0.0, help="每个数据块发生停顿的概率")
+    parser.add_argument("--stall-ms", type=float, default=200.0, help="停顿时长")
+    parser.add_argument("--loss", type=float, default=0.0, help="UDP 丢包率")
+    parser.add_argument("--reorder", type=float, default=0.0, help="UDP 乱序概率")
+    parser.add_argument("--reorder-ms", type=float, default=10.0, help="乱序数据报额外滞后")
+    parser.add_argument("--reset-prob", type=float, default=0.0, help="TCP 连接被复位的概率")
+    parser.add_argument("--reset-max-bytes", type=int, default=4096, help="复位前最多转发的上行字节")
+    parser.add_argument("--udp-idle-s", type=float, default=5.0, help="UDP 会话空闲超时")
+    parser.add_argument("--read-bytes", type=int, default=65536, help="TCP 单次读取大小（一个数据块）")
+    parser.add_argument("--queue-chunks", type=int, default=256, help="每方向在途数据块上限（反压）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子（复现同一劣化序列）")
+    parser.add_argument("--duration", type=float, default=0.0, help="运行秒数（0=直到 Ctrl-C）")
+    parser.add_argument("--report-s", type=float, default=5.0, help="周期汇总间隔（0=不报告）")
+    parser.add_argument("--quiet", action="store_true", help="不逐连接打印")
+    parser.add_argument("--stats-json", default="", help="退出时写出每条连接的统计")
+    args = parser.parse_args()
+
+    proxy = Proxy(args)
+    try:
+        asyncio.run(run_proxy(proxy))
+    except KeyboardInterrupt:
+        pass
+    proxy.report()
+    if args.stats_json:
+        with open(args.stats_json, "w", encoding="utf-8") as f:
+            json.dump([c.summary() for c in proxy.conns], f, ensure_ascii=False, indent=1)
+        print(f"[PROXY] stats -> {args.stats_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 import argparse
+import json
 import struct
 from pathlib import Path
 
+from stglobal_codec import format_diff, get_codec, locate_candidates as codec_locate
+
 STGLOBAL_SIZE = 29328
 CFSM_OFFSET = 29292
 CIPM_OFFSET = 29304
@@ -23,28 +26,11 @@ def i32(buf: bytes, off: int, le: bool) -> int:
 
 
 def locate_candidates(raw: bytes):
-    # Heuristic: cFSMInfo often contains compile date like "Dec 10 2025"
-    keys = [b'Dec ', b'Jan ', b'Feb ', b'Mar ', b'Apr ', b'May ', b'Jun ', b'Jul ', b'Aug ', b'Sep ', b'Oct ', b'Nov ']
-    pos = []
-    for k in keys:
-        i = 0
-        while True:
-            j = raw.find(k, i)
-            if j < 0:
-                break
-            pos.append(j)
-            i = j + 1
-    pos = sorted(set(pos))
-
-    starts = []
-    for p in pos:
-        st = p - CFSM_OFFSET
-        if st >= 0 and st + STGLOBAL_SIZE <= len(raw):
-            starts.append(st)
-    return sorted(set(starts))
-
-
-def dump_one(raw: bytes, start: int):
+    # single regex pass (compile date in cFSMInfo / FSM_CMD_CONFIG frame header), best score first
+    return [start for start, _, _ in codec_locate(raw)]
+
+
+def dump_one(raw: bytes, start: int, full_json: str = ''):
     g = raw[start:start+STGLOBAL_SIZE]
     c_fsm = g[CFSM_OFFSET:CFSM_OFFSET+12]
     c_ipm = g[CIPM_OFFSET:CIPM_OFFSET+12]
@@ -62,11 +48,22 @@ def dump_one(raw: bytes, start: int):
         nFsmModule = g[29327]
         print(f'[{tag}] nSubsysId={nSubsysId}, nVersion={nVersion}, nNetState={nNetState}, nFsmRestart={nFsmRestart}, nFsmModule={nFsmModule}')
 
+    fields = get_codec().decode(g)
+    print(f"[LE] sys: subsys={fields['sys.nSubsysNum']} exits={fields['sys.nExitNum']} "
+          f"image={fields['sys.width']}x{fields['sys.height']} packetSize={fields['sys.packetSize']}")
+    print(f"[LE] grade: fruit={fields['grade.strFruitName']!r} size={fields['grade.nSizeGradeNum']} "
+          f"quality={fields['grade.nQualityGradeNum']} classify={fields['grade.nClassifyType']}")
+    if full_json:
+        Path(full_json).write_text(json.dumps(fields, ensure_ascii=False, indent=1), encoding='utf-8')
+        print(f'all {len(fields)} fields -> {full_json}')
+
 
 def main():
     ap = argparse.ArgumentParser(description='Decode ttt.txt escaped bytes and try parse Qt StGlobal (MAX64 layout).')
     ap.add_argument('-i', '--input', default='E:/NEW/MY_HARMONY/ttt.txt')
     ap.add_argument('-o', '--output', default='E:/NEW/MY_HARMONY/ttt_decoded.bin', help='save decoded raw bytes')
+    ap.add_argument('--json', default='', help='write every field of the first candidate to this json file')
+    ap.add_argument('--diff', action='store_true', help='field-level diff between the first two candidates')
     args = ap.parse_args()
 
     inp = Path(args.input)
@@ -81,8 +78,15 @@ def main():
         print('No candidate found by date-signature; you can inspect raw manually.')
         return
 
-    for st in cands[:5]:
-        dump_one(raw, st)
+    for i, st in enumerate(cands[:5]):
+        dump_one(raw, st, args.json if i == 0 else '')
+
+    if args.diff and len(cands) >= 2:
+        a, b = sorted(cands[:2])
+        rows = get_codec().diff(raw, raw, a, b)
+        print(f'diff {a} -> {b}: changed_fields={len(rows)}')
+        for line in format_diff(rows):
+            print(f'  {line}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Thin client for `qt_stream_tool.py serve`.
+
+  python tools/qt_stream_client.py list -i cap.raw
+  python tools/qt_stream_client.py --batch < commands.txt     # one qt_stream_tool command line per line
+  python tools/qt_stream_client.py --ping | --shutdown
+"""
+import json
+import os
+import shlex
+import socket
+import sys
+
+DEFAULT_SOCKET = os.environ.get('QT_STREAM_TOOL_SOCK', '/tmp/qt_stream_tool.sock')
+
+
+def request(sock_file, payload):
+    sock_file.write(json.dumps(payload).encode('utf-8') + b'\n')
+    sock_file.flush()
+    line = sock_file.readline()
+    if not line:
+        raise SystemExit('daemon closed the connection')
+    return json.loads(line)
+
+
+def emit(reply):
+    sys.stdout.write(reply.get('stdout', ''))
+    sys.stderr.write(reply.get('stderr', ''))
+    return int(reply.get('rc', 0))
+
+
+def main():
+    argv = sys.argv[1:]
+    path = DEFAULT_SOCKET
+    if argv[:1] == ['--socket']:
+        path, argv = argv[1], argv[2:]
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+    except OSError as e:
+        raise SystemExit(f'cannot reach daemon at {path}: {e} (start it with: qt_stream_tool.py serve)')
+    f = s.makefile('rwb')
+    cwd = os.getcwd()
+
+    if argv[:1] in (['--ping'], ['--shutdown']):
+        rc = emit(request(f, {'op': argv[0][2:]}))
+    elif argv[:1] == ['--batch']:
+        # one connection for the whole batch; stops at the first failing command
+        rc = 0
+        for line in sys.stdin:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            rc = emit(request(f, {'argv': shlex.split(line), 'cwd': cwd}))
+            if rc:
+                break
+    else:
+        rc = emit(request(f, {'argv': argv, 'cwd': cwd}))
+    s.close()
+    sys.exit(rc)
+
+
+if __name__ == '__main__':
+    main()
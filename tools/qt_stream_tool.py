@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
 import argparse
+import json
+import mmap
+import os
 import socket
 import struct
+import time
 from pathlib import Path
 
+from exit_percent import calc_exit_percent  # shared with mock_device.py
+
 SYNC = b"SYNC"  # little-endian int 0x434E5953 in your C++
 
+# frame index sidecar: <capture>.idx = magic + (file size, mtime_ns) + N x (offset, length, src, dst, cmd)
+INDEX_MAGIC = b"QSTIDX1\0"
+INDEX_HEAD = struct.Struct('<8sQQ')
+INDEX_ENTRY = struct.Struct('<QIiii')
+
 
 def parse_header(pkt: bytes):
     if len(pkt) < 16:
@@ -34,25 +45,595 @@ def split_by_sync(data: bytes):
     return packets
 
 
-def cmd_list(args):
-    data = Path(args.input).read_bytes()
-    packets = split_by_sync(data)
-    print(f"found packets: {len(packets)}")
-    for i, pkt in enumerate(packets):
-        h = parse_header(pkt)
-        if not h:
+def scan_index(mm, start=0):
+    """Same framing as split_by_sync, but scans a mapped file and keeps only offsets."""
+    entries = []
+    size = len(mm)
+    j = mm.find(SYNC, start)
+    while j >= 0:
+        nxt = mm.find(SYNC, j + 1)
+        end = nxt if nxt >= 0 else size
+        if end - j >= 16:
+            src, dst, cmd = struct.unpack_from('<iii', mm, j + 4)
+            entries.append((j, end - j, src, dst, cmd))
+        j = nxt
+    return entries
+
+
+def index_path(path):
+    return Path(str(path) + '.idx')
+
+
+def load_index(path, use_cache=True):
+    """Return [(offset, length, src, dst, cmd)] for a capture, reusing <capture>.idx when it is current."""
+    path = Path(path)
+    st = path.stat()
+    idx = index_path(path)
+    if use_cache and idx.exists():
+        raw = idx.read_bytes()
+        if len(raw) >= INDEX_HEAD.size:
+            magic, size, mtime_ns = INDEX_HEAD.unpack_from(raw, 0)
+            if magic == INDEX_MAGIC and size == st.st_size and mtime_ns == st.st_mtime_ns:
+                return [e for e in INDEX_ENTRY.iter_unpack(raw[INDEX_HEAD.size:])]
+    if st.st_size == 0:
+        return []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        entries = scan_index(mm)
+    if use_cache:
+        try:
+            with open(idx, 'wb') as f:
+                f.write(INDEX_HEAD.pack(INDEX_MAGIC, st.st_size, st.st_mtime_ns))
+                for e in entries:
+                    f.write(INDEX_ENTRY.pack(*e))
+        except OSError:
+            pass
+    return entries
+
+
+def parse_range(text, total):
+    """'a:b' frame range (python slice semantics, either side optional)."""
+    if not text:
+        return 0, total
+    a, _, b = text.partition(':')
+    lo = int(a) if a else 0
+    hi = int(b) if b else total
+    if lo < 0:
+        lo += total
+    if hi < 0:
+        hi += total
+    return max(0, lo), min(total, hi)
+
+
+def contiguous_runs(entries, max_frames=0, max_bytes=0):
+    """Group frames that are adjacent in the file into (offset, length, frame_count) runs."""
+    runs = []
+    off = length = count = 0
+    for e_off, e_len, _, _, _ in entries:
+        full = (max_frames and count >= max_frames) or (max_bytes and length + e_len > max_bytes and count)
+        if count and e_off == off + length and not full:
+            length += e_len
+            count += 1
             continue
-        src, dst, cmd = h
-        payload_len = len(pkt) - 16
-        print(f"#{i:03d} src=0x{src:04X} dst=0x{dst:04X} cmd=0x{cmd:04X} payload={payload_len} total={len(pkt)}")
+        if count:
+            runs.append((off, length, count))
+        off, length, count = e_off, e_len, 1
+    if count:
+        runs.append((off, length, count))
+    return runs
+
+
+class Capture:
+    """A capture file kept mapped, with its frame index; reloaded when size/mtime change."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        st = self.path.stat()
+        self.key = (st.st_size, st.st_mtime_ns)
+        self.file = open(self.path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b''
+        self.entries = scan_index(self.mm) if st.st_size else []
+
+    def packet(self, i):
+        off, length = self.entries[i][:2]
+        return self.mm[off:off + length]
+
+    def current(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == self.key
+
+    def close(self):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.file.close()
+
+
+CAPTURES = {}
+
+
+def open_capture(path):
+    key = os.path.abspath(path)
+    cap = CAPTURES.get(key)
+    if cap is not None and cap.current():
+        return cap
+    if cap is not None:
+        cap.close()
+    cap = Capture(key)
+    CAPTURES[key] = cap
+    return cap
+
+
+class ConnectionPool:
+    """
+    Keeps one connection per (host, port) open between sends; reconnects when the peer closed it.
+    Only for receivers that keep the connection open (`send --keepalive`): the native TcpServer reads
+    one frame per connection and closes it, and the liveness check below races that close.
+    """
+
+    def __init__(self):
+        self.conns = {}
+
+    def _alive(self, s):
+        try:
+            s.setblocking(False)
+            try:
+                return s.recv(1, socket.MSG_PEEK) != b''
+            except BlockingIOError:
+                return True
+            finally:
+                s.setblocking(True)
+        except OSError:
+            return False
+
+    def sendall(self, host, port, data, timeout):
+        key = (host, port)
+        s = self.conns.get(key)
+        if s is not None and not self._alive(s):
+            s.close()
+            s = None
+        for attempt in (0, 1):
+            if s is None:
+                s = socket.create_connection(key, timeout=timeout)
+                self.conns[key] = s
+            s.settimeout(timeout)
+            try:
+                s.sendall(data)
+                return
+            except OSError:
+                s.close()
+                self.conns.pop(key, None)
+                s = None
+                if attempt:
+                    raise
+
+    def close(self):
+        for s in self.conns.values():
+            s.close()
+        self.conns.clear()
+
+
+# set by the daemon; used only by `send --keepalive`, every other send connects per frame
+POOL = None
+
+
+def cmd_index(args):
+    t0 = time.perf_counter()
+    entries = load_index(args.input, use_cache=not args.rebuild)
+    ms = (time.perf_counter() - t0) * 1000.0
+    cmds = {}
+    for e in entries:
+        cmds[e[4]] = cmds.get(e[4], 0) + 1
+    print(f"indexed frames: {len(entries)} in {ms:.1f}ms -> {index_path(args.input)}")
+    for cmd, n in sorted(cmds.items()):
+        print(f"  cmd=0x{cmd:04X} frames={n}")
+
+
+def cmd_replay(args):
+    entries = load_index(args.input)
+    lo, hi = parse_range(args.range, len(entries))
+    entries = entries[lo:hi]
+    if args.cmd is not None:
+        entries = [e for e in entries if e[4] == args.cmd]
+    if not entries:
+        raise SystemExit('no frames selected')
+
+    frames = bytes_total = calls = 0
+    t0 = time.perf_counter()
+    with open(args.input, 'rb') as f:
+        for _ in range(max(1, args.loop)):
+            if args.per_connection:
+                # native TcpServer reads one frame per connection, then closes it
+                for off, length, _, _, _ in entries:
+                    with socket.create_connection((args.host, args.port), timeout=args.timeout) as s:
+                        s.sendfile(f, off, length)
+                    calls += 1
+                    frames += 1
+                    bytes_total += length
+                    if args.rate > 0:
+                        pace(t0, frames, args.rate)
+                continue
+
+            with socket.create_connection((args.host, args.port), timeout=args.timeout) as s:
+                if args.rate <= 0:
+                    runs = contiguous_runs(entries, max_bytes=args.chunk_bytes)
+                    for off, length, count in runs:
+                        s.sendfile(f, off, length)
+                        calls += 1
+                        frames += count
+                        bytes_total += length
+                    continue
+                # paced: every tick send all frames that are due as one spliced run
+                i = 0
+                start_frames = frames
+                t_start = time.perf_counter()
+                while i < len(entries):
+                    due = int((time.perf_counter() - t_start) * args.rate) + 1
+                    n = max(1, min(len(entries) - i, due - (frames - start_frames)))
+                    for off, length, count in contiguous_runs(entries[i:i + n]):
+                        s.sendfile(f, off, length)
+                        calls += 1
+                        bytes_total += length
+                    i += n
+                    frames += n
+                    pace(t_start, frames - start_frames, args.rate)
+
+    elapsed = max(1e-9, time.perf_counter() - t0)
+    print(f"replayed frames={frames} bytes={bytes_total} sendfile_calls={calls} in {elapsed:.3f}s")
+    print(f"rate: {frames / elapsed:.1f} frames/s {bytes_total / elapsed / (1024 * 1024):.1f} MB/s "
+          f"({frames / max(1, calls):.1f} frames/call)")
+
+
+def pace(t_start, frames_sent, rate):
+    delay = t_start + frames_sent / rate - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+# payload sizes a frame is expected to carry (MAX64 app layouts plus the 48-exit mock variants)
+KNOWN_PAYLOAD_SIZES = {
+    0x0051: (10672, 11596),  # HC_CMD_GRADE_INFO
+    0x1000: (29328,),        # FSM_CMD_CONFIG
+    0x1001: (7764, 4924),    # FSM_CMD_STATISTICS
+    0x1002: (244,),          # FSM_CMD_GRADEINFO
+    0x1003: (44,),           # FSM_CMD_WEIGHTINFO
+    0x1004: (1032,),         # FSM_CMD_WAVEINFO
+    0x1005: (4,), 0x1006: (4,), 0x1009: (4,),
+    0x1008: (64,),           # FSM_CMD_GETVERSION
+}
+
+
+def analyze_part(path, start, end):
+    """Aggregate the frames that start in [start, end); the last one may run past end to the next SYNC."""
+    cmds = {}
+    srcs = {}
+    hist = {}
+    errors = {'short': 0, 'size': 0, 'unknown_cmd': 0}
+    frames = 0
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        lead = mm.find(SYNC, start, end)
+        j = lead
+        while 0 <= j < end:
+            nxt = mm.find(SYNC, j + 1)
+            length = (nxt if nxt >= 0 else size) - j
+            if length < 16:
+                errors['short'] += 1
+            else:
+                src, _, cmd = struct.unpack_from('<iii', mm, j + 4)
+                frames += 1
+                c = cmds.get(cmd)
+                if c is None:
+                    c = cmds[cmd] = [0, 0]
+                c[0] += 1
+                c[1] += length
+                s = srcs.get(src)
+                if s is None:
+                    s = srcs[src] = [0, 0]
+                s[0] += 1
+                s[1] += length
+                key = (cmd, length.bit_length())
+                hist[key] = hist.get(key, 0) + 1
+                expected = KNOWN_PAYLOAD_SIZES.get(cmd)
+                if expected is None:
+                    errors['unknown_cmd'] += 1
+                elif length - 16 not in expected:
+                    errors['size'] += 1
+            j = nxt
+    # bytes before the first SYNC of the whole file are garbage; later parts start on a SYNC
+    garbage = (lead if lead >= 0 else end) - start if start == 0 else 0
+    return {'frames': frames, 'cmds': cmds, 'srcs': srcs, 'hist': hist, 'errors': errors, 'garbage': garbage}
+
+
+def merge_parts(parts):
+    out = {'frames': 0, 'cmds': {}, 'srcs': {}, 'hist': {}, 'errors': {}, 'garbage': 0}
+    for p in parts:
+        out['frames'] += p['frames']
+        out['garbage'] += p['garbage']
+        for name in ('cmds', 'srcs'):
+            dst = out[name]
+            for k, (n, b) in p[name].items():
+                d = dst.setdefault(k, [0, 0])
+                d[0] += n
+                d[1] += b
+        for k, n in p['hist'].items():
+            out['hist'][k] = out['hist'].get(k, 0) + n
+        for k, n in p['errors'].items():
+            out['errors'][k] = out['errors'].get(k, 0) + n
+    return out
+
+
+def partition(path, parts, use_index=True):
+    """Frame-aligned [start, end) byte ranges: from a current .idx when there is one, else a SYNC resync scan."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return [], 'empty'
+    idx = index_path(path)
+    if use_index and idx.exists():
+        st = os.stat(path)
+        raw = idx.read_bytes()
+        if len(raw) >= INDEX_HEAD.size:  # a truncated .idx falls through to the resync scan
+            magic, isize, mtime_ns = INDEX_HEAD.unpack_from(raw, 0)
+            n = (len(raw) - INDEX_HEAD.size) // INDEX_ENTRY.size
+            if magic == INDEX_MAGIC and isize == st.st_size and mtime_ns == st.st_mtime_ns and n:
+                cuts = [0]
+                for k in range(1, parts):
+                    i = n * k // parts
+                    cuts.append(INDEX_ENTRY.unpack_from(raw, INDEX_HEAD.size + i * INDEX_ENTRY.size)[0])
+                cuts.append(size)
+                return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a], 'index'
+    # any SYNC is a frame boundary for this framing, so the first SYNC after a nominal cut is exact
+    cuts = [0]
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for k in range(1, parts):
+            j = mm.find(SYNC, max(cuts[-1] + 1, size * k // parts))
+            if j < 0:
+                break
+            cuts.append(j)
+    cuts.append(size)
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a], 'resync'
+
+
+def cmd_analyze(args):
+    from concurrent.futures import ProcessPoolExecutor
+    path = os.path.abspath(args.input)
+    jobs = args.jobs or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    ranges, how = partition(path, max(1, jobs * args.parts_per_job), use_index=not args.no_index)
+    t_part = time.perf_counter() - t0
+    if jobs == 1:
+        parts = [analyze_part(path, a, b) for a, b in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parts = list(pool.map(analyze_part, [path] * len(ranges), [a for a, _ in ranges], [b for _, b in ranges]))
+    agg = merge_parts(parts)
+    elapsed = time.perf_counter() - t0
+    size = os.path.getsize(path)
+
+    print(f"analyzed {size / (1024 * 1024):.1f} MiB, {agg['frames']} frames in {elapsed:.2f}s "
+          f"({size / (1024 * 1024) / max(1e-9, elapsed):.0f} MiB/s) jobs={jobs} parts={len(ranges)} "
+          f"via {how} (partition {t_part * 1000.0:.1f}ms)")
+    span = args.span_s
+    print("per command:")
+    for cmd, (n, b) in sorted(agg['cmds'].items()):
+        print(f"  cmd=0x{cmd:04X} frames={n} bytes={b} avg={b / n:.0f}")
+    print("per source:" + ("" if span else " (pass --span-s for frames/s)"))
+    for src, (n, b) in sorted(agg['srcs'].items(), key=lambda kv: -kv[1][0])[:args.top]:
+        rate = f" {n / span:.2f}frames/s {b / span / 1024.0:.1f}KiB/s" if span else f" {100.0 * n / max(1, agg['frames']):.1f}%"
+        print(f"  src=0x{src & 0xFFFFFFFF:04X} frames={n} bytes={b}{rate}")
+    print("frame size histogram (power-of-two buckets):")
+    for (cmd, bucket), n in sorted(agg['hist'].items()):
+        lo = 1 << (bucket - 1) if bucket else 0
+        print(f"  cmd=0x{cmd:04X} [{lo}, {1 << bucket}) frames={n}")
+    errs = dict(agg['errors'], garbage_bytes=agg['garbage'])
+    print("decode errors: " + " ".join(f"{k}={v}" for k, v in errs.items()))
+    if args.json:
+        out = {
+            'input': path, 'bytes': size, 'frames': agg['frames'], 'elapsed_s': elapsed, 'jobs': jobs,
+            'partition': how, 'parts': len(ranges),
+            'cmds': {f'0x{k:04X}': {'frames': n, 'bytes': b} for k, (n, b) in agg['cmds'].items()},
+            'srcs': {f'0x{k & 0xFFFFFFFF:04X}': {'frames': n, 'bytes': b} for k, (n, b) in agg['srcs'].items()},
+            'hist': [{'cmd': f'0x{c:04X}', 'bucket_lt': 1 << bkt, 'frames': n} for (c, bkt), n in sorted(agg['hist'].items())],
+            'errors': errs,
+        }
+        Path(args.json).write_text(json.dumps(out, indent=1), encoding='utf-8')
+        print(f"json -> {args.json}")
+
+
+def statistics_layout(exits, weight_fmt):
+    """Offsets of the StStatistics fields follow decodes; exit count and weight width differ per build."""
+    fields = (
+        ('grade_count', 'I', 256), ('weight_grade_count', weight_fmt, 256),
+        ('exit_count', 'I', exits), ('exit_weight_count', weight_fmt, exits),
+        ('channel_total_count', 'I', 12), ('channel_weight_count', weight_fmt, 12),
+        ('subsys_id', 'i', 1), ('box_grade_count', 'i', 256), ('box_grade_weight', weight_fmt, 256),
+        ('head', 'i', 3),  # nTotalCupNum (yield), nInterval, nIntervalSumperminute (speed)
+    )
+    out = {}
+    off = 0
+    for name, fmt, count in fields:
+        out[name] = (off, struct.Struct(f'<{count}{fmt}'))
+        off += out[name][1].size
+    return out
+
+
+# keyed by payload size: 64-exit app build (double weights), 48-exit mock_device build (u32 weights)
+STATISTICS_LAYOUTS = {7764: statistics_layout(64, 'd'), 4924: statistics_layout(48, 'I')}
+
+
+def decode_statistics(payload):
+    layout = STATISTICS_LAYOUTS.get(len(payload))
+    if layout is None:
+        return None
+
+    def field(name):
+        off, st = layout[name]
+        return st.unpack_from(payload, off)
+
+    total_cup, _, per_minute = field('head')
+    use_weight, percents = calc_exit_percent(field('exit_count'), field('exit_weight_count'))
+    return {'yield': total_cup, 'speed': per_minute, 'by_weight': use_weight, 'percents': percents}
+
+
+class FrameFollower:
+    """
+    Incremental SYNC framing over a growing byte stream.
+
+    A frame is complete when the next SYNC arrives, or as soon as its known payload size is
+    buffered, so the newest frame is not held back until the writer produces another one.
+    """
+
+    def __init__(self, max_buffer):
+        self.buf = bytearray()
+        self.max_buffer = max_buffer
+        self.garbage = 0
+
+    def feed(self, data):
+        self.buf += data
+        frames = []
+        buf = self.buf
+        pos = buf.find(SYNC)
+        if pos < 0:
+            # keep a possible SYNC prefix split across reads
+            keep = min(len(buf), len(SYNC) - 1)
+            self.garbage += len(buf) - keep
+            del buf[:len(buf) - keep]
+            return frames
+        self.garbage += pos
+        while True:
+            end = -1
+            if len(buf) - pos >= 16:
+                cmd = int.from_bytes(buf[pos + 12:pos + 16], 'little', signed=True)
+                sizes = KNOWN_PAYLOAD_SIZES.get(cmd)
+                if sizes and len(sizes) == 1 and len(buf) - pos >= 16 + sizes[0] and \
+                        (len(buf) - pos == 16 + sizes[0] or buf[pos + 16 + sizes[0]:pos + 20 + sizes[0]] == SYNC):
+                    end = pos + 16 + sizes[0]
+            if end < 0:
+                end = buf.find(SYNC, pos + 1)
+            if end < 0:
+                break
+            frames.append(bytes(buf[pos:end]))
+            pos = end
+        del buf[:pos]
+        if len(buf) > self.max_buffer:
+            self.garbage += len(buf)
+            buf.clear()
+        return frames
+
+    def flush(self):
+        """Hand out the buffered tail as a frame once the writer has gone quiet."""
+        frames = [bytes(self.buf)] if len(self.buf) >= 16 else []
+        self.buf.clear()
+        return frames
+
+
+def cmd_follow(args):
+    window = max(1, int(args.window_s))
+    buckets = [{} for _ in range(window)]  # per-second ring of {cmd: frames}
+    bucket_sec = [0] * window
+    latest = {}  # src -> decoded statistics
+    follower = FrameFollower(args.max_buffer)
+    read_buf = bytearray(args.read_bytes)
+    totals = {'frames': 0, 'bytes': 0, 'short': 0}
+    lag_max = 0.0
+
+    f = open(args.input, 'rb')
+    if not args.from_start:
+        f.seek(0, os.SEEK_END)
+    t0 = time.monotonic()
+    next_report = t0 + args.interval_s
+    last_data = t0
+
+    def report(now):
+        sec = int(now)
+        rates = {}
+        for i in range(window):
+            if sec - bucket_sec[i] < window:
+                for cmd, n in buckets[i].items():
+                    rates[cmd] = rates.get(cmd, 0) + n
+        # until a full window has passed, rates cover only the seconds seen so far
+        span = max(1.0, min(window, now - t0))
+        line = ' '.join(f'0x{cmd:04X}={n / span:.1f}/s' for cmd, n in sorted(rates.items())) or 'idle'
+        print(f"[{time.strftime('%H:%M:%S')}] frames={totals['frames']} bytes={totals['bytes']} "
+              f"garbage={follower.garbage} lag_max={lag_max * 1000.0:.1f}ms | {line}")
+        for src, st in sorted(latest.items()):
+            top = sorted(((p, i) for i, p in enumerate(st['percents']) if p > 0), reverse=True)[:args.top_exits]
+            exits = ', '.join(f'E{i + 1}:{p:.2f}%' for p, i in top) or '-'
+            mode = 'weight' if st['by_weight'] else 'count'
+            print(f"    src=0x{src & 0xFFFFFFFF:04X} yield={st['yield']} speed={st['speed']}/min "
+                  f"exits({mode}) {exits}")
+
+    def consume(frames, now):
+        sec = int(now)
+        slot = sec % window
+        if bucket_sec[slot] != sec:
+            bucket_sec[slot] = sec
+            buckets[slot].clear()
+        counts = buckets[slot]
+        for frame in frames:
+            if len(frame) < 16:
+                totals['short'] += 1
+                continue
+            src, _, cmd = struct.unpack_from('<iii', frame, 4)
+            totals['frames'] += 1
+            totals['bytes'] += len(frame)
+            counts[cmd] = counts.get(cmd, 0) + 1
+            if cmd == 0x1001:
+                st = decode_statistics(memoryview(frame)[16:])
+                if st is not None:
+                    latest[src] = st
+
+    try:
+        while True:
+            now = time.monotonic()
+            n = f.readinto(read_buf)
+            if n:
+                consume(follower.feed(memoryview(read_buf)[:n]), now)
+                lag_max = max(lag_max, time.monotonic() - now)
+                last_data = now
+                if n == len(read_buf):
+                    continue  # catching up, read again before sleeping
+            else:
+                if follower.buf and now - last_data >= args.flush_ms / 1000.0:
+                    consume(follower.flush(), now)
+                st = os.fstat(f.fileno())
+                try:
+                    replaced = os.stat(args.input).st_ino != st.st_ino
+                except FileNotFoundError:
+                    replaced = False  # renamed away, new file not created yet
+                if replaced or st.st_size < f.tell():
+                    # truncated, or renamed over by a new capture: start over from its beginning
+                    f.close()
+                    f = open(args.input, 'rb')
+                    follower.buf.clear()
+            if now >= next_report:
+                report(now)
+                next_report = now + args.interval_s
+            if args.duration_s and now - t0 >= args.duration_s:
+                break
+            if not n:
+                time.sleep(args.poll_ms / 1000.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        f.close()
+    report(time.monotonic())
+
+
+def cmd_list(args):
+    cap = open_capture(args.input)
+    print(f"found packets: {len(cap.entries)}")
+    for i, (_, length, src, dst, cmd) in enumerate(cap.entries):
+        payload_len = length - 16
+        print(f"#{i:03d} src=0x{src:04X} dst=0x{dst:04X} cmd=0x{cmd:04X} payload={payload_len} total={length}")
 
 
 def cmd_export(args):
-    data = Path(args.input).read_bytes()
-    packets = split_by_sync(data)
-    if args.index < 0 or args.index >= len(packets):
-        raise SystemExit(f"index out of range: {args.index}, total={len(packets)}")
-    pkt = packets[args.index]
+    cap = open_capture(args.input)
+    if args.index < 0 or args.index >= len(cap.entries):
+        raise SystemExit(f"index out of range: {args.index}, total={len(cap.entries)}")
+    pkt = cap.packet(args.index)
     out = Path(args.output)
     out.write_bytes(pkt)
     payload_out = out.with_suffix(out.suffix + '.payload.bin')
@@ -70,8 +651,11 @@ def cmd_send(args):
     if not h:
         raise SystemExit('invalid packet: need raw [SYNC(4)+src(4)+dst(4)+cmd(4)+payload]')
     src, dst, cmd = h
-    with socket.create_connection((args.host, args.port), timeout=args.timeout) as s:
-        s.sendall(pkt)
+    if POOL is not None and args.keepalive:
+        POOL.sendall(args.host, args.port, pkt, args.timeout)
+    else:
+        with socket.create_connection((args.host, args.port), timeout=args.timeout) as s:
+            s.sendall(pkt)
     print(f"sent: {len(pkt)} bytes to {args.host}:{args.port}")
     print(f"header: src=0x{src:04X} dst=0x{dst:04X} cmd=0x{cmd:04X}")
 
@@ -85,7 +669,96 @@ def cmd_build(args):
     print(f"payload bytes: {len(payload)}")
 
 
-def main():
+DEFAULT_SOCKET = os.environ.get('QT_STREAM_TOOL_SOCK', '/tmp/qt_stream_tool.sock')
+
+
+def run_request(parser, req):
+    """Run one client request {argv, cwd} in-process; returns {rc, stdout, stderr}."""
+    import contextlib
+    import io
+    out, err = io.StringIO(), io.StringIO()
+    rc = 0
+    prev_cwd = os.getcwd()
+    try:
+        os.chdir(req.get('cwd') or prev_cwd)
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            argv = list(req.get('argv') or [])
+            if argv and argv[0] in ('serve', 'daemon'):
+                raise SystemExit('nested serve is not allowed')
+            args = parser.parse_args(argv)
+            args.func(args)
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            err.write(e.code + '\n')
+            rc = 1
+        else:
+            rc = e.code or 0
+    except Exception as e:
+        err.write(f'{type(e).__name__}: {e}\n')
+        rc = 1
+    finally:
+        os.chdir(prev_cwd)
+    return {'rc': rc, 'stdout': out.getvalue(), 'stderr': err.getvalue()}
+
+
+def cmd_serve(args):
+    """Long-running daemon: newline-delimited JSON requests over a Unix socket, one reply line each."""
+    import json
+    import socketserver
+    import threading
+    global POOL
+    POOL = ConnectionPool()
+    parser = build_parser()
+    lock = threading.Lock()  # requests redirect stdout and chdir, so they run one at a time
+    counters = {'requests': 0}
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                req = json.loads(line)
+                op = req.get('op', 'run')
+                if op == 'ping':
+                    reply = {'rc': 0, 'stdout': f"pid={os.getpid()} requests={counters['requests']} "
+                                                f"captures={len(CAPTURES)} conns={len(POOL.conns)}\n", 'stderr': ''}
+                elif op == 'shutdown':
+                    reply = {'rc': 0, 'stdout': 'bye\n', 'stderr': ''}
+                    threading.Thread(target=server.shutdown, daemon=True).start()
+                else:
+                    with lock:
+                        counters['requests'] += 1
+                        reply = run_request(parser, req)
+                self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+                self.wfile.flush()
+
+    if os.path.exists(args.socket):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(args.socket)
+        except OSError:
+            os.unlink(args.socket)  # stale socket left by a daemon that died
+        else:
+            raise SystemExit(f'a daemon is already listening on {args.socket}')
+        finally:
+            probe.close()
+    server = socketserver.ThreadingUnixStreamServer(args.socket, Handler)
+    server.daemon_threads = True
+    print(f"qt_stream_tool daemon listening on {args.socket} (pid {os.getpid()})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        POOL.close()
+        for cap in CAPTURES.values():
+            cap.close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+def build_parser():
     p = argparse.ArgumentParser(description='Qt/Harmony TCP raw packet helper')
     sub = p.add_subparsers(dest='sub', required=True)
 
@@ -104,6 +777,8 @@ def main():
     p_send.add_argument('--host', required=True)
     p_send.add_argument('--port', required=True, type=int)
     p_send.add_argument('--timeout', type=float, default=5.0)
+    p_send.add_argument('--keepalive', action='store_true',
+                        help='under serve, reuse one connection per host:port (receiver must keep it open)')
     p_send.set_defaults(func=cmd_send)
 
     p_build = sub.add_parser('build', help='build one raw packet from payload file')
@@ -114,7 +789,56 @@ def main():
     p_build.add_argument('--payload', help='payload bin file')
     p_build.set_defaults(func=cmd_build)
 
-    args = p.parse_args()
+    p_idx = sub.add_parser('index', help='build/refresh the frame index sidecar (<input>.idx)')
+    p_idx.add_argument('-i', '--input', required=True)
+    p_idx.add_argument('--rebuild', action='store_true', help='ignore an existing index')
+    p_idx.set_defaults(func=cmd_index)
+
+    p_rep = sub.add_parser('replay', help='replay a capture with sendfile at frame boundaries')
+    p_rep.add_argument('-i', '--input', required=True)
+    p_rep.add_argument('--host', required=True)
+    p_rep.add_argument('--port', required=True, type=int)
+    p_rep.add_argument('--range', default='', help='frame range a:b (default all)')
+    p_rep.add_argument('--cmd', type=lambda x: int(x, 0), help='only replay frames with this cmd id')
+    p_rep.add_argument('--rate', type=float, default=0.0, help='frames/s, 0 = as fast as the receiver takes it')
+    p_rep.add_argument('--loop', type=int, default=1)
+    p_rep.add_argument('--chunk-bytes', type=int, default=8 * 1024 * 1024, help='max bytes per sendfile run (unpaced)')
+    p_rep.add_argument('--per-connection', action='store_true', help='one connection per frame (native TcpServer)')
+    p_rep.add_argument('--timeout', type=float, default=5.0)
+    p_rep.set_defaults(func=cmd_replay)
+
+    p_an = sub.add_parser('analyze', help='parallel per-command/per-source statistics of a large capture')
+    p_an.add_argument('-i', '--input', required=True)
+    p_an.add_argument('-j', '--jobs', type=int, default=0, help='worker processes (default: all cores)')
+    p_an.add_argument('--parts-per-job', type=int, default=4, help='partitions per worker, for load balance')
+    p_an.add_argument('--no-index', action='store_true', help='partition by SYNC resync even if an .idx exists')
+    p_an.add_argument('--span-s', type=float, default=0.0, help='capture duration, to turn counts into rates')
+    p_an.add_argument('--top', type=int, default=20, help='sources to print')
+    p_an.add_argument('--json', help='write the merged aggregates to a json file')
+    p_an.set_defaults(func=cmd_analyze)
+
+    p_fo = sub.add_parser('follow', help='tail a growing capture and print rolling rates and decoded statistics')
+    p_fo.add_argument('-i', '--input', required=True)
+    p_fo.add_argument('--from-start', action='store_true', help='decode what is already in the file first')
+    p_fo.add_argument('--window-s', type=int, default=10, help='rolling window for per-command rates')
+    p_fo.add_argument('--interval-s', type=float, default=1.0, help='report period')
+    p_fo.add_argument('--poll-ms', type=float, default=20.0, help='sleep between reads at end of file')
+    p_fo.add_argument('--flush-ms', type=float, default=200.0, help='emit a trailing frame of unknown size after this much quiet')
+    p_fo.add_argument('--read-bytes', type=int, default=1 << 20)
+    p_fo.add_argument('--max-buffer', type=int, default=8 << 20, help='drop buffered bytes beyond this without a SYNC')
+    p_fo.add_argument('--top-exits', type=int, default=6)
+    p_fo.add_argument('--duration-s', type=float, default=0.0, help='stop after this long (0 = until Ctrl-C)')
+    p_fo.set_defaults(func=cmd_follow)
+
+    p_srv = sub.add_parser('serve', help='run as a daemon on a Unix socket (use qt_stream_client.py)')
+    p_srv.add_argument('--socket', default=DEFAULT_SOCKET)
+    p_srv.set_defaults(func=cmd_serve)
+
+    return p
+
+
+def main():
+    args = build_parser().parse_args()
     args.func(args)
 
 
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+按上位机烧写流程把固件分块发给 mock_device.py 的命令服务（--flash 模拟 bootloader）
+
+- 命令帧头沿用命令端口格式：totalLen u32 + src u16 + dst u16 + cmd u16 + pad(2)
+- 每块前缀 FlashChunkHeader：imageSize + offset + chunkCrc32 + imageCrc32 + flags（bit0 最后一块）
+- 每块一个短连接，服务端处理完关闭连接即视为该块完成（单块时延）
+- --chunk-sizes 给多个值时依次整包烧写，输出块大小与吞吐/时延的对照表
+
+示例：
+  python mock_device.py --cmd-server-only --flash --dry-run
+  python tools/send_flash_image.py --size-mb 8 --chunk-sizes 1024,4096,16384,65536,262144
+"""
+
+import argparse
+import os
+import socket
+import struct
+import time
+import zlib
+from typing import List
+
+HC_ID = 0x1000
+FSM_ID = 0x0100
+HC_CMD_BOOT_FLASH_BURN = 0x0100
+HC_CMD_WAM_FLASH_BURN = 0x011E
+CMD_HEADER = struct.Struct("<IHHH2x")
+FLASH_CHUNK_HEADER = struct.Struct("<5I")
+FLASH_FLAG_LAST = 0x1
+
+
+def load_image(args: argparse.Namespace) -> bytes:
+    if args.image:
+        with open(args.image, "rb") as f:
+            return f.read()
+    return os.urandom(int(args.size_mb * 1024 * 1024))
+
+
+def parse_sizes(text: str) -> List[int]:
+    out = []
+    for part in text.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        mult = 1
+        if part.endswith("k"):
+            mult, part = 1024, part[:-1]
+        elif part.endswith("m"):
+            mult, part = 1024 * 1024, part[:-1]
+        out.append(int(part) * mult)
+    return out or [4096]
+
+
+def sendmsg_all(s: socket.socket, parts: List[memoryview]) -> None:
+    # 带超时的 socket 上 sendmsg 可能只发出一部分，按已发字节推进直到全部发完
+    while parts:
+        sent = s.sendmsg(parts)
+        while parts and sent >= len(parts[0]):
+            sent -= len(parts[0])
+            parts.pop(0)
+        if parts and sent:
+            parts[0] = parts[0][sent:]
+
+
+def send_chunk(host: str, port: int, cmd: int, chunk_head: bytes, data: memoryview, timeout: float) -> None:
+    total = CMD_HEADER.size + len(chunk_head) + len(data)
+    with socket.create_connection((host, port), timeout=timeout) as s:
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sendmsg_all(s, [memoryview(CMD_HEADER.pack(total, HC_ID, FSM_ID, cmd)), memoryview(chunk_head), data])
+        s.shutdown(socket.SHUT_WR)
+        # 服务端处理完该块后关闭连接；提前关闭（未读完就断开）会表现为 EPIPE/RST
+        while s.recv(4096):
+            pass
+
+
+def burn(args: argparse.Namespace, image: bytes, chunk_size: int) -> dict:
+    cmd = HC_CMD_BOOT_FLASH_BURN if args.target == "boot" else HC_CMD_WAM_FLASH_BURN
+    view = memoryview(image)
+    size = len(image)
+    image_crc = zlib.crc32(image)
+    lat: List[float] = []
+    t0 = time.perf_counter()
+    offset = 0
+    while offset < size:
+        data = view[offset:offset + chunk_size]
+        last = offset + len(data) >= size
+        head = FLASH_CHUNK_HEADER.pack(size, offset, zlib.crc32(data), image_crc, FLASH_FLAG_LAST if last else 0)
+        c0 = time.perf_counter()
+        try:
+            send_chunk(args.host, args.port, cmd, head, data, args.timeout)
+        except OSError as e:
+            raise SystemExit(f"[FLASH] chunk={chunk_size}B failed at offset {offset}/{size}: {e}")
+        lat.append(time.perf_counter() - c0)
+        offset += len(data)
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "chunk": chunk_size,
+        "chunks": len(lat),
+        "elapsed": elapsed,
+        "mb_s": size / (1024 * 1024) / max(1e-9, elapsed),
+        "p50_ms": lat[len(lat) // 2] * 1000.0,
+        "p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000.0,
+        "max_ms": lat[-1] * 1000.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="分块发送固件到模拟 bootloader，输出吞吐与单块时延")
+    parser.add_argument("--host", default="127.0.0.1", help="mock_device 命令服务地址")
+    parser.add_argument("--port", type=int, default=1279, help="命令服务端口")
+    parser.add_argument("--target", choices=["boot", "wam"], default="boot", help="烧写目标（BOOT / WAM）")
+    parser.add_argument("--image", default="", help="固件文件；不给则用 --size-mb 随机数据")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="随机固件大小（MB）")
+    parser.add_argument("--chunk-sizes", default="4096", help="块大小列表，例如 1k,4k,64k")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    image = load_image(args)
+    print(f"[FLASH] target={args.target} image={len(image)} bytes crc=0x{zlib.crc32(image):08X} "
+          f"-> {args.host}:{args.port}")
+    rows = []
+    for chunk in parse_sizes(args.chunk_sizes):
+        r = burn(args, image, chunk)
+        rows.append(r)
+        print(f"[FLASH] chunk={r['chunk']:>8d}B chunks={r['chunks']:>6d} {r['elapsed']:7.2f}s "
+              f"{r['mb_s']:8.2f}MB/s per-chunk p50/p95/max={r['p50_ms']:.3f}/{r['p95_ms']:.3f}/{r['max_ms']:.3f}ms")
+    if len(rows) > 1:
+        best = max(rows, key=lambda r: r["mb_s"])
+        print(f"[FLASH] best throughput at chunk={best['chunk']}B ({best['mb_s']:.2f}MB/s, "
+              f"p50 {best['p50_ms']:.3f}ms per chunk)")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,18 @@
 - 每秒发送 1 次
 - 默认发送 2 分钟
 - 默认给子系统 1 和 2 都发（src=0x0100 / 0x0200）
+
+高频模式（--hf）：
+- 每个子系统持有一块按 7764 字节 payload 布局的 bytearray，数组字段用 memoryview.cast 直接读写
+- 每 tick 原地累加增量、只改动变化的标量，发送时直接把缓冲区交给 sendmsg（不重新打包）
+- 按绝对截止时间节拍，目标 50~100 Hz/子系统
+  python tools/send_realtime_statistics_stream.py --hf --rate-hz 100 --subsystems 1,2,3,4 --duration 60
 """
 
 import argparse
 import socket
 import struct
+import sys
 import time
 from typing import Dict, List, Tuple
 
@@ -148,6 +155,172 @@ def build_statistics_payload(state: SubsysState, speed: int, profile: str) -> Tu
     return bytes(buf), summary
 
 
+# payload 字段布局（与 build_statistics_payload 的打包顺序一致）：name -> (offset, format, count)
+HF_FIELDS = (
+    ("grade_count", "I", GRADE_N),
+    ("weight_grade_count", "d", GRADE_N),
+    ("exit_count", "I", MAX_EXIT_NUM),
+    ("exit_weight_count", "d", MAX_EXIT_NUM),
+    ("channel_total_count", "I", MAX_CHANNEL_NUM),
+    ("channel_weight_count", "d", MAX_CHANNEL_NUM),
+    ("subsys_id", "i", 1),
+    ("box_grade_count", "i", GRADE_N),
+    ("box_grade_weight", "d", GRADE_N),
+    ("head", "i", 3),  # nTotalCupNum, nInterval, nIntervalSumperminute
+    ("cup_state", "H", 6),  # nCupState, nPulseInterval, nUnpushFruitCount, nNetState, nWeightSetting, pad
+    ("scm_state", "i", 1),
+    ("iqs_lock", "B", 4),  # nIQSNetState(u16), nLockState, pad
+    ("exit_box_num", "H", MAX_EXIT_NUM),
+    ("exit_weight", "d", MAX_EXIT_NUM),
+    ("notice", "B", MAX_NOTICE_LENGTH),
+)
+
+
+def hf_layout() -> Dict[str, Tuple[int, str, int]]:
+    out: Dict[str, Tuple[int, str, int]] = {}
+    off = 0
+    for name, fmt, count in HF_FIELDS:
+        out[name] = (off, fmt, count)
+        off += struct.calcsize("<" + fmt) * count
+    if (off + 3) // 4 * 4 != EXPECTED_PAYLOAD_SIZE:
+        raise RuntimeError(f"hf layout size mismatch: {off} -> {EXPECTED_PAYLOAD_SIZE}")
+    return out
+
+
+class HfStatistics:
+    """
+    高频模式的子系统状态：payload 常驻 bytearray，数组字段是其上的 memoryview 视图
+    初值直接取 build_statistics_payload 的输出，保证与常规模式字节布局一致
+    """
+    def __init__(self, state: SubsysState, speed: int, profile: str) -> None:
+        if sys.byteorder != "little":
+            raise SystemExit("--hf writes native-endian views; this host is big-endian")
+        self.state = state
+        self.base_speed = speed
+        payload, _ = build_statistics_payload(state, speed, profile)
+        self.buf = bytearray(payload)
+        mv = memoryview(self.buf)
+        self.payload = mv
+        self.v: Dict[str, memoryview] = {}
+        for name, (off, fmt, count) in hf_layout().items():
+            self.v[name] = mv[off:off + struct.calcsize(fmt) * count].cast(fmt)
+        if self.v["subsys_id"][0] != state.subsys_id or self.v["head"][0] != state.total_cup:
+            raise RuntimeError("hf layout does not match build_statistics_payload")
+        self.profile = profile
+        self.notice_prefix = f"RT{subsys_id_to_text(state.subsys_id)}#".encode("ascii")
+
+    def tick(self, speed: int) -> None:
+        """
+        与 build_statistics_payload 相同的数据模型：等级/出口字段是本 tick 的分布而非累计值，
+        只是直接写回常驻 payload，不重新打包
+        """
+        st = self.state
+        v = self.v
+        st.tick += 1
+        t = st.tick
+        delta_yield = 20 + (t % 8) * 3 + st.subsys_id
+        st.total_cup += delta_yield
+        st.total_weight_g += float(delta_yield * (185 + (t % 5) * 6))
+
+        gc, gw = v["grade_count"], v["weight_grade_count"]
+        bc, bw = v["box_grade_count"], v["box_grade_weight"]
+        if self.profile == "feature":
+            for q in range(16):
+                group_base = 6 + ((q + st.subsys_id + t) % 5)
+                for s in range(16):
+                    i = q * 16 + s
+                    c = group_base * (1 + (s % 3))
+                    w = float(c * (170 + q * 2 + s))
+                    gc[i] = c
+                    gw[i] = w
+                    bc[i] = c // 12
+                    bw[i] = w
+        else:
+            for i in range(8):
+                c = delta_yield * (1 + (i % 3))
+                w = float(c * (180 + i * 5))
+                gc[i] = c
+                gw[i] = w
+                bc[i] = c // 12
+                bw[i] = w
+
+        ec, ew = v["exit_count"], v["exit_weight_count"]
+        ebn, eww = v["exit_box_num"], v["exit_weight"]
+        for i in range(6):
+            c = delta_yield * (i + 1) // 6
+            w = float(c * (190 + i * 4))
+            ec[i] = c
+            ew[i] = w
+            ebn[i] = c // 12
+            eww[i] = w
+
+        half = st.total_cup // 2
+        v["channel_total_count"][0] = half & 0xFFFFFFFF
+        v["channel_total_count"][1] = half & 0xFFFFFFFF
+        v["channel_weight_count"][0] = st.total_weight_g / 2.0
+        v["channel_weight_count"][1] = st.total_weight_g / 2.0
+        v["head"][0] = st.total_cup & 0x7FFFFFFF
+        v["head"][2] = speed
+
+        notice = self.notice_prefix + str(t).encode("ascii")
+        nv = v["notice"]
+        nv[: len(notice)] = notice
+        nv[len(notice): MAX_NOTICE_LENGTH] = bytes(MAX_NOTICE_LENGTH - len(notice))
+
+
+def run_hf(args: argparse.Namespace, subsystems: List[int]) -> None:
+    streams = {sid: HfStatistics(SubsysState(sid), args.speed, args.profile) for sid in subsystems}
+    headers = {sid: build_packet(sid << 8, args.dst, args.cmd, b"") for sid in subsystems}
+    period = 1.0 / max(0.1, args.rate_hz)
+    rounds = max(1, int(args.duration * args.rate_hz))
+    print(f"[HF] host={args.host} port={args.port} subsystems={subsystems} rate={args.rate_hz:g}Hz/subsys "
+          f"rounds={rounds} dry_run={args.dry_run}")
+
+    sent = 0
+    late = 0
+    fail = 0
+    build_s = 0.0
+    t0 = time.perf_counter()
+    next_t = t0
+    last_report = t0
+    for r in range(rounds):
+        for sid in subsystems:
+            hf = streams[sid]
+            b0 = time.perf_counter()
+            hf.tick(args.speed + (r % 15) * 20 + sid * 5)
+            build_s += time.perf_counter() - b0
+            if args.dry_run:
+                sent += 1
+                continue
+            try:
+                # 服务端每个连接只读一帧：仍是短连接，但头和常驻缓冲区直接 sendmsg，不拼接
+                with socket.create_connection((args.host, args.port), timeout=args.timeout) as s:
+                    total = len(headers[sid]) + len(hf.payload)
+                    n = s.sendmsg([headers[sid], hf.payload])
+                    if n < total:
+                        s.sendall(b"".join([headers[sid], hf.payload])[n:])
+                sent += 1
+            except OSError:
+                fail += 1
+        next_t += period
+        now = time.perf_counter()
+        if next_t > now:
+            time.sleep(next_t - now)
+        else:
+            late += 1
+            if now - next_t > 1.0:
+                next_t = now  # 落后太多时不追发
+        if now - last_report >= 1.0:
+            st = streams[subsystems[0]].state
+            print(f"[HF] t={now - t0:6.1f}s sent={sent} fail={fail} late_ticks={late} "
+                  f"rate={sent / (now - t0) / len(subsystems):.1f}Hz/subsys build={build_s * 1e6 / max(1, sent + fail):.0f}us/pkt "
+                  f"sid{subsystems[0]}.yield={st.total_cup}")
+            last_report = now
+    elapsed = time.perf_counter() - t0
+    print(f"[HF] done sent={sent} fail={fail} elapsed={elapsed:.2f}s "
+          f"achieved={sent / elapsed / len(subsystems):.1f}Hz/subsys build={build_s * 1e6 / max(1, sent + fail):.0f}us/pkt")
+
+
 def build_packet(src: int, dst: int, cmd: int, payload: bytes) -> bytes:
     return SYNC + struct.pack("<iii", src, dst, cmd) + payload
 
@@ -190,9 +363,14 @@ def main() -> None:
                         help="等级数据分布模式: feature(推荐,更接近接口联调) / compact(前8级)")
     parser.add_argument("--dry-run", action="store_true", help="只生成并打印，不发网络包")
     parser.add_argument("--timeout", type=float, default=3.0)
+    parser.add_argument("--hf", action="store_true", help="高频模式：常驻缓冲区原地更新，按 --rate-hz 发送")
+    parser.add_argument("--rate-hz", type=float, default=50.0, help="高频模式下每个子系统的发送频率")
     args = parser.parse_args()
 
     subsystems = parse_subsystems(args.subsystems)
+    if args.hf:
+        run_hf(args, subsystems)
+        return
     states: Dict[int, SubsysState] = {sid: SubsysState(sid) for sid in subsystems}
 
     rounds = max(1, int(args.duration / args.interval))
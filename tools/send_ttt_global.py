@@ -4,6 +4,8 @@ import socket
 import struct
 from pathlib import Path
 
+from stglobal_codec import locate_candidates
+
 SYNC = b"SYNC"
 STGLOBAL_SIZE = 29328
 
@@ -14,14 +16,12 @@ def decode_ttt_text(path: Path) -> bytes:
 
 
 def locate_stglobal_start(raw: bytes) -> int:
-    key = b'Dec '
-    p = raw.find(key)
-    if p < 0:
-        raise RuntimeError("cannot find date signature 'Dec ' in decoded data")
-    # cFSMInfo offset in StGlobal(MAX64)
-    start = p - 29292
-    if start < 0 or start + STGLOBAL_SIZE > len(raw):
-        raise RuntimeError(f"calculated StGlobal range invalid: start={start}")
+    # best-scoring candidate instead of the first 'Dec ' hit
+    cands = locate_candidates(raw)
+    if not cands:
+        raise RuntimeError('cannot find an StGlobal candidate (compile date / FSM_CMD_CONFIG header)')
+    start, score, how = cands[0]
+    print(f'stglobal candidate: start={start} score={score} via={how} (of {len(cands)})')
     return start
 
 
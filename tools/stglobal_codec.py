@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""
+StGlobal (MAX64, 29328 bytes) codec driven by a field/offset table; StructCodec covers the other
+structs in the table (StSysConfig, StGradeInfo, StExitInfo, ...) the same way.
+
+The layout below mirrors entry/src/main/cpp/Tcp/structures.h; offsets are computed with the
+same #pragma pack rules and checked against docs/qt_harmony_protocol_offset_check_all.md.
+
+  python tools/stglobal_codec.py check
+  python tools/stglobal_codec.py locate -i ttt_decoded.bin
+  python tools/stglobal_codec.py decode -i ttt_decoded.bin [--start N] [--json out.json]
+  python tools/stglobal_codec.py diff a.bin b.bin [--start-a N] [--start-b N]
+"""
+import argparse
+import bisect
+import json
+import re
+import struct
+import time
+from pathlib import Path
+
+MAX_SUBSYS_NUM = 4
+MAX_CHANNEL_NUM = 12
+MAX_CAMERA_NUM = 9
+CHANNEL_NUM = 2
+MAX_COLOR_CAMERA_NUM = 3
+MAX_NIR_CAMERA_NUM = 6
+MAX_QUALITY_GRADE_NUM = 16
+MAX_SIZE_GRADE_NUM = 16
+MAX_EXIT_NUM = 64
+MAX_TEXT_LENGTH = 12
+MAX_FRUIT_NAME_LENGTH = 50
+MAX_COLOR_INTERVAL_NUM = 3
+MAX_COLOR_GRADE_NUM = 16
+MAX_GRADE6_NUM = 6  # shape/flaw/bruise/rot/density/sugar/acidity/hollow/skin/brown/tangxin/rigidity/water
+MAX_FRUIT_TYPE_MAJOR_CLASS_NUM = 32
+PARAS_TAGINFO_NUM = 6
+MAX_LABEL_NUM = 4
+MAX_IPM_NUM = 12
+
+STGLOBAL_SIZE = 29328
+FSM_CMD_CONFIG = 0x1000
+
+# primitive -> (struct code, size)
+PRIMS = {
+    'u8': ('B', 1), 'i8': ('b', 1), 'u16': ('H', 2), 'i16': ('h', 2),
+    'i32': ('i', 4), 'u32': ('I', 4), 'f32': ('f', 4),
+}
+
+# struct -> (pack, [(field, type, count[, text item length])])
+# type is a primitive, 'text' (quint8 char array, split into items) or another struct name
+STRUCTS = {
+    'StSysConfig': (1, [
+        ('exitstate', 'u8', MAX_EXIT_NUM * 2 * 4),
+        ('nChannelInfo', 'u8', MAX_SUBSYS_NUM),
+        ('nImageUV', 'u8', MAX_SUBSYS_NUM),
+        ('nDataRegistration', 'u8', MAX_SUBSYS_NUM),
+        ('nImageSugar', 'u8', MAX_SUBSYS_NUM),
+        ('nImageUltrasonic', 'u8', MAX_SUBSYS_NUM),
+        ('nCameraDelay', 'i32', MAX_CAMERA_NUM * 2),
+        ('width', 'i32', 1),
+        ('height', 'i32', 1),
+        ('packetSize', 'i32', 1),
+        ('nSystemInfo', 'u16', 1),
+        ('nSubsysNum', 'u8', 1),
+        ('nExitNum', 'u8', 1),
+        ('nClassificationInfo', 'u8', 1),
+        ('multiFreq', 'u8', 1),
+        ('nCameraType', 'u8', 1),
+        ('CIRClassifyType', 'u8', 1),
+        ('UVClassifyType', 'u8', 1),
+        ('WeightClassifyTpye', 'u8', 1),
+        ('InternalClassifyType', 'u8', 1),
+        ('UltrasonicClassifyType', 'u8', 1),
+        ('IfWIFIEnable', 'u8', 1),
+        ('CheckExit', 'u8', 1),
+        ('CheckNum', 'u8', 1),
+        ('nIQSEnable', 'u8', 1),
+    ]),
+    'StColorIntervalItem': (1, [('nMinU', 'u8', 1), ('nMaxU', 'u8', 1), ('nMinV', 'u8', 1), ('nMaxV', 'u8', 1)]),
+    'StPercentInfo': (1, [('nMax', 'u8', 1), ('nMin', 'u8', 1)]),
+    'StGradeItemInfo': (4, [
+        ('exit', 'u32', 1),
+        ('nMinSize', 'f32', 1),
+        ('nMaxSize', 'f32', 1),
+        ('nFruitNum', 'i32', 1),
+    ] + [(n, 'i8', 1) for n in (
+        'nColorGrade', 'sbShapeSize', 'sbDensity', 'sbFlawArea', 'sbBruise', 'sbRot', 'sbSugar', 'sbAcidity',
+        'sbHollow', 'sbSkin', 'sbBrown', 'sbTangxin', 'sbRigidity', 'sbWater', 'sbLabelbyGrade')]),
+    'StGradeInfo': (4, [
+        ('intervals', 'StColorIntervalItem', MAX_COLOR_INTERVAL_NUM),
+        ('percent', 'StPercentInfo', MAX_COLOR_GRADE_NUM * MAX_COLOR_INTERVAL_NUM),
+        ('grades', 'StGradeItemInfo', MAX_QUALITY_GRADE_NUM * MAX_SIZE_GRADE_NUM),
+        ('ExitEnabled', 'i32', 2),
+        ('ColorIntervals', 'i32', 2),
+        ('nExitSwitchNum', 'i32', MAX_EXIT_NUM),
+        ('nTagInfo', 'u8', PARAS_TAGINFO_NUM),
+        ('nFruitType', 'i32', 1),
+        ('strFruitName', 'text', 1, MAX_FRUIT_NAME_LENGTH),
+        ('unFlawAreaFactor', 'u32', MAX_GRADE6_NUM * 2),
+        ('unBruiseFactor', 'u32', MAX_GRADE6_NUM * 2),
+        ('unRotFactor', 'u32', MAX_GRADE6_NUM * 2),
+    ] + [(n, 'f32', MAX_GRADE6_NUM) for n in (
+        'fDensityFactor', 'fSugarFactor', 'fAcidityFactor', 'fHollowFactor', 'fSkinFactor', 'fBrownFactor',
+        'fTangxinFactor', 'fRigidityFactor', 'fWaterFactor', 'fShapeFactor')] + [
+        ('strSizeGradeName', 'text', MAX_SIZE_GRADE_NUM, MAX_TEXT_LENGTH),
+        ('strQualityGradeName', 'text', MAX_QUALITY_GRADE_NUM, MAX_TEXT_LENGTH),
+        ('stDensityGradeName', 'text', MAX_GRADE6_NUM, MAX_TEXT_LENGTH),
+        ('strColorGradeName', 'text', MAX_COLOR_GRADE_NUM, MAX_TEXT_LENGTH),
+    ] + [(n, 'text', MAX_GRADE6_NUM, MAX_TEXT_LENGTH) for n in (
+        'strShapeGradeName', 'stFlawareaGradeName', 'stBruiseGradeName', 'stRotGradeName', 'stSugarGradeName',
+        'stAcidityGradeName', 'stHollowGradeName', 'stSkinGradeName', 'stBrownGradeName', 'stTangxinGradeName',
+        'stRigidityGradeName', 'stWaterGradeName')] + [
+        ('ColorType', 'u8', 1),
+        ('nLabelType', 'u8', 1),
+        ('nLabelbyExit', 'u8', MAX_EXIT_NUM),
+        ('nSwitchLabel', 'u8', MAX_EXIT_NUM),
+        ('nSizeGradeNum', 'u8', 1),
+        ('nQualityGradeNum', 'u8', 1),
+        ('nClassifyType', 'u8', 1),
+        ('nCheckNum', 'i16', 1),
+        ('ForceChannel', 'i16', 1),
+    ]),
+    'StGlobalExitInfo': (4, [
+        ('nPulse', 'u8', 1),
+        ('versionFlag', 'u8', 1),
+        ('nLabelPulse', 'i16', 1),
+        ('nDriverPin', 'i16', MAX_EXIT_NUM),
+        ('Delay_time', 'f32', MAX_EXIT_NUM),
+        ('Hold_time', 'f32', MAX_EXIT_NUM),
+    ]),
+    'StAnalogDensity': (4, [('uAnalogDensity', 'f32', MAX_FRUIT_TYPE_MAJOR_CLASS_NUM)]),
+    'StLabelItemInfo': (4, [('nDis', 'i16', 1), ('nDriverPin', 'i16', 1)]),
+    'StExitItemInfo': (4, [('nDis', 'i16', 1), ('nOffset', 'i16', 1), ('nDriverPin', 'i16', 1)]),
+    'StExitInfo': (4, [('labelexit', 'StLabelItemInfo', MAX_LABEL_NUM), ('exits', 'StExitItemInfo', MAX_EXIT_NUM)]),
+    'StWhiteBalanceMean': (4, [('MeanR', 'i32', 1), ('MeanG', 'i32', 1), ('MeanB', 'i32', 1)]),
+    'StFruitCup': (4, [
+        ('nLeft', 'i32', 2), ('nTop', 'i32', 1), ('nBottom', 'i32', 1), ('nOffsetX', 'i32', 1), ('nOffsetY', 'i32', 1),
+    ]),
+    'StCameraParas': (4, [
+        ('MeanValue', 'StWhiteBalanceMean', 1),
+        ('cup', 'StFruitCup', CHANNEL_NUM),
+        ('nROIOffsetY', 'i32', CHANNEL_NUM),
+        ('nTriggerDelay', 'i32', 1),
+        ('nShutter', 'i32', 1),
+        ('nDetectionThreshold', 'i32', CHANNEL_NUM),
+        ('nDetectWhiteTh', 'i32', CHANNEL_NUM),
+        ('fGammaCorrection', 'f32', 1),
+        ('fPixelRatio', 'f32', CHANNEL_NUM),
+        ('fFruitCupRangeTh', 'f32', CHANNEL_NUM),
+        ('nXYEdgeBreakTh', 'u8', CHANNEL_NUM),
+        ('cCameraNum', 'u8', 1),
+    ]),
+    'StIRCameraParas': (4, [
+        ('cup', 'StFruitCup', CHANNEL_NUM),
+        ('nROIOffsetY', 'i32', CHANNEL_NUM),
+        ('nTriggerDelay', 'i32', 1),
+        ('nShutter', 'i32', 1),
+        ('nIRDetectionThreshold', 'i32', CHANNEL_NUM),
+        ('fGammaCorrection', 'f32', 1),
+        ('fPixelRatio', 'f32', CHANNEL_NUM),
+        ('fFruitCupRangeTh', 'f32', CHANNEL_NUM),
+        ('nXYEdgeBreakTh', 'u8', CHANNEL_NUM),
+        ('cCameraNum', 'u8', 1),
+    ]),
+    'StParas': (4, [
+        ('cameraParas', 'StCameraParas', MAX_COLOR_CAMERA_NUM),
+        ('irCameraParas', 'StIRCameraParas', MAX_NIR_CAMERA_NUM),
+        ('nCupNum', 'i32', 1),
+    ]),
+    'StMotorInfo': (4, [
+        ('bExitId', 'u8', 1),
+        ('bMotorSwitch', 'u8', 1),
+        ('nMotorEnableSwitchNum', 'i32', 1),
+        ('nMotorEnableSwitchWeight', 'i32', 1),
+        ('fDelay_time', 'f32', 1),
+        ('fHold_time', 'f32', 1),
+    ]),
+    'StGlobal': (4, [
+        ('sys', 'StSysConfig', 1),
+        ('grade', 'StGradeInfo', 1),
+        ('gexit', 'StGlobalExitInfo', 1),
+        ('analogdensity', 'StAnalogDensity', 1),
+        ('exit', 'StExitInfo', MAX_CHANNEL_NUM),
+        ('paras', 'StParas', MAX_IPM_NUM),
+        ('motor', 'StMotorInfo', MAX_EXIT_NUM),
+        ('cFSMInfo', 'text', 1, MAX_TEXT_LENGTH),
+        ('cIPMInfo', 'text', 1, MAX_TEXT_LENGTH),
+        ('nSubsysId', 'i32', 1),
+        ('nVersion', 'i32', 1),
+        ('nNetState', 'u16', 1),
+        ('nFsmRestart', 'u8', 1),
+        ('nFsmModule', 'u8', 1),
+    ]),
+}
+
+# offsets recorded in docs/qt_harmony_protocol_offset_check_all.md (offsetof on the native build)
+DOC_OFFSETS = {
+    'sys': 0, 'grade': 632, 'gexit': 11304, 'analogdensity': 11948, 'motor[0]': 28012,
+    'cFSMInfo': 29292, 'nSubsysId': 29316, 'nNetState': 29324, 'nFsmModule': 29327,
+    'grade.grades[0]': 632 + 108, 'grade.ExitEnabled': 632 + 8300, 'grade.nExitSwitchNum': 632 + 8316,
+    'grade.nTagInfo': 632 + 8572, 'grade.ForceChannel': 632 + 10668,
+}
+
+
+class Field:
+    """One leaf of the table: a primitive/text run at a fixed offset."""
+    __slots__ = ('path', 'offset', 'kind', 'count', 'item', 'size', 'fmt')
+
+    def __init__(self, path, offset, kind, count, item=0):
+        self.path = path
+        self.offset = offset
+        self.kind = kind
+        self.count = count
+        self.item = item
+        if kind == 'text':
+            self.size = count * item
+            self.fmt = f'{self.size}s'
+        else:
+            code, size = PRIMS[kind]
+            self.size = count * size
+            self.fmt = f'{count}{code}'
+
+    def convert(self, values):
+        """values: the tuple slice produced by unpacking self.fmt."""
+        if self.kind == 'text':
+            raw = values[0]
+            items = [raw[i:i + self.item].split(b'\0', 1)[0].decode('utf-8', 'replace') for i in range(0, len(raw), self.item)]
+            return items[0] if self.count == 1 else items
+        return values[0] if self.count == 1 else list(values)
+
+    @property
+    def n_values(self):
+        return 1 if self.kind == 'text' else self.count
+
+
+def _align(off, a):
+    return (off + a - 1) // a * a
+
+
+def layout(name, base=0, prefix='', pack=None):
+    """Return (size, alignment, [Field]) for a struct, with offsets relative to base."""
+    own_pack, members = STRUCTS[name]
+    pack = own_pack if pack is None else min(pack, own_pack)
+    off = 0
+    max_align = 1
+    fields = []
+    for spec in members:
+        fname, ftype, count = spec[:3]
+        path = f'{prefix}{fname}'
+        if ftype in STRUCTS:
+            size, align, _ = layout(ftype)
+            align = min(align, pack)
+            off = _align(off, align)
+            for i in range(count):
+                sub = f'{path}[{i}].' if count > 1 else f'{path}.'
+                _, _, leaves = layout(ftype, base + off + i * size, sub)
+                fields.extend(leaves)
+            off += size * count
+        else:
+            elem = 1 if ftype == 'text' else PRIMS[ftype][1]
+            align = min(elem, pack)
+            off = _align(off, align)
+            f = Field(path, base + off, ftype, count, spec[3] if ftype == 'text' else 0)
+            fields.append(f)
+            off += f.size
+        max_align = max(max_align, align)
+    return _align(off, max_align), max_align, fields
+
+
+class StructCodec:
+    """Flattened table of one struct from STRUCTS with a single precompiled struct for the whole body."""
+
+    def __init__(self, name, expected_size=None):
+        size, _, fields = layout(name)
+        if expected_size is not None and size != expected_size:
+            raise AssertionError(f'{name} layout size {size} != {expected_size}')
+        self.name = name
+        self.size = size
+        self.fields = fields
+        self.by_path = {f.path: f for f in fields}
+        self.offsets = [f.offset for f in fields]
+        parts = ['<']
+        pos = 0
+        for f in fields:
+            if f.offset > pos:
+                parts.append(f'{f.offset - pos}x')
+            parts.append(f.fmt)
+            pos = f.offset + f.size
+        if size > pos:
+            parts.append(f'{size - pos}x')
+        self.whole = struct.Struct(''.join(parts))
+        self.leaf = {f.path: struct.Struct('<' + f.fmt) for f in fields}
+
+    def decode(self, buf, start=0):
+        """Decode every field -> {path: value}."""
+        values = self.whole.unpack_from(buf, start)
+        out = {}
+        i = 0
+        for f in self.fields:
+            n = f.n_values
+            out[f.path] = f.convert(values[i:i + n])
+            i += n
+        return out
+
+    def decode_field(self, buf, path, start=0):
+        f = self.by_path[path]
+        return f.convert(self.leaf[path].unpack_from(buf, start + f.offset))
+
+    def field_at(self, offset):
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        if i < 0:
+            return None
+        f = self.fields[i]
+        return f if offset < f.offset + f.size else None  # None -> padding byte
+
+    def diff(self, a, b, start_a=0, start_b=0, block=64):
+        """
+        Field-level diff. Byte blocks are compared first (C-level slice compares), only fields that
+        overlap a changed byte are decoded. Returns [(path, old, new, changed_indexes or None)].
+        """
+        ma = memoryview(a)[start_a:start_a + self.size]
+        mb = memoryview(b)[start_b:start_b + self.size]
+        if ma == mb:
+            return []
+        touched = []
+        seen = set()
+        for off in range(0, self.size, block):
+            if ma[off:off + block] == mb[off:off + block]:
+                continue
+            end = min(self.size, off + block)
+            for pos in range(off, end):
+                if ma[pos] != mb[pos]:
+                    f = self.field_at(pos)
+                    if f is not None and f.path not in seen:
+                        seen.add(f.path)
+                        touched.append(f)
+        out = []
+        for f in touched:
+            old = self.decode_field(ma, f.path)
+            new = self.decode_field(mb, f.path)
+            if old == new:
+                continue  # e.g. bytes after a NUL terminator in a text field
+            idx = None
+            if isinstance(old, list):
+                idx = [i for i, (x, y) in enumerate(zip(old, new)) if x != y]
+            out.append((f.path, old, new, idx))
+        return out
+
+
+class StGlobalCodec(StructCodec):
+    """StGlobal (29328 bytes) plus the documented-offset self check."""
+
+    def __init__(self):
+        super().__init__('StGlobal', STGLOBAL_SIZE)
+
+    def check_doc_offsets(self):
+        bad = []
+        for path, expected in DOC_OFFSETS.items():
+            f = self.by_path.get(path)
+            if f is None:
+                f = next((x for x in self.fields if x.path.startswith(path + '.')), None)
+            got = f.offset if f else None
+            if got != expected:
+                bad.append((path, expected, got))
+        return bad
+
+
+_CODEC = None
+_STRUCT_CODECS = {}
+
+
+def get_struct_codec(name):
+    """Cached codec for any struct in STRUCTS (StSysConfig, StGradeInfo, StExitInfo, ...)."""
+    codec = _STRUCT_CODECS.get(name)
+    if codec is None:
+        codec = _STRUCT_CODECS[name] = get_codec() if name == 'StGlobal' else StructCodec(name)
+    return codec
+
+
+def get_codec():
+    global _CODEC
+    if _CODEC is None:
+        _CODEC = StGlobalCodec()
+    return _CODEC
+
+
+CFSM_OFFSET = 29292
+_MONTHS = b'Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec'
+# one pass: FSM_CMD_CONFIG frame header, or a compile date "Mmm dd yyyy" inside cFSMInfo
+# (the leading lookahead lets the regex engine skip most positions with a single class test)
+_LOCATE_RE = re.compile(
+    rb'(?=[SJFMAOND])(?:(?P<hdr>SYNC[\s\S]{8}' + re.escape(struct.pack('<I', FSM_CMD_CONFIG)) + rb')'
+    rb'|(?P<date>(?:' + _MONTHS + rb') [ 0-3][0-9] [12][0-9]{3}))'
+)
+
+
+def score_candidate(buf, start):
+    """Cheap plausibility score of an StGlobal at start (higher is better)."""
+    codec = get_codec()
+    score = 0
+    sub = codec.decode_field(buf, 'nSubsysId', start)
+    if 0 <= sub <= 0x0F00:
+        score += 1
+    if codec.decode_field(buf, 'sys.nSubsysNum', start) <= MAX_SUBSYS_NUM:
+        score += 1
+    if codec.decode_field(buf, 'sys.nExitNum', start) <= MAX_EXIT_NUM:
+        score += 1
+    if codec.decode_field(buf, 'grade.nSizeGradeNum', start) <= MAX_SIZE_GRADE_NUM:
+        score += 1
+    if codec.decode_field(buf, 'grade.nQualityGradeNum', start) <= MAX_QUALITY_GRADE_NUM:
+        score += 1
+    if re.match(rb'(?:' + _MONTHS + rb') ', bytes(buf[start + CFSM_OFFSET:start + CFSM_OFFSET + 4])):
+        score += 2
+    return score
+
+
+def locate_candidates(buf):
+    """[(start, score, how)] of possible StGlobal snapshots, best first, from a single regex scan."""
+    found = {}
+    size = len(buf)
+    for m in _LOCATE_RE.finditer(buf):
+        if m.lastgroup == 'hdr':
+            start, how = m.end(), 'frame'
+        else:
+            start, how = m.start() - CFSM_OFFSET, 'date'
+        if start < 0 or start + STGLOBAL_SIZE > size:
+            continue
+        if start in found:
+            found[start] = (found[start][0], 'frame+date')
+            continue
+        found[start] = (score_candidate(buf, start), how)
+    return sorted(((s, sc, how) for s, (sc, how) in found.items()), key=lambda x: (-x[1], x[0]))
+
+
+def _short(v, limit=8):
+    if isinstance(v, list) and len(v) > limit:
+        return f'[{", ".join(map(repr, v[:limit]))}, ... ({len(v)} items)]'
+    return repr(v)
+
+
+def format_diff(rows, limit=8):
+    lines = []
+    for path, old, new, idx in rows:
+        if idx is None:
+            lines.append(f'{path}: {old!r} -> {new!r}')
+        else:
+            changes = ', '.join(f'[{i}] {old[i]!r}->{new[i]!r}' for i in idx[:limit])
+            more = f' (+{len(idx) - limit} more)' if len(idx) > limit else ''
+            lines.append(f'{path}: {changes}{more}')
+    return lines
+
+
+def _load(path, start):
+    raw = Path(path).read_bytes()
+    if start is None:
+        if len(raw) == STGLOBAL_SIZE:
+            start = 0
+        else:
+            cands = locate_candidates(raw)
+            if not cands:
+                raise SystemExit(f'{path}: no StGlobal candidate found, pass --start')
+            start = cands[0][0]
+    if start + STGLOBAL_SIZE > len(raw):
+        raise SystemExit(f'{path}: start={start} beyond data ({len(raw)} bytes)')
+    return raw, start
+
+
+def cmd_check(args):
+    codec = get_codec()
+    bad = codec.check_doc_offsets()
+    print(f'fields={len(codec.fields)} size={codec.size} values={len(codec.whole.unpack(bytes(codec.size)))}')
+    for path, expected, got in bad:
+        print(f'MISMATCH {path}: doc={expected} layout={got}')
+    if bad:
+        raise SystemExit(1)
+    print('offsets match docs/qt_harmony_protocol_offset_check_all.md')
+
+
+def cmd_locate(args):
+    raw = Path(args.input).read_bytes()
+    t0 = time.perf_counter()
+    cands = locate_candidates(raw)
+    ms = (time.perf_counter() - t0) * 1000.0
+    print(f'scanned {len(raw)} bytes in {ms:.2f}ms, candidates={len(cands)}')
+    for start, score, how in cands[:args.limit]:
+        print(f'  start={start} score={score} via={how}')
+
+
+def cmd_decode(args):
+    raw, start = _load(args.input, args.start)
+    codec = get_codec()
+    t0 = time.perf_counter()
+    fields = codec.decode(raw, start)
+    ms = (time.perf_counter() - t0) * 1000.0
+    print(f'start={start} fields={len(fields)} decoded in {ms:.2f}ms')
+    if args.json:
+        Path(args.json).write_text(json.dumps(fields, ensure_ascii=False, indent=1), encoding='utf-8')
+        print(f'json -> {args.json}')
+    for path in args.field or []:
+        print(f'{path} = {_short(fields[path], 64)}')
+    if not args.json and not args.field:
+        for path, value in fields.items():
+            print(f'{path} = {_short(value)}')
+
+
+def cmd_diff(args):
+    a, sa = _load(args.a, args.start_a)
+    b, sb = _load(args.b, args.start_b)
+    codec = get_codec()
+    t0 = time.perf_counter()
+    rows = codec.diff(a, b, sa, sb)
+    ms = (time.perf_counter() - t0) * 1000.0
+    print(f'a={args.a}@{sa} b={args.b}@{sb} changed_fields={len(rows)} in {ms:.2f}ms')
+    for line in format_diff(rows, args.limit):
+        print(f'  {line}')
+
+
+def main():
+    ap = argparse.ArgumentParser(description='StGlobal (MAX64) table-driven decoder / locator / differ')
+    sub = ap.add_subparsers(dest='sub', required=True)
+
+    p = sub.add_parser('check', help='verify computed offsets against the documented ones')
+    p.set_defaults(func=cmd_check)
+
+    p = sub.add_parser('locate', help='find candidate StGlobal snapshots in a raw buffer')
+    p.add_argument('-i', '--input', required=True)
+    p.add_argument('--limit', type=int, default=10)
+    p.set_defaults(func=cmd_locate)
+
+    p = sub.add_parser('decode', help='decode every field of one snapshot')
+    p.add_argument('-i', '--input', required=True)
+    p.add_argument('--start', type=int, default=None, help='snapshot offset (default: best candidate)')
+    p.add_argument('--json', help='write all fields to a json file')
+    p.add_argument('--field', action='append', help='print only this field path (repeatable)')
+    p.set_defaults(func=cmd_decode)
+
+    p = sub.add_parser('diff', help='field-level diff of two snapshots')
+    p.add_argument('a')
+    p.add_argument('b')
+    p.add_argument('--start-a', type=int, default=None)
+    p.add_argument('--start-b', type=int, default=None)
+    p.add_argument('--limit', type=int, default=8, help='changed elements shown per array field')
+    p.set_defaults(func=cmd_diff)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+按年分表（tb_fruitprocessinfo_<year>）数据生成 + 跨年查询路由基准
+
+- 表名/建表语句与 YearlyTableManager.ets 保持一致
+- 同时生成一张包含全部数据的单表 tb_FruitProcessInfo 作为对照
+- 查询路由：按 RunningDate 范围裁剪年份分表，只扫命中的年份；
+  明细查询用 heapq.merge 流式合并（不把各年结果先全部读入内存），
+  聚合查询各分表算部分和后合并
+- 输出分表路由与单表的耗时对比
+
+示例：
+  python tools/yearly_partition_bench.py --years 2021-2026 --rows-per-year 500000
+  python tools/yearly_partition_bench.py --years 2019-2026 --from "2025-11-01" --to "2026-02-01" --index
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+MONOLITHIC_TABLE = "tb_FruitProcessInfo"
+COLUMNS = '"FID","RealWeightCount","RealWeightCountPer","SeparationEfficiency","SpeedPercent","AvgWeight","RunningDate"'
+
+
+def year_table_name(year: int) -> str:
+    # 与 YearlyTableManager.getFruitProcessInfoTableName 一致
+    return f"tb_fruitprocessinfo_{max(1970, int(year))}"
+
+
+def create_process_table(conn: sqlite3.Connection, table: str) -> None:
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {table} ("
+        "FID INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,"
+        "RealWeightCount REAL,"
+        "RealWeightCountPer REAL,"
+        "SeparationEfficiency REAL,"
+        "SpeedPercent REAL,"
+        "AvgWeight REAL,"
+        "RunningDate TEXT"
+        ");"
+    )
+
+
+def parse_years(text: str) -> List[int]:
+    if "-" in text:
+        a, b = text.split("-", 1)
+        lo, hi = int(a), int(b)
+        return list(range(min(lo, hi), max(lo, hi) + 1))
+    return sorted({int(p) for p in text.split(",") if p.strip()})
+
+
+def parse_time(text: str) -> str:
+    text = text.strip()
+    if len(text) == 10:
+        text += " 00:00:00"
+    return datetime.strptime(text, TIME_FMT).strftime(TIME_FMT)
+
+
+def generate(conn: sqlite3.Connection, years: List[int], rows_per_year: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    create_process_table(conn, MONOLITHIC_TABLE)
+    for y in years:
+        table = year_table_name(y)
+        create_process_table(conn, table)
+        begin = datetime(y, 1, 1)
+        span_s = int((datetime(y + 1, 1, 1) - begin).total_seconds())
+        rows = []
+        for i in range(rows_per_year):
+            ts = begin + timedelta(seconds=int(span_s * i / max(1, rows_per_year)))
+            rows.append((rnd.uniform(0, 9000), rnd.uniform(0, 100), rnd.uniform(80, 100),
+                         rnd.uniform(30, 100), rnd.uniform(120, 260), ts.strftime(TIME_FMT)))
+        sql_cols = '"RealWeightCount","RealWeightCountPer","SeparationEfficiency","SpeedPercent","AvgWeight","RunningDate"'
+        conn.executemany(f"INSERT INTO {table} ({sql_cols}) VALUES (?,?,?,?,?,?)", rows)
+        conn.executemany(f"INSERT INTO {MONOLITHIC_TABLE} ({sql_cols}) VALUES (?,?,?,?,?,?)", rows)
+    conn.commit()
+
+
+def existing_year_tables(conn: sqlite3.Connection) -> Dict[int, str]:
+    out: Dict[int, str] = {}
+    prefix = "tb_fruitprocessinfo_"
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'"):
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            out[int(name[len(prefix):])] = name
+    return out
+
+
+class YearRouter:
+    """按 RunningDate 裁剪年份分表并扇出查询。"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.tables = existing_year_tables(conn)
+
+    def prune(self, t_from: str, t_to: str) -> List[str]:
+        y0 = int(t_from[:4])
+        y1 = int(t_to[:4])
+        return [self.tables[y] for y in sorted(self.tables) if y0 <= y <= y1]
+
+    def _iter_table(self, table: str, t_from: str, t_to: str, batch: int) -> Iterator[Tuple]:
+        cur = self.conn.execute(
+            f"SELECT {COLUMNS} FROM {table} WHERE RunningDate BETWEEN ? AND ? ORDER BY RunningDate",
+            (t_from, t_to),
+        )
+        while True:
+            chunk = cur.fetchmany(batch)
+            if not chunk:
+                return
+            yield from chunk
+
+    def iter_rows(self, t_from: str, t_to: str, batch: int = 1024) -> Iterator[Tuple]:
+        streams = [self._iter_table(t, t_from, t_to, batch) for t in self.prune(t_from, t_to)]
+        return heapq.merge(*streams, key=lambda r: r[6])
+
+    def aggregate(self, t_from: str, t_to: str) -> Dict[str, float]:
+        n = 0
+        sums = [0.0, 0.0, 0.0, 0.0]
+        for table in self.prune(t_from, t_to):
+            row = self.conn.execute(
+                f"SELECT COUNT(*), TOTAL(RealWeightCount), TOTAL(SeparationEfficiency), TOTAL(SpeedPercent), "
+                f"TOTAL(AvgWeight) FROM {table} WHERE RunningDate BETWEEN ? AND ?",
+                (t_from, t_to),
+            ).fetchone()
+            n += int(row[0])
+            for i in range(4):
+                sums[i] += float(row[i + 1])
+        return finish_aggregate(n, sums)
+
+
+def finish_aggregate(n: int, sums: List[float]) -> Dict[str, float]:
+    d = float(max(1, n))
+    return {
+        "rows": n,
+        "RealWeightCount": sums[0],
+        "SeparationEfficiency": sums[1] / d,
+        "SpeedPercent": sums[2] / d,
+        "AvgWeight": sums[3] / d,
+    }
+
+
+def monolithic_iter_rows(conn: sqlite3.Connection, t_from: str, t_to: str, batch: int = 1024) -> Iterator[Tuple]:
+    cur = conn.execute(
+        f"SELECT {COLUMNS} FROM {MONOLITHIC_TABLE} WHERE RunningDate BETWEEN ? AND ? ORDER BY RunningDate",
+        (t_from, t_to),
+    )
+    while True:
+        chunk = cur.fetchmany(batch)
+        if not chunk:
+            return
+        yield from chunk
+
+
+def monolithic_aggregate(conn: sqlite3.Connection, t_from: str, t_to: str) -> Dict[str, float]:
+    row = conn.execute(
+        f"SELECT COUNT(*), TOTAL(RealWeightCount), TOTAL(SeparationEfficiency), TOTAL(SpeedPercent), "
+        f"TOTAL(AvgWeight) FROM {MONOLITHIC_TABLE} WHERE RunningDate BETWEEN ? AND ?",
+        (t_from, t_to),
+    ).fetchone()
+    return finish_aggregate(int(row[0]), [float(x) for x in row[1:]])
+
+
+def timed(fn, repeat: int) -> Tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, (time.perf_counter() - t0) * 1000.0)
+    return best, result
+
+
+def consume(it: Iterator[Tuple]) -> Tuple[int, float]:
+    # 流式消费：只保留计数与累加值，不缓存结果集
+    n = 0
+    acc = 0.0
+    for r in it:
+        n += 1
+        acc += r[1]
+    return n, acc
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="按年分表生成与跨年查询路由基准")
+    ap.add_argument("--db", default="", help="输出库路径（默认临时目录，跑完删除）")
+    ap.add_argument("--years", default="2022-2026", help="年份范围，例: 2022-2026 或 2023,2025")
+    ap.add_argument("--rows-per-year", type=int, default=200000, help="每年行数")
+    ap.add_argument("--from", dest="t_from", default="", help="查询起始时间（默认最后一年的 11 月 1 日）")
+    ap.add_argument("--to", dest="t_to", default="", help="查询结束时间（默认最后一年末）")
+    ap.add_argument("--index", action="store_true", help="给所有表的 RunningDate 建索引后对比")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--reuse", action="store_true", help="--db 已存在时直接复用，不重新生成")
+    args = ap.parse_args()
+
+    years = parse_years(args.years)
+    keep_db = bool(args.db)
+    db_path = Path(args.db) if keep_db else Path(tempfile.mkdtemp()) / "harmony_yearly.db"
+    if db_path.exists() and not args.reuse:
+        db_path.unlink()
+    conn = sqlite3.connect(str(db_path))
+
+    if not (args.reuse and existing_year_tables(conn)):
+        t0 = time.perf_counter()
+        generate(conn, years, args.rows_per_year, args.seed)
+        print(f"[GEN] years={years} rows/year={args.rows_per_year} total={len(years) * args.rows_per_year} "
+              f"in {time.perf_counter() - t0:.2f}s -> {db_path}")
+
+    if args.index:
+        for table in existing_year_tables(conn).values():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_runningdate ON {table}(RunningDate)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_processinfo_runningdate ON {MONOLITHIC_TABLE}(RunningDate)")
+        conn.commit()
+        print("[INDEX] RunningDate indexes created")
+
+    last = max(years)
+    t_from = parse_time(args.t_from) if args.t_from else f"{last}-11-01 00:00:00"
+    t_to = parse_time(args.t_to) if args.t_to else f"{last}-12-31 23:59:59"
+
+    router = YearRouter(conn)
+    pruned = router.prune(t_from, t_to)
+    print(f"[ROUTE] range=[{t_from} .. {t_to}] partitions={len(pruned)}/{len(router.tables)} -> {pruned}")
+
+    ms_rows_part, (n_part, acc_part) = timed(lambda: consume(router.iter_rows(t_from, t_to)), args.repeat)
+    ms_rows_mono, (n_mono, acc_mono) = timed(lambda: consume(monolithic_iter_rows(conn, t_from, t_to)), args.repeat)
+    ms_agg_part, agg_part = timed(lambda: router.aggregate(t_from, t_to), args.repeat)
+    ms_agg_mono, agg_mono = timed(lambda: monolithic_aggregate(conn, t_from, t_to), args.repeat)
+
+    if n_part != n_mono or abs(acc_part - acc_mono) > 1e-6 * max(1.0, abs(acc_mono)):
+        print(f"[WARN] row mismatch: partitioned={n_part} monolithic={n_mono}")
+
+    def ratio(a: float, b: float) -> float:
+        return a / b if b > 0 else float("inf")
+
+    print(f"[ROWS] partitioned={ms_rows_part:9.2f}ms monolithic={ms_rows_mono:9.2f}ms rows={n_part} "
+          f"speedup=x{ratio(ms_rows_mono, ms_rows_part):.2f}")
+    print(f"[AGG ] partitioned={ms_agg_part:9.2f}ms monolithic={ms_agg_mono:9.2f}ms rows={agg_part['rows']} "
+          f"speedup=x{ratio(ms_agg_mono, ms_agg_part):.2f}")
+    print(f"[AGG ] AvgWeight={agg_part['AvgWeight']:.2f} (mono {agg_mono['AvgWeight']:.2f}) "
+          f"SeparationEfficiency={agg_part['SeparationEfficiency']:.2f} SpeedPercent={agg_part['SpeedPercent']:.2f}")
+
+    conn.close()
+    if not keep_db:
+        try:
+            os.remove(db_path)
+            os.rmdir(db_path.parent)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()